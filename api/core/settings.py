@@ -112,6 +112,47 @@ CHANNEL_LAYERS = {
     },
 }
 
+# ゲームループ設定
+PONG_TICK_RATE = 60  # シミュレーションの固定ティックレート（Hz）
+PONG_MAX_CATCH_UP_STEPS = 5  # 遅延時に1回で追い付くステップ数の上限
+PONG_PHYSICS_ENGINE = "python"  # "batched" で NumPy による一括物理演算を使用
+PONG_SEND_RATE = 60  # 状態を送信するレート（Hz、ティックレート以下）
+PONG_MIN_SEND_RATE = 15  # 遅いクライアントへ間引く際の下限（Hz）
+PONG_SEND_MAX_LAG = 0.25  # 確認応答がこれ以上遅れたら送信レートを下げる（秒）
+PONG_OUTBOUND_MAX_CONTROL = 256  # 送信待ちの制御メッセージの上限（超えたら切断）
+PONG_DELTA_KEYFRAME_INTERVAL = 60  # 差分形式でキーフレームを送る間隔（フレーム数）
+PONG_INPUT_RATE = 120  # 接続ごとに受け付けるメッセージ数（毎秒）
+PONG_INPUT_BURST = 30  # 一時的に超過を許容するメッセージ数
+PONG_INPUT_MAX_BYTES = 512  # これより大きいメッセージは解析せずに破棄
+PONG_REWIND_TICKS = 12  # 遅れて届いた入力を巻き戻して適用できるティック数（0 で無効）
+PONG_REAP_INTERVAL = 5.0  # 放置・放棄された試合を確認する間隔（秒）
+PONG_REAP_EMPTY_AFTER = 30  # 接続中のプレイヤーがいない状態がこれだけ続いたら終了（秒）
+PONG_REAP_IDLE_AFTER = 300  # 入力がない状態がこれだけ続いたら終了（秒）
+PONG_REAP_MAX_ERRORS = 60  # 連続してこの回数更新に失敗したら終了
+
+# 試合配置（セッションを所有するワーカー）の管理
+PONG_REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+PONG_PLACEMENT_BACKEND = "redis"  # "local" でプロセス内のみ（単一ワーカー・テスト用）
+PONG_PLACEMENT_TTL = 30  # セッション所有権のリース期間（秒）
+PONG_WORKER_HEARTBEAT_TTL = 6  # 更新が途絶えたワーカーのセッションを引き継ぐまでの秒数
+PONG_CHECKPOINT_INTERVAL = 1.0  # 試合状態を保存する間隔（秒）
+PONG_CHECKPOINT_TTL = 120  # 所有ワーカー停止後もチェックポイントを残す期間（秒）
+PONG_MATCHMAKING_BACKEND = "redis"  # マッチメイキング待機列（"local" でプロセス内のみ）
+PONG_MATCH_INTERVAL = 0.5  # 待機列全体から組み合わせを求める間隔（秒）
+PONG_MATCH_LEVEL_GAP = 1  # 待ち始めに許容するレベル差
+PONG_MATCH_GAP_PER_SECOND = 0.5  # 待ち時間1秒ごとに広げる許容レベル差
+PONG_MATCH_MAX_GAP = None  # 許容レベル差の上限（None で上限なし）
+PONG_MATCH_ACCEPT_TIMEOUT = (
+    10  # マッチ後に両プレイヤーがゲームへ接続するまでの期限（秒）
+)
+PONG_RESERVATION_RETENTION = (
+    3600  # 開始・取り消し済みの予約を再接続の判定に残す期間（秒）
+)
+PONG_TOURNAMENT_CACHE_SIZE = 256  # プロセス内にキャッシュするトーナメント状態の上限
+PONG_TOURNAMENT_SIZE = 4  # トーナメントの定員（2の累乗でなければ上位シードが不戦勝）
+# 他ワーカーから誘導される際のこのワーカーの接続先（例: wss://api-2:8001）
+PONG_WORKER_URL = os.getenv("PONG_WORKER_URL")
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
@@ -2,16 +2,32 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 import json
-import asyncio
+from django.conf import settings
 from django.utils import timezone
 
+from .game_scheduler import game_scheduler
+from .input_buffer import InputBuffer
+from .local_fanout import local_fanout
+from .outbound_queue import QueuedSendMixin
 from .models import Game, User
+from .placement import get_placement_registry
+from .send_rate import SendRateController
+from .wire_format import (
+    BINARY_SUBPROTOCOL,
+    DELTA_SUBPROTOCOL,
+    DeltaEncoder,
+    flatten_state,
+    negotiate_subprotocol,
+    session_info_message,
+)
 
 
-class BaseGameConsumer(AsyncWebsocketConsumer):
+class BaseGameConsumer(QueuedSendMixin, AsyncWebsocketConsumer):
     """全ゲームタイプの基底となる WebSocket コンシューマ"""
 
     games = {}  # クラス変数として共有ゲームインスタンスを管理
+    scheduler = game_scheduler  # 全試合を駆動するプロセス内スケジューラ
+    fanout = local_fanout  # 同一プロセス内のメンバーへの直接配信
 
     async def connect(self):
         """基本接続処理"""
@@ -22,31 +38,35 @@ class BaseGameConsumer(AsyncWebsocketConsumer):
         # グループ名の設定（サブクラスでオーバーライド可能）
         self.game_group_name = f"game_{self.session_id}"
 
-        # グループへの参加
+        # 入力はティックの開始時にまとめて適用する
+        self.input_buffer = InputBuffer.from_settings()
+
+        # グループへの参加（プロセス外のメンバー向け）とローカル配信への登録
         await self.channel_layer.group_add(self.game_group_name, self.channel_name)
-        await self.accept()
+        self.fanout.join(self.game_group_name, self)
+        await self.accept(subprotocol=self.negotiate_wire_format())
         print(f"Player {self.username} connected to game {self.session_id}")
 
-        # ゲーム更新ループの準備
-        self.game_task = None
-
     async def disconnect(self, close_code):
         """基本切断処理"""
-        # ゲームループのキャンセル処理
-        if self.game_task:
-            self.game_task.cancel()
-            try:
-                await self.game_task
-            except asyncio.CancelledError:
-                pass
+        # スケジューラの購読解除
+        if self.session_id:
+            self.scheduler.unsubscribe(self.session_id, self.channel_name)
 
         print(f"Player {self.username} disconnected from game {self.session_id}")
+        if self.send_rate.stats["skipped"]:
+            print(f"Send stats for {self.username}: {self.send_rate.stats}")
 
         # グループからの離脱
+        if self.game_group_name:
+            self.fanout.leave(self.game_group_name, self)
         await self.channel_layer.group_discard(self.game_group_name, self.channel_name)
 
     async def receive(self, text_data):
         """基本メッセージ受信処理"""
+        # 送信頻度・サイズの上限を超えたメッセージは解析せずに破棄
+        if not self.input_buffer.admit(text_data):
+            return
         try:
             data = json.loads(text_data)
             message_type = data.get("type")
@@ -54,6 +74,8 @@ class BaseGameConsumer(AsyncWebsocketConsumer):
             # タイプ別の処理分岐
             if message_type == "move":
                 await self.handle_move(data)
+            elif message_type in ("state_ack", "keyframe_request"):
+                self.handle_state_ack(data)
             # その他のメッセージタイプはサブクラスで実装
 
         except json.JSONDecodeError:
@@ -64,19 +86,84 @@ class BaseGameConsumer(AsyncWebsocketConsumer):
             await self.send(json.dumps({"type": "error", "message": str(e)}))
 
     async def handle_move(self, data):
-        """移動処理の基本実装"""
-        game = self.games.get(self.session_id)
-        if game:
-            game.move_player(username=self.username, new_x=data.get("position", 0))
+        """移動処理の基本実装（次のティックの開始時に最新の入力だけを適用）
+
+        "direction"（-1, 0, 1）を送るクライアントはキーの押下・解放時のみ送信し、
+        パドルはサーバー側で PADDLE_SPEED で移動する。
+        """
+        seq, tick = data.get("seq"), data.get("tick")
+        if "direction" in data:
+            self.input_buffer.push_direction(data["direction"], seq, tick)
+        else:
+            self.input_buffer.push(data.get("position", 0), seq, tick)
+
+    def negotiate_wire_format(self):
+        """クライアントが要求したサブプロトコルから送信形式を決定
+
+        バイナリ形式に対応していないクライアントには従来の JSON で送信する。
+        """
+        self.wire_format = negotiate_subprotocol(self.scope.get("subprotocols", []))
+        self.players = None
+        self.delta_encoder = None
+        # 接続ごとの送信レート（遅いクライアントには間引いて送る）
+        self.send_rate = SendRateController.from_settings(self.scheduler.tick_rate)
+        if self.wire_format == DELTA_SUBPROTOCOL:
+            self.delta_encoder = DeltaEncoder(
+                keyframe_interval=getattr(settings, "PONG_DELTA_KEYFRAME_INTERVAL", 60)
+            )
+        return self.wire_format
+
+    def handle_state_ack(self, data):
+        """確認応答・キーフレーム要求の処理
+
+        tick を含む確認応答は全形式で受け付け、送信レートの調整に使う。
+        frame は差分形式の基準フレームの確認応答。
+        """
+        if data.get("type") == "keyframe_request":
+            if self.delta_encoder:
+                self.delta_encoder.request_keyframe()
+            return
+        if self.delta_encoder and "frame" in data:
+            self.delta_encoder.acknowledge(data.get("frame"))
+        if "tick" in data:
+            self.send_rate.acknowledge(data["tick"])
 
     async def game_state(self, event):
-        """ゲーム状態更新の送信"""
-        # イベントからステートを取得してクライアントに送信
-        state = event.get("state", {})
-        await self.send(text_data=json.dumps({"type": "state_update", "state": state}))
+        """ゲーム状態更新の送信
+
+        スケジューラがエンコード済みのフレームをそのまま送信する。
+        フレームは購読者の形式だけエンコードされるので、自分の形式が
+        ない（購読前に届いた）フレームは送らない。
+        """
+        if self.fanout.is_local_echo(self.game_group_name, self, event):
+            return
+        tick = event.get("tick", 0)
+        # 送信キューで上書きされた状態フレームを混雑の信号として使う
+        if self.outbound is not None:
+            self.send_rate.observe_backlog(tick, self.outbound.stats["coalesced"])
+        if not self.send_rate.should_send(tick, final=not event.get("active", True)):
+            return
+        frames = event.get("frames", {})
+        if self.wire_format == BINARY_SUBPROTOCOL and self.wire_format in frames:
+            await self.send_state(bytes_data=frames[self.wire_format])
+            return
+        if self.delta_encoder and self.players:
+            fields = frames.get(self.wire_format)
+            if fields is None and "json" in frames:
+                state = json.loads(frames["json"])["state"]
+                fields = flatten_state(state, self.players)
+            if fields is not None:
+                await self.send_state(
+                    text_data=json.dumps(self.delta_encoder.encode(fields))
+                )
+            return
+        if "json" in frames:
+            await self.send_state(text_data=frames["json"])
 
     async def player_disconnected(self, event):
         """プレイヤー切断通知の送信"""
+        if self.fanout.is_local_echo(self.game_group_name, self, event):
+            return
         await self.send(
             text_data=json.dumps(
                 {
@@ -87,31 +174,76 @@ class BaseGameConsumer(AsyncWebsocketConsumer):
             )
         )
 
-    async def game_loop(self):
-        """ゲーム状態更新ループの基本実装"""
-        try:
-            while True:
-                if self.session_id in self.games:
-                    game = self.games[self.session_id]
-                    state = game.update(delta_time=0.016)  # 約60FPS
-
-                    # グループにブロードキャスト
-                    await self.channel_layer.group_send(
-                        self.game_group_name, {"type": "game_state", "state": state}
-                    )
+    async def ensure_session_owner(self):
+        """このワーカーがセッションを所有しているか確認する
 
-                    # ゲーム終了判定
-                    if not game.is_active:
-                        # 終了処理はサブクラスで拡張
-                        break
+        同じセッションの2プレイヤーが別々のワーカーで別の試合を作らないよう、
+        所有者が他のワーカーであれば接続先を通知して切断する。
+        """
+        owner = await self.scheduler.claim(self.session_id)
+        if owner is None:
+            return True
 
-                await asyncio.sleep(0.016)
+        url = await self.get_worker_url(owner)
+        print(f"Redirecting {self.username} to worker {owner} for {self.session_id}")
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "redirect",
+                    "session_id": self.session_id,
+                    "worker": owner,
+                    "url": url,
+                }
+            )
+        )
+        await self.close(code=4001)
+        return False
 
-        except asyncio.CancelledError:
-            # ループのキャンセル（クリーンアップ）
-            pass
+    async def get_worker_url(self, worker_id):
+        try:
+            # URL 未設定のワーカーは空文字列で生存のみ登録している
+            return await get_placement_registry().worker_url(worker_id) or None
         except Exception as e:
-            print(f"Error in game loop: {e}")
+            print(f"Error getting worker url: {e}")
+            return None
+
+    async def join_match(self, game):
+        """試合をスケジューラに登録して購読する
+
+        既に同じセッションの試合が登録されていれば、そちらを購読する。
+        停止したワーカーから引き継いだセッションはチェックポイントから再開する。
+        ゲームの更新とブロードキャストはスケジューラが1フレーム1回行う。
+        バイナリ形式のクライアントにはプレイヤー番号表を一度だけ送る。
+        """
+        if self.scheduler.get(self.session_id) is None:
+            await self.scheduler.resume(game)
+        match = self.scheduler.register(
+            self.session_id,
+            game,
+            self.game_group_name,
+            self.games,
+            on_finish=self.on_game_finished,
+        )
+        self.scheduler.subscribe(self.session_id, self.channel_name, self.wire_format)
+        self.scheduler.attach_input(
+            self.session_id, self.channel_name, self.username, self.input_buffer
+        )
+
+        game = match.game
+        self.players = (game.player1_name, game.player2_name)
+        if self.wire_format in (BINARY_SUBPROTOCOL, DELTA_SUBPROTOCOL):
+            await self.send(
+                text_data=json.dumps(
+                    session_info_message(
+                        self.players, self.wire_format, self.scheduler.tick_rate
+                    )
+                )
+            )
+        return game
+
+    async def on_game_finished(self, game):
+        """試合終了時の処理（スケジューラから一度だけ呼ばれる）"""
+        await self.save_game_state(game)
 
     @database_sync_to_async
     def save_game_state(self, game):
@@ -131,6 +263,9 @@ class BaseGameConsumer(AsyncWebsocketConsumer):
                     winner = User.objects.get(username=winner_name)
                     game_instance.winner = winner
                     game_instance.status = "COMPLETED"
+                elif getattr(game, "abandoned", None):
+                    # 放置・放棄により終了させた試合（GameScheduler.reap）
+                    game_instance.status = "ABANDONED"
 
             game_instance.save()
 
@@ -0,0 +1,328 @@
+# api/pong/batched_physics.py
+from collections.abc import MutableMapping
+from typing import Iterable, Optional, Type
+
+import numpy as np
+
+from .game_logic import MultiplayerPongGame
+
+
+class BatchedPongEngine:
+    """全試合の状態を構造体配列 (SoA) で保持し、1回のベクトル演算で進めるエンジン
+
+    1行が1試合に対応する。ボール位置・速度、パドル、スコアを NumPy 配列で
+    保持し、壁・パドル衝突とスコア判定を全試合まとめて計算する。
+    定数は game_class（既定: MultiplayerPongGame）から毎ステップ読み込む。
+    """
+
+    def __init__(
+        self,
+        capacity: int = 64,
+        game_class: Type[MultiplayerPongGame] = MultiplayerPongGame,
+    ):
+        self.game_class = game_class
+        self.capacity = 0
+        self.ball = np.zeros((0, 3))  # x, y, z
+        self.velocity = np.zeros((0, 3))
+        self.paddles = np.zeros((0, 2))  # [player1, player2] の X座標
+        self.directions = np.zeros((0, 2))  # 方向入力モードの移動方向
+        self.score = np.zeros((0, 2), dtype=np.int64)
+        self.active = np.zeros(0, dtype=bool)
+        self.in_use = np.zeros(0, dtype=bool)
+        self._free_rows = []
+        self._rng = np.random.default_rng()
+        self._grow(capacity)
+
+    def allocate(self) -> int:
+        """空き行を確保して初期状態で返す"""
+        if not self._free_rows:
+            self._grow(max(self.capacity * 2, 1))
+        row = self._free_rows.pop()
+        speed = self.game_class.INITIAL_BALL_SPEED
+        self.ball[row] = (0, 30, 0)
+        self.velocity[row] = (speed, 0, -speed)
+        self.paddles[row] = 0
+        self.directions[row] = 0
+        self.score[row] = 0
+        self.active[row] = True
+        self.in_use[row] = True
+        return row
+
+    def release(self, row: int) -> None:
+        """行を解放して再利用可能にする"""
+        if not self.in_use[row]:
+            return
+        self.in_use[row] = False
+        self.active[row] = False
+        self._free_rows.append(row)
+
+    @property
+    def active_count(self) -> int:
+        return int(np.count_nonzero(self.in_use & self.active))
+
+    def step(self, delta_time: float, rows: Optional[Iterable[int]] = None) -> None:
+        """稼働中の全試合（または指定行）を1ステップ進める"""
+        mask = self.in_use & self.active
+        if rows is not None:
+            selected = np.zeros_like(mask)
+            selected[list(rows)] = True
+            mask &= selected
+        if not mask.any():
+            return
+
+        g = self.game_class
+        idx = np.flatnonzero(mask)
+        ball = self.ball[idx]
+        vel = self.velocity[idx]
+        paddles = self.paddles[idx]
+
+        # 方向入力中のパドルを移動
+        max_x = (g.FIELD_WIDTH - g.PADDLE_WIDTH) / 2
+        paddles = np.clip(
+            paddles + self.directions[idx] * g.PADDLE_SPEED * delta_time,
+            -max_x,
+            max_x,
+        )
+        self.paddles[idx] = paddles
+
+        # ボールの移動と衝突処理（パドルは連続衝突判定）
+        half_length = g.FIELD_LENGTH / 2
+        time_of_impact, hit, paddle_x = self._paddle_impact(
+            ball, vel, paddles, delta_time
+        )
+        self._advance(ball, vel, delta_time * time_of_impact)
+        vel[hit, 2] *= -1
+        vel[hit, 0] += (ball[hit, 0] - paddle_x[hit]) * 0.1
+        # 衝突した試合は残り時間分を反射後の速度で進める
+        self._advance(ball, vel, np.where(hit, 1 - time_of_impact, 0) * delta_time)
+
+        # スコア判定
+        scored = np.abs(ball[:, 2]) > half_length
+        if scored.any():
+            score = self.score[idx]
+            score[scored & (ball[:, 2] < 0), 0] += 1
+            score[scored & (ball[:, 2] >= 0), 1] += 1
+            finished = scored & (score.max(axis=1) >= g.WINNING_SCORE)
+            reset = scored & ~finished
+
+            # ボールのリセット
+            n = int(np.count_nonzero(reset))
+            if n:
+                signs = self._rng.choice((-1.0, 1.0), size=(n, 2))
+                ball[reset] = (0, 30, 0)
+                vel[reset, 0] = g.INITIAL_BALL_SPEED * signs[:, 0]
+                vel[reset, 1] = 0
+                vel[reset, 2] = -g.INITIAL_BALL_SPEED * signs[:, 1]
+
+            self.score[idx] = score
+            self.active[idx[finished]] = False
+
+        self.ball[idx] = ball
+        self.velocity[idx] = vel
+
+    def _advance(self, ball, vel, delta_time) -> None:
+        """行ごとの経過時間でボールを進め、壁で反射"""
+        ball[:, 0] += vel[:, 0] * delta_time
+        ball[:, 2] += vel[:, 2] * delta_time
+
+        half_width = self.game_class.FIELD_WIDTH / 2
+        wall = np.abs(ball[:, 0]) > half_width
+        vel[wall, 0] *= -1
+        ball[wall, 0] = np.copysign(half_width, ball[wall, 0])
+
+    def _paddle_impact(self, ball, vel, paddles, delta_time: float):
+        """近づいているパドルとの衝突時刻・衝突マスク・パドルX座標を返す
+
+        MultiplayerPongGame._find_paddle_impact のベクトル版。
+        衝突しない行の衝突時刻は 1（ティック全体を移動）になる。
+        """
+        g = self.game_class
+        velocity_z = vel[:, 2]
+        direction = np.where(velocity_z > 0, 1.0, -1.0)
+        paddle_x = np.where(velocity_z > 0, paddles[:, 0], paddles[:, 1])
+
+        front = g.FIELD_LENGTH / 2 - g.PADDLE_THICKNESS / 2
+        contact = front - g.BALL_RADIUS
+        start = direction * ball[:, 2]
+        end = start + np.abs(velocity_z) * delta_time
+
+        candidate = (velocity_z != 0) & (start <= front) & (end >= contact)
+        if delta_time <= 0:
+            candidate[:] = False
+        with np.errstate(divide="ignore", invalid="ignore"):
+            time_of_impact = np.maximum((contact - start) / (end - start), 0.0)
+        time_of_impact = np.where(candidate, time_of_impact, 1.0)
+
+        half_width = g.FIELD_WIDTH / 2
+        impact_x = np.clip(
+            ball[:, 0] + vel[:, 0] * delta_time * time_of_impact,
+            -half_width,
+            half_width,
+        )
+        hit = candidate & (
+            np.abs(impact_x - paddle_x) < g.PADDLE_WIDTH / 2 + g.BALL_RADIUS
+        )
+        return np.where(hit, time_of_impact, 1.0), hit, paddle_x
+
+    def _grow(self, capacity: int) -> None:
+        """配列を指定容量まで拡張"""
+        extra = capacity - self.capacity
+        if extra <= 0:
+            return
+        self.ball = np.concatenate([self.ball, np.zeros((extra, 3))])
+        self.velocity = np.concatenate([self.velocity, np.zeros((extra, 3))])
+        self.paddles = np.concatenate([self.paddles, np.zeros((extra, 2))])
+        self.directions = np.concatenate([self.directions, np.zeros((extra, 2))])
+        self.score = np.concatenate([self.score, np.zeros((extra, 2), dtype=np.int64)])
+        self.active = np.concatenate([self.active, np.zeros(extra, dtype=bool)])
+        self.in_use = np.concatenate([self.in_use, np.zeros(extra, dtype=bool)])
+        # 小さい行番号から使われるよう逆順に積む
+        self._free_rows.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+
+class _RowVector:
+    """エンジン配列の1行を Vector3D のように見せるビュー"""
+
+    __slots__ = ("_array", "_row")
+
+    def __init__(self, array, row: int):
+        self._array = array
+        self._row = row
+
+    x = property(
+        lambda self: float(self._array[self._row, 0]),
+        lambda self, v: self._array.__setitem__((self._row, 0), v),
+    )
+    y = property(
+        lambda self: float(self._array[self._row, 1]),
+        lambda self, v: self._array.__setitem__((self._row, 1), v),
+    )
+    z = property(
+        lambda self: float(self._array[self._row, 2]),
+        lambda self, v: self._array.__setitem__((self._row, 2), v),
+    )
+
+    def __repr__(self):
+        return f"Vector3D(x={self.x}, y={self.y}, z={self.z})"
+
+
+class _RowMapping(MutableMapping):
+    """エンジン配列の1行をプレイヤー名キーの辞書のように見せるビュー"""
+
+    def __init__(self, game: "BatchedPongGame", attr: str, cast):
+        self._game = game
+        self._attr = attr
+        self._cast = cast
+
+    def _column(self, username: str) -> int:
+        if username == self._game.player1_name:
+            return 0
+        if username == self._game.player2_name:
+            return 1
+        raise KeyError(username)
+
+    def __getitem__(self, username):
+        array = getattr(self._game.engine, self._attr)
+        return self._cast(array[self._game.row, self._column(username)])
+
+    def __setitem__(self, username, value):
+        array = getattr(self._game.engine, self._attr)
+        array[self._game.row, self._column(username)] = value
+
+    def __delitem__(self, username):
+        raise TypeError("players cannot be removed from a match")
+
+    def __iter__(self):
+        return iter((self._game.player1_name, self._game.player2_name))
+
+    def __len__(self):
+        return 2
+
+    def copy(self) -> dict:
+        return dict(self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class BatchedPongGame(MultiplayerPongGame):
+    """BatchedPongEngine の1行に対する MultiplayerPongGame 互換ビュー
+
+    属性の読み書きはエンジンの配列に直接反映されるため、既存の
+    コンシューマやテストからはこれまで通りのAPIで扱える。
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        player1_name: str,
+        player2_name: str,
+        engine: BatchedPongEngine,
+    ):
+        self.engine = engine
+        self.row = engine.allocate()
+        self._detached = False
+        self.player1_name = player1_name
+        self.player2_name = player2_name
+        # MultiplayerPongGame.__init__ は状態を属性代入で初期化するため
+        # 配列に書き込む形で BaseGameLogic の初期化だけを行う
+        super(MultiplayerPongGame, self).__init__(session_id)
+
+    @property
+    def ball(self):
+        return _RowVector(self.engine.ball, self.row)
+
+    @ball.setter
+    def ball(self, value):
+        self.engine.ball[self.row] = (value.x, value.y, value.z)
+
+    @property
+    def ball_velocity(self):
+        return _RowVector(self.engine.velocity, self.row)
+
+    @ball_velocity.setter
+    def ball_velocity(self, value):
+        self.engine.velocity[self.row] = (value.x, value.y, value.z)
+
+    @property
+    def paddles(self):
+        return _RowMapping(self, "paddles", float)
+
+    @property
+    def paddle_directions(self):
+        return _RowMapping(self, "directions", int)
+
+    @property
+    def score(self):
+        return _RowMapping(self, "score", int)
+
+    @property
+    def is_active(self) -> bool:
+        return bool(self.engine.active[self.row])
+
+    @is_active.setter
+    def is_active(self, value: bool) -> None:
+        self.engine.active[self.row] = value
+
+    def update(self, delta_time: float) -> dict:
+        """この試合の行だけを進める（通常はスケジューラが全行をまとめて進める）"""
+        self.engine.step(delta_time, rows=[self.row])
+        return self.get_state()
+
+    def close(self) -> None:
+        """共有エンジンの行を解放し、専用の1行エンジンへ状態を退避する
+
+        終了後も保存処理などで状態を参照できるよう、ビューとしての
+        振る舞いは維持する。
+        """
+        if self._detached:
+            return
+        shared, row = self.engine, self.row
+        detached = BatchedPongEngine(capacity=1, game_class=shared.game_class)
+        new_row = detached.allocate()
+        for attr in ("ball", "velocity", "paddles", "directions", "score", "active"):
+            getattr(detached, attr)[new_row] = getattr(shared, attr)[row]
+        self.engine, self.row = detached, new_row
+        self._detached = True
+        shared.release(row)
@@ -0,0 +1,153 @@
+# api/pong/bracket.py
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+# 試合の位置（ラウンド番号, ラウンド内の番号）。ラウンド0が1回戦
+MatchKey = Tuple[int, int]
+
+_ROUND_NAMES = ("final", "semi", "quarter")
+_ROUND_TYPE = re.compile(r"^(?:final|semi(\d+)|quarter(\d+)|r(\d+)-(\d+))$")
+
+
+def bracket_size(player_count: int) -> int:
+    """参加人数を収められる2の累乗のブラケットの大きさ（不足分は不戦勝）"""
+    size = 2
+    while size < player_count:
+        size *= 2
+    return size
+
+
+def seed_positions(size: int) -> List[int]:
+    """ブラケットの位置（1始まり）ごとのシード順位
+
+    上位シード同士が決勝まで当たらない標準的な配置
+    （4人なら 1-4, 2-3、8人なら 1-8, 4-5, 2-7, 3-6）。
+    """
+    order = [1]
+    while len(order) < size:
+        total = len(order) * 2 + 1
+        order = [seed for top in order for seed in (top, total - top)]
+    return order
+
+
+def seed_slots(players: List[str]) -> Dict[int, str]:
+    """シード順に並べたプレイヤーをブラケットの位置に配置
+
+    参加人数が2の累乗でなければ、上位シードの相手を空き（不戦勝）にする。
+    """
+    size = bracket_size(len(players))
+    return {
+        slot: players[seed - 1]
+        for slot, seed in enumerate(seed_positions(size), start=1)
+        if seed <= len(players)
+    }
+
+
+def round_name(round_number: int, rounds: int) -> str:
+    """ラウンドの名前（final, semi, quarter、それ以前は r<番号>-）"""
+    remaining = rounds - 1 - round_number
+    if remaining < len(_ROUND_NAMES):
+        return _ROUND_NAMES[remaining]
+    return f"r{round_number + 1}-"
+
+
+def round_type(round_number: int, index: int, rounds: int) -> str:
+    """セッションIDに埋め込む試合の種類（final, semi1, quarter3, r1-5 など）"""
+    name = round_name(round_number, rounds)
+    return name if name == "final" else f"{name}{index + 1}"
+
+
+def parse_round_type(value: str, rounds: int) -> Optional[MatchKey]:
+    """round_type から試合の位置を求める（形式が不正なら None）"""
+    matched = _ROUND_TYPE.match(value)
+    if not matched:
+        return None
+    semi, quarter, round_number, index = matched.groups()
+    if semi:
+        return rounds - 2, int(semi) - 1
+    if quarter:
+        return rounds - 3, int(quarter) - 1
+    if round_number:
+        return int(round_number) - 1, int(index) - 1
+    return rounds - 1, 0
+
+
+class Bracket:
+    """シングルエリミネーションのブラケット
+
+    1回戦の対戦はブラケットの位置（slots）から決まり、以降の試合
+    (r, i) には (r-1, 2i) と (r-1, 2i+1) の勝者が進む。結果を1件記録する
+    たびに確認するのは次の1試合だけなので、64人（63試合）でも1試合
+    あたりの処理は一定。
+    """
+
+    def __init__(self, slots: Dict[int, str]):
+        self.slots = dict(slots)
+        self.size = bracket_size(len(self.slots))
+        self.rounds = self.size.bit_length() - 1
+        self.winners: Dict[MatchKey, str] = {}
+        self.byes: Set[MatchKey] = set()
+        positions = seed_positions(self.size)
+        self.seeds = {
+            player: positions[slot - 1] for slot, player in self.slots.items()
+        }
+
+        # 相手のいない1回戦は不戦勝
+        for index in range(self.size // 2):
+            player1, player2 = self.players(0, index)
+            if (player1 is None) != (player2 is None):
+                self.winners[(0, index)] = player1 or player2
+                self.byes.add((0, index))
+
+    def players(
+        self, round_number: int, index: int
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """試合の対戦者（まだ決まっていなければ None）"""
+        if round_number == 0:
+            return self.slots.get(2 * index + 1), self.slots.get(2 * index + 2)
+        return (
+            self.winners.get((round_number - 1, 2 * index)),
+            self.winners.get((round_number - 1, 2 * index + 1)),
+        )
+
+    def is_ready(self, round_number: int, index: int) -> bool:
+        """対戦者がそろい、まだ結果が出ていない試合か"""
+        player1, player2 = self.players(round_number, index)
+        return (
+            player1 is not None
+            and player2 is not None
+            and (round_number, index) not in self.winners
+        )
+
+    def ready_matches(self) -> List[MatchKey]:
+        """対戦者がそろった全ての試合（トーナメント開始時に一度だけ使う）"""
+        return [
+            (round_number, index)
+            for round_number in range(self.rounds)
+            for index in range(self.size >> (round_number + 1))
+            if self.is_ready(round_number, index)
+        ]
+
+    def record(self, round_number: int, index: int, winner: str) -> bool:
+        """試合の勝者を記録（記録済みなら何もせず False）"""
+        key = (round_number, index)
+        if key in self.winners:
+            return False
+        self.winners[key] = winner
+        return True
+
+    def walkover_winner(self, round_number: int, index: int) -> Optional[str]:
+        """勝者のないまま終了した試合で勝ち上がるプレイヤー（シード上位）"""
+        players = [player for player in self.players(round_number, index) if player]
+        return min(players, key=self.seeds.__getitem__) if players else None
+
+    def next_ready(self, round_number: int, index: int) -> Optional[MatchKey]:
+        """この試合の勝者が進む試合の対戦者がそろっていればその位置を返す"""
+        if round_number + 1 >= self.rounds:
+            return None
+        parent = (round_number + 1, index // 2)
+        return parent if self.is_ready(*parent) else None
+
+    @property
+    def champion(self) -> Optional[str]:
+        return self.winners.get((self.rounds - 1, 0))
@@ -0,0 +1,130 @@
+# api/pong/checkpoint.py
+import json
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .game_logic import MultiplayerPongGame, Vector3D
+from .redis_client import get_redis
+
+CHECKPOINT_VERSION = 1
+
+
+def snapshot_game(game: MultiplayerPongGame) -> Dict:
+    """試合の再開に必要な最小限の状態を辞書にまとめる"""
+    players = (game.player1_name, game.player2_name)
+    return {
+        "v": CHECKPOINT_VERSION,
+        "players": list(players),
+        "tick": game.tick,
+        "ball": [float(game.ball.x), float(game.ball.y), float(game.ball.z)],
+        "velocity": [
+            float(game.ball_velocity.x),
+            float(game.ball_velocity.y),
+            float(game.ball_velocity.z),
+        ],
+        "paddles": [float(game.paddles[name]) for name in players],
+        "directions": [int(game.paddle_directions[name]) for name in players],
+        "score": [int(game.score[name]) for name in players],
+        "active": bool(game.is_active),
+        "db_game_id": game.db_game_id,
+    }
+
+
+def restore_game(game: MultiplayerPongGame, checkpoint: Dict) -> bool:
+    """チェックポイントの状態をゲームに書き戻す（プレイヤーが一致しない場合は無視）"""
+    players = (game.player1_name, game.player2_name)
+    if (
+        checkpoint.get("v") != CHECKPOINT_VERSION
+        or tuple(checkpoint["players"]) != players
+    ):
+        return False
+
+    game.ball = Vector3D(*checkpoint["ball"])
+    game.ball_velocity = Vector3D(*checkpoint["velocity"])
+    directions = checkpoint.get("directions", (0, 0))
+    for name, x, direction, score in zip(
+        players, checkpoint["paddles"], directions, checkpoint["score"]
+    ):
+        game.paddles[name] = x
+        game.paddle_directions[name] = direction
+        game.score[name] = score
+    game.is_active = checkpoint["active"]
+    game.tick = checkpoint["tick"]
+    if checkpoint.get("db_game_id") is not None:
+        game.db_game_id = checkpoint["db_game_id"]
+    return True
+
+
+def encode_checkpoint(checkpoint: Dict) -> bytes:
+    return json.dumps(checkpoint, separators=(",", ":")).encode()
+
+
+def decode_checkpoint(data: bytes) -> Dict:
+    return json.loads(data)
+
+
+class LocalCheckpointStore:
+    """プロセス内で完結するチェックポイント保存先（テスト・単一ワーカー用）"""
+
+    def __init__(self):
+        self._checkpoints: Dict[str, Tuple[bytes, float]] = {}
+
+    async def save_many(self, checkpoints: Dict[str, Dict], ttl: float) -> None:
+        expires_at = time.monotonic() + ttl
+        for session_id, checkpoint in checkpoints.items():
+            self._checkpoints[session_id] = (encode_checkpoint(checkpoint), expires_at)
+
+    async def load(self, session_id: str) -> Optional[Dict]:
+        entry = self._checkpoints.get(session_id)
+        if entry is None or entry[1] <= time.monotonic():
+            self._checkpoints.pop(session_id, None)
+            return None
+        return decode_checkpoint(entry[0])
+
+    async def delete(self, session_id: str) -> None:
+        self._checkpoints.pop(session_id, None)
+
+
+class RedisCheckpointStore:
+    """Redis 上で全ワーカーが共有するチェックポイント保存先
+
+    pong:checkpoint:{session_id} に TTL 付きで保存する。所有ワーカーが
+    停止してもリースより長く残るため、別のワーカーが試合を引き継げる。
+    """
+
+    KEY_PREFIX = "pong:checkpoint:"
+
+    async def save_many(self, checkpoints: Dict[str, Dict], ttl: float) -> None:
+        # 全試合分を1往復で書き込む
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for session_id, checkpoint in checkpoints.items():
+                pipe.set(
+                    self.KEY_PREFIX + session_id,
+                    encode_checkpoint(checkpoint),
+                    px=int(ttl * 1000),
+                )
+            await pipe.execute()
+
+    async def load(self, session_id: str) -> Optional[Dict]:
+        data = await get_redis().get(self.KEY_PREFIX + session_id)
+        return decode_checkpoint(data) if data is not None else None
+
+    async def delete(self, session_id: str) -> None:
+        await get_redis().delete(self.KEY_PREFIX + session_id)
+
+
+_store = None
+
+
+def get_checkpoint_store():
+    """設定（PONG_PLACEMENT_BACKEND）に応じたチェックポイント保存先を取得"""
+    global _store
+    if _store is None:
+        backend = getattr(settings, "PONG_PLACEMENT_BACKEND", "redis")
+        if backend == "local":
+            _store = LocalCheckpointStore()
+        else:
+            _store = RedisCheckpointStore()
+    return _store
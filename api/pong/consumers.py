@@ -1,25 +1,36 @@
-import asyncio
 import json
-import time
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 
 from .base_consumers import BaseGameConsumer
-from .game_logic import MultiplayerPongGame
+from .matchmaking import get_matchmaker, get_matchmaking_queue, make_ticket
+from .outbound_queue import QueuedSendMixin
 from .models import Game, User
+from .reservation import EXPIRED, PENDING, READY, get_reservation_store
 
 
-class MatchmakingConsumer(AsyncWebsocketConsumer):
-    waiting_players = []  # クラス変数として待機プレイヤーを管理
+class MatchmakingConsumer(QueuedSendMixin, AsyncWebsocketConsumer):
+    """ランダムマッチのマッチメイキング
+
+    待機列は全ワーカーで共有し（get_matchmaking_queue）、組み合わせは
+    Matchmaker が一定間隔でレベルの近いプレイヤー同士を選んで決める。
+    マッチしたプレイヤーにはチャンネルレイヤー経由で match_found が届くため、
+    別々のワーカーに接続したプレイヤー同士でもマッチできる。
+    """
 
     async def connect(self):
+        self.username = None
         await self.accept()
         print("Client connected to matchmaking")
 
     async def disconnect(self, close_code):
-        if self in self.waiting_players:
-            self.waiting_players.remove(self)
+        if self.username:
+            try:
+                await get_matchmaking_queue().cancel(self.username, self.channel_name)
+            except Exception as e:
+                print(f"Error leaving matchmaking: {e}")
         print("Client disconnected from matchmaking")
 
     async def receive(self, text_data):
@@ -38,69 +49,168 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
 
     async def join_matchmaking(self):
         print(f"Player {self.username} joining matchmaking")
-        print(f"Current waiting players: {len(self.waiting_players)}")
-
-        self.waiting_players.append(self)
+        level = await self.get_level(self.username)
+        await get_matchmaker().join(
+            make_ticket(self.username, self.channel_name, level=level)
+        )
         await self.send(
             json.dumps({"type": "waiting", "message": "Waiting for opponent..."})
         )
 
-        print(f"After joining: {len(self.waiting_players)} players waiting")
-        if len(self.waiting_players) >= 2:
-            player1 = self.waiting_players.pop(0)
-            player2 = self.waiting_players.pop(0)
+        print(f"After joining: {await get_matchmaking_queue().size()} players waiting")
+
+    @database_sync_to_async
+    def get_level(self, username):
+        """マッチングに使うプレイヤーのレベルを取得"""
+        user = User.objects.filter(username=username).only("level").first()
+        return user.level if user else 1
 
-            match_data = {
-                "type": "match_found",
-                "session_id": f"game_{player1.username}_{player2.username}_{int(time.time())}",
-                "player1": player1.username,
-                "player2": player2.username,
-            }
+    async def match_found(self, event):
+        """マッチ成立の通知（どのワーカーでマッチしても届く）"""
+        await self.send(json.dumps(event["match"]))
 
-            print(f"Match found! Creating game session: {match_data}")
-            await player1.send(json.dumps(match_data))
-            await player2.send(json.dumps(match_data))
+    async def match_cancelled(self, event):
+        """参加期限までにゲームへ接続しなかった場合の取り消しの通知"""
+        await self.send(json.dumps(event["match"]))
 
 
 class GameConsumer(BaseGameConsumer):
-    """マルチプレイヤー向けゲームコンシューマ"""
+    """マルチプレイヤー向けゲームコンシューマ
+
+    ゲームの WebSocket への接続をマッチの参加（予約の accept）とみなし、
+    両プレイヤーが参加期限内にそろうまで試合は作成しない。期限が切れると
+    参加済みのプレイヤーは待機列に戻り、この接続で次の match_found を受け取る。
+    """
 
     async def connect(self):
         """マルチプレイヤー固有の接続処理"""
+        self.match_players = None
+        self.match_started = False
         await super().connect()
 
-        # セッションIDからゲームインスタンス作成
-        if self.session_id not in self.games:
-            # セッションIDからプレイヤー名を抽出
-            # 想定形式: game_player1_player2_timestamp
-            parts = self.session_id.split("_")
-            if len(parts) >= 3:  # game_type + player1 + player2 + timestamp
-                player1_name = parts[1]
-                player2_name = parts[2]
-
-                self.games[self.session_id] = MultiplayerPongGame(
-                    session_id=self.session_id,
-                    player1_name=player1_name,
-                    player2_name=player2_name,
+        # セッションを所有するワーカーでのみ試合を作成
+        if not await self.ensure_session_owner():
+            return
+
+        # 既に試合が始まっていれば購読するだけ
+        if self.session_id in self.games:
+            await self.start_match()
+            return
+
+        # セッションIDからプレイヤー名を抽出
+        # 想定形式: game_player1_player2_timestamp
+        parts = self.session_id.split("_")
+        if len(parts) < 3:  # game_type + player1 + player2 + timestamp
+            return
+        self.match_players = (parts[1], parts[2])
+
+        # 両プレイヤーが参加期限内にそろってから試合を作成する
+        status = await self.accept_reservation()
+        if status == EXPIRED:
+            await self.send(
+                json.dumps(
+                    {
+                        "type": "match_cancelled",
+                        "session_id": self.session_id,
+                        "reason": "accept_timeout",
+                        "requeued": False,
+                    }
                 )
+            )
+            await self.close(code=4002)
+        elif status == PENDING:
+            await self.send(
+                json.dumps({"type": "waiting", "message": "Waiting for opponent..."})
+            )
+            get_matchmaker().watch()
+        else:
+            await self.start_match()
+            # 先に接続して待っている相手にも開始を通知
+            await self.fanout.group_send(self.game_group_name, {"type": "match_ready"})
+
+    async def accept_reservation(self):
+        """このプレイヤーの参加を予約に記録（予約を確認できなければ開始する）"""
+        try:
+            return await get_reservation_store().accept(
+                self.session_id,
+                self.match_players,
+                self.username,
+                self.channel_name,
+                getattr(settings, "PONG_MATCH_ACCEPT_TIMEOUT", 10),
+            )
+        except Exception as e:
+            print(f"Error accepting reservation {self.session_id}: {e}")
+            return READY
+
+    async def start_match(self):
+        """試合を作成してスケジューラに登録（既にあれば購読）"""
+        self.match_started = True
+        if self.session_id in self.games:
+            await self.join_match(self.games[self.session_id])
+            return
 
-                # DBゲーム情報を設定
-                game_instance = await self.get_or_create_game()
-                if game_instance:
-                    self.games[self.session_id].db_game_id = game_instance.id
+        player1_name, player2_name = self.match_players
+        # スケジューラに登録（以降の更新はスケジューラが担当）
+        game = await self.join_match(
+            self.scheduler.create_game(
+                session_id=self.session_id,
+                player1_name=player1_name,
+                player2_name=player2_name,
+            )
+        )
 
-        # ゲーム更新ループの開始
-        self.game_task = asyncio.create_task(self.game_loop())
+        # DBゲーム情報を設定
+        game_instance = await self.get_or_create_game()
+        if game_instance:
+            game.db_game_id = game_instance.id
+
+    async def match_ready(self, event):
+        """相手がそろった通知（参加待ちだったコンシューマが試合を購読する）
+
+        待っている間に他のワーカーへ所有権が移っていれば、ここで試合を
+        作らずにそのワーカーへ誘導する。
+        """
+        if self.fanout.is_local_echo(self.game_group_name, self, event):
+            return
+        if not self.match_started and self.match_players:
+            if not await self.ensure_session_owner():
+                return
+            await self.start_match()
+
+    async def match_cancelled(self, event):
+        """予約の期限切れの通知（参加済みのプレイヤーは待機列に戻っている）"""
+        if not self.match_started:
+            self.scheduler.unregister(self.session_id)
+            await self.delete_unfinished_game()
+        await self.send(json.dumps(event["match"]))
+
+    async def match_found(self, event):
+        """待機列に戻った後の次のマッチの通知"""
+        await self.send(json.dumps(event["match"]))
 
     async def disconnect(self, close_code):
         """マルチプレイヤー固有の切断処理"""
+        # 参加待ちのまま切断した場合は参加と待機列への復帰を取り消す
+        if not self.match_started and self.match_players:
+            try:
+                await get_reservation_store().withdraw(
+                    self.session_id, self.username, self.channel_name
+                )
+                await get_matchmaking_queue().cancel(self.username, self.channel_name)
+            except Exception as e:
+                print(f"Error withdrawing from {self.session_id}: {e}")
+            # 試合を作成していなければ所有権を手放す
+            if self.session_id not in self.games:
+                self.scheduler.unregister(self.session_id)
+
         # ゲームが存在する場合、切断処理を実行
         if self.session_id in self.games:
             game = self.games[self.session_id]
+            self.scheduler.unregister(self.session_id)
             game.handle_disconnection(self.username)
 
             # 残ったプレイヤーに切断を通知
-            await self.channel_layer.group_send(
+            await self.fanout.group_send(
                 self.game_group_name,
                 {
                     "type": "player_disconnected",
@@ -111,21 +221,20 @@ class GameConsumer(BaseGameConsumer):
 
             # ゲーム状態を保存
             await self.save_game_state(game)
-            del self.games[self.session_id]
 
         await super().disconnect(close_code)
 
-    async def game_loop(self):
-        """マルチプレイヤー固有のゲームループ処理"""
+    @database_sync_to_async
+    def delete_unfinished_game(self):
+        """開始されなかった試合の DB レコードを削除"""
         try:
-            await super().game_loop()
-            # ゲーム終了時の処理
-            if self.session_id in self.games:
-                game = self.games[self.session_id]
-                await self.save_game_state(game)
-                del self.games[self.session_id]
+            Game.objects.filter(
+                session_id=self.session_id,
+                status__in=("WAITING", "IN_PROGRESS"),
+                winner__isnull=True,
+            ).delete()
         except Exception as e:
-            print(f"Error in multiplayer game loop: {e}")
+            print(f"Error deleting unfinished game {self.session_id}: {e}")
 
     @database_sync_to_async
     def get_or_create_game(self):
@@ -0,0 +1,75 @@
+# api/pong/game_clock.py
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+
+@dataclass
+class TickStats:
+    """試合ごとのティック統計"""
+
+    ticks: int = 0  # 実行したシミュレーションステップ数
+    late_ticks: int = 0  # 締め切りに遅れて追い付き実行したステップ数
+    dropped_steps: int = 0  # 追い付き上限を超えて破棄したステップ数
+
+    def record(self, steps: int, dropped: int) -> None:
+        self.ticks += steps
+        self.late_ticks += max(steps - 1, 0)
+        self.dropped_steps += dropped
+
+
+class FixedTimestepClock:
+    """単調時計の締め切りに基づく固定タイムステップ時計
+
+    経過時間をアキュムレータに積み、ステップ幅ごとにシミュレーションを
+    進める。イベントループが遅延しても追い付きステップでゲーム速度を
+    一定に保ち、上限を超えた分は破棄して死のスパイラルを防ぐ。
+    """
+
+    def __init__(
+        self,
+        step: float = 1 / 60,
+        max_catch_up_steps: int = 5,
+        time_source: Callable[[], float] = time.monotonic,
+    ):
+        self.step = step
+        self.max_catch_up_steps = max_catch_up_steps
+        self._now = time_source
+        self.accumulator = 0.0
+        self.last_time = None
+        # 直近の advance() の結果
+        self.last_dropped = 0
+        # 累計
+        self.late_steps = 0
+        self.dropped_steps = 0
+
+    def start(self) -> None:
+        """計測を開始（アキュムレータをリセット）"""
+        self.accumulator = 0.0
+        self.last_time = self._now()
+
+    def advance(self) -> int:
+        """経過時間を取り込み、今実行すべきステップ数を返す"""
+        if self.last_time is None:
+            self.start()
+
+        now = self._now()
+        self.accumulator += now - self.last_time
+        self.last_time = now
+
+        # 浮動小数点誤差で締め切りちょうどのステップを取りこぼさないよう補正
+        steps = int((self.accumulator + 1e-9) // self.step)
+        dropped = max(steps - self.max_catch_up_steps, 0)
+        steps -= dropped
+        # 破棄したステップ分の時間も消費する
+        self.accumulator -= (steps + dropped) * self.step
+
+        self.last_dropped = dropped
+        self.late_steps += max(steps - 1, 0)
+        self.dropped_steps += dropped
+        return steps
+
+    def time_until_next_step(self) -> float:
+        """次のステップの締め切りまでの秒数"""
+        elapsed = self._now() - self.last_time if self.last_time is not None else 0
+        return max(self.step - self.accumulator - elapsed, 0.0)
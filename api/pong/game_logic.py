@@ -1,7 +1,7 @@
 # game_logic.py
 from dataclasses import dataclass
 import random
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from django.utils import timezone
 
 
@@ -19,10 +19,11 @@ class BaseGameLogic:
     FIELD_WIDTH = 1200
     FIELD_LENGTH = 3000
     PADDLE_WIDTH = 200
+    PADDLE_THICKNESS = 20
     BALL_RADIUS = 30
     INITIAL_BALL_SPEED = 300
-    # FIXME: need to adjust
-    PADDLE_SPEED = 50
+    # 方向入力モードでのパドル移動速度（1秒あたり、シングルプレイと同じ）
+    PADDLE_SPEED = 1500
     # FIXME: for develop. it must be 15
     WINNING_SCORE = 3
 
@@ -32,6 +33,8 @@ class BaseGameLogic:
         self.is_active = True
         self.db_game_id = None
         self.last_update = timezone.now()
+        # サーバーティック番号（スケジューラがステップごとに進める）
+        self.tick = 0
 
     def update(self, delta_time: float) -> Dict:
         """ゲーム状態更新の基本実装"""
@@ -46,6 +49,11 @@ class BaseGameLogic:
         # サブクラスで実装
         pass
 
+    def set_paddle_direction(self, username: str, direction: int) -> None:
+        """パドルの移動方向設定の基本実装"""
+        # サブクラスで実装
+        pass
+
     def handle_disconnection(self, disconnected_player: str) -> None:
         """プレイヤー切断の基本処理"""
         # サブクラスで実装
@@ -61,6 +69,11 @@ class BaseGameLogic:
         # サブクラスで実装
         return None
 
+    def close(self) -> None:
+        """スケジューラから外れた際のリソース解放"""
+        # サブクラスで実装
+        pass
+
 
 class MultiplayerPongGame(BaseGameLogic):
     """2プレイヤー向けゲームロジック"""
@@ -81,19 +94,19 @@ class MultiplayerPongGame(BaseGameLogic):
             player2_name: 0,
         }
         self.score = {player1_name: 0, player2_name: 0}
+        # 方向入力モードの移動方向（-1: 左, 0: 停止, 1: 右）
+        self.paddle_directions = {player1_name: 0, player2_name: 0}
 
     def update(self, delta_time: float) -> Dict:
         """ゲーム状態の更新処理"""
         if not self.is_active:
             return self.get_state()
 
-        # ボールの移動
-        self.ball.x += self.ball_velocity.x * delta_time
-        self.ball.z += self.ball_velocity.z * delta_time
+        # 方向入力中のパドルを移動
+        self._move_paddles(delta_time)
 
-        # 衝突判定と処理
-        self._handle_wall_collision()
-        self._handle_paddle_collision()
+        # ボールの移動と衝突処理（パドルは連続衝突判定）
+        self._move_ball_swept(delta_time)
         self._check_scoring()
 
         return self.get_state()
@@ -107,6 +120,15 @@ class MultiplayerPongGame(BaseGameLogic):
         max_x = (self.FIELD_WIDTH - self.PADDLE_WIDTH) / 2
         self.paddles[username] = max(min(new_x, max_x), -max_x)
 
+    def set_paddle_direction(self, username: str, direction: int) -> None:
+        """移動方向を設定（以降はティックごとに PADDLE_SPEED で移動）
+
+        位置を毎フレーム送る代わりに、キーの押下・解放時にだけ送ればよい。
+        """
+        if username not in self.paddle_directions:
+            return
+        self.paddle_directions[username] = (direction > 0) - (direction < 0)
+
     def get_state(self) -> dict:
         """現在のゲーム状態を辞書形式で返す"""
         return {
@@ -128,8 +150,9 @@ class MultiplayerPongGame(BaseGameLogic):
                     "z": -self.FIELD_LENGTH / 2,
                 },
             },
-            "score": self.score,
+            "score": dict(self.score),
             "is_active": self.is_active,
+            "tick": self.tick,
         }
 
     def get_winner(self) -> Optional[str]:
@@ -155,43 +178,71 @@ class MultiplayerPongGame(BaseGameLogic):
         self.is_active = False
 
     # 以下、プライベートメソッド
+    def _move_paddles(self, delta_time: float) -> None:
+        for username, direction in self.paddle_directions.items():
+            if direction:
+                self.move_player(
+                    username,
+                    self.paddles[username] + direction * self.PADDLE_SPEED * delta_time,
+                )
+
     def _handle_wall_collision(self) -> None:
         if abs(self.ball.x) > self.FIELD_WIDTH / 2:
             self.ball_velocity.x *= -1
             self.ball.x = (self.FIELD_WIDTH / 2) * (1 if self.ball.x > 0 else -1)
 
-    def _handle_paddle_collision(self) -> None:
-        paddle_z = self.FIELD_LENGTH / 2
-
-        for username, paddle_x in self.paddles.items():
-            if self._check_paddle_hit(
-                paddle_x, paddle_z if username == self.player1_name else -paddle_z
-            ):
-                self.ball_velocity.z *= -1
-                self.ball_velocity.x += (self.ball.x - paddle_x) * 0.1
-
-    def _check_paddle_hit(self, paddle_x: float, paddle_z: float) -> bool:
-        """パドルとボールの衝突を判定"""
-        paddle_half_width = self.PADDLE_WIDTH / 2
-        ball_radius = self.BALL_RADIUS
-
-        # パドルのバウンディングボックス
-        paddle_bounds = {
-            "min_x": paddle_x - paddle_half_width,
-            "max_x": paddle_x + paddle_half_width,
-            "min_z": paddle_z - 10,  # パドルの厚さ
-            "max_z": paddle_z + 10,
-        }
+    def _move_ball_swept(self, delta_time: float) -> None:
+        """ボールを移動し、ティック内でのパドルとの衝突時刻を厳密に求めて反射
 
-        # ボールがパドルの範囲内にあるかチェック
-        is_hit = (
-            self.ball.x + ball_radius > paddle_bounds["min_x"]
-            and self.ball.x - ball_radius < paddle_bounds["max_x"]
-            and self.ball.z + ball_radius > paddle_bounds["min_z"]
-            and self.ball.z - ball_radius < paddle_bounds["max_z"]
-        )
+        移動後の位置だけで判定するとティックが遅れた場合や高速時に
+        パドルをすり抜けるため、移動区間とパドル前面の交差を判定する。
+        """
+        impact = self._find_paddle_impact(delta_time)
+        if impact is None:
+            self._advance_ball(delta_time)
+            return
+
+        time_of_impact, paddle_x = impact
+        self._advance_ball(delta_time * time_of_impact)
+        self.ball_velocity.z *= -1
+        self.ball_velocity.x += (self.ball.x - paddle_x) * 0.1
+        # 衝突後の残り時間分を反射後の速度で進める
+        self._advance_ball(delta_time * (1 - time_of_impact))
+
+    def _advance_ball(self, delta_time: float) -> None:
+        self.ball.x += self.ball_velocity.x * delta_time
+        self.ball.z += self.ball_velocity.z * delta_time
+        self._handle_wall_collision()
 
-        return is_hit
+    def _find_paddle_impact(self, delta_time: float) -> Optional[Tuple[float, float]]:
+        """近づいているパドルとの衝突時刻（0〜1）とパドルのX座標を返す"""
+        velocity_z = self.ball_velocity.z
+        if velocity_z == 0 or delta_time <= 0:
+            return None
+
+        # ボールが向かっている側のパドル（player1: +z, player2: -z）
+        direction = 1 if velocity_z > 0 else -1
+        username = self.player1_name if direction > 0 else self.player2_name
+        paddle_x = self.paddles[username]
+
+        # 進行方向の軸に沿った距離で判定
+        front = self.FIELD_LENGTH / 2 - self.PADDLE_THICKNESS / 2
+        contact = front - self.BALL_RADIUS
+        start = direction * self.ball.z
+        end = start + abs(velocity_z) * delta_time
+
+        # 既にパドル前面を越えている、またはこのティックで届かない
+        if start > front or end < contact:
+            return None
+
+        time_of_impact = max((contact - start) / (end - start), 0.0)
+        half_width = self.FIELD_WIDTH / 2
+        impact_x = self.ball.x + self.ball_velocity.x * delta_time * time_of_impact
+        impact_x = max(min(impact_x, half_width), -half_width)
+        if abs(impact_x - paddle_x) >= self.PADDLE_WIDTH / 2 + self.BALL_RADIUS:
+            return None
+
+        return time_of_impact, paddle_x
 
     def _check_scoring(self) -> None:
         if abs(self.ball.z) > self.FIELD_LENGTH / 2:
@@ -0,0 +1,510 @@
+# api/pong/game_scheduler.py
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from django.conf import settings
+
+from .batched_physics import BatchedPongEngine, BatchedPongGame
+from .checkpoint import get_checkpoint_store, restore_game, snapshot_game
+from .game_clock import FixedTimestepClock, TickStats
+from .game_logic import BaseGameLogic, MultiplayerPongGame
+from .input_buffer import DIRECTION, InputBuffer, apply_input
+from .local_fanout import local_fanout
+from .placement import get_placement_registry
+from .rewind import RewindBuffer
+from .wire_format import encode_frames
+from .worker import WORKER_ID
+
+
+@dataclass
+class ScheduledMatch:
+    """スケジューラが管理する1試合分の情報"""
+
+    session_id: str
+    game: BaseGameLogic
+    group_name: str
+    # 試合を保持している games 辞書（BaseGameConsumer.games など）
+    registry: Dict[str, BaseGameLogic]
+    # 試合終了時に一度だけ呼ばれるコールバック
+    on_finish: Optional[Callable[[BaseGameLogic], Awaitable[None]]] = None
+    # 購読中のチャンネル名 → 送信形式（サブプロトコル、JSONの場合は None）
+    subscribers: Dict[str, Optional[str]] = field(default_factory=dict)
+    # チャンネル名 → (プレイヤー名, 入力バッファ)。ティックの開始時に適用する
+    inputs: Dict[str, Tuple[str, InputBuffer]] = field(default_factory=dict)
+    # 遅れて届いた入力を発行時点のティックに適用するための履歴
+    rewind: Optional[RewindBuffer] = None
+    last_broadcast_tick: Optional[int] = None
+    stats: TickStats = field(default_factory=TickStats)
+    # 放置・放棄の判定用（time.monotonic() の時刻）
+    last_input_at: float = field(default_factory=time.monotonic)
+    empty_since: Optional[float] = field(default_factory=time.monotonic)
+    # 連続して更新に失敗した回数
+    errors: int = 0
+
+
+class GameScheduler:
+    """プロセス内の全試合を単一のループで駆動するスケジューラ
+
+    コンシューマは試合を登録・購読するだけで、各試合は1フレームに
+    ちょうど1回だけ更新される。
+    """
+
+    def __init__(self, tick_rate: Optional[int] = None, max_catch_up_steps=None):
+        self.tick_rate = tick_rate or getattr(settings, "PONG_TICK_RATE", 60)
+        self.clock = FixedTimestepClock(
+            step=1 / self.tick_rate,
+            max_catch_up_steps=max_catch_up_steps
+            or getattr(settings, "PONG_MAX_CATCH_UP_STEPS", 5),
+        )
+        # "batched" の場合は全試合を1つのベクトル化エンジンでまとめて進める
+        physics_engine = getattr(settings, "PONG_PHYSICS_ENGINE", "python")
+        self.engine = BatchedPongEngine() if physics_engine == "batched" else None
+        self.matches: Dict[str, ScheduledMatch] = {}
+        # 同一プロセスの購読者へは Redis を経由せず直接配信する
+        self.fanout = local_fanout
+        # ラグ補償で巻き戻せるティック数（0 で無効）
+        self.rewind_ticks = getattr(settings, "PONG_REWIND_TICKS", 12)
+        # 状態の送信はシミュレーションとは独立した送信レートで行う
+        # （接続ごとにさらに間引く場合は SendRateController が判定）
+        send_rate = getattr(settings, "PONG_SEND_RATE", self.tick_rate)
+        self.broadcast_interval = max(1, round(self.tick_rate / send_rate))
+        # このワーカーが所有権（配置リース）を持つセッション
+        self.owned_sessions: Set[str] = set()
+        self.placement_ttl = getattr(settings, "PONG_PLACEMENT_TTL", 30)
+        self.heartbeat_ttl = getattr(settings, "PONG_WORKER_HEARTBEAT_TTL", 6)
+        # 所有セッションの状態を定期的に保存し、ワーカー停止時に引き継げるようにする
+        self.checkpoint_interval = getattr(settings, "PONG_CHECKPOINT_INTERVAL", 1.0)
+        self.checkpoint_ttl = getattr(settings, "PONG_CHECKPOINT_TTL", 120)
+        # 購読者がいない・入力がない・更新に失敗し続ける試合を終了させる
+        self.reap_interval = getattr(settings, "PONG_REAP_INTERVAL", 5.0)
+        self.reap_empty_after = getattr(settings, "PONG_REAP_EMPTY_AFTER", 30)
+        self.reap_idle_after = getattr(settings, "PONG_REAP_IDLE_AFTER", 300)
+        self.reap_max_errors = getattr(settings, "PONG_REAP_MAX_ERRORS", 60)
+        self.reaped = {"empty": 0, "idle": 0, "errors": 0, "orphaned": 0}
+        # 登録に使われた games 辞書（BaseGameConsumer.games など）
+        self._registries: Dict[int, Dict[str, BaseGameLogic]] = {}
+        self._next_maintenance = 0.0
+        self._next_checkpoint = 0.0
+        self._next_reap = 0.0
+        self._task: Optional[asyncio.Task] = None
+        # 完了前に破棄されないよう参照を保持するバックグラウンドタスク
+        self._background: Set[asyncio.Task] = set()
+
+    async def claim(self, session_id: str) -> Optional[str]:
+        """セッションの所有権を取得する
+
+        このワーカーが所有者になれた場合は None、他のワーカーが所有して
+        いる場合はそのワーカーIDを返す。所有ワーカーの生存確認が切れて
+        いれば所有権を引き継ぐ。レジストリに接続できない場合は
+        このワーカーで処理を続ける。
+
+        所有したセッションは試合を登録する前（相手の参加待ち）でも
+        ループを開始し、生存確認とリースを延長し続ける。
+        """
+        try:
+            registry = get_placement_registry()
+            # 他ワーカーから停止中と誤認されないよう、取得前に生存を登録
+            await self._announce_worker()
+            owner = await registry.claim(session_id, WORKER_ID, self.placement_ttl)
+            if owner != WORKER_ID:
+                if await registry.worker_alive(owner):
+                    return owner
+                if not await registry.takeover(
+                    session_id, owner, WORKER_ID, self.placement_ttl
+                ):
+                    return await registry.owner(session_id)
+                print(f"Adopting session {session_id} from stopped worker {owner}")
+            self.owned_sessions.add(session_id)
+            self._ensure_running()
+        except Exception as e:
+            print(f"Error claiming session {session_id}: {e}")
+        return None
+
+    async def resume(self, game: MultiplayerPongGame) -> bool:
+        """チェックポイントが残っていれば、その時点から試合を再開する"""
+        try:
+            checkpoint = await get_checkpoint_store().load(game.session_id)
+        except Exception as e:
+            print(f"Error loading checkpoint for {game.session_id}: {e}")
+            return False
+        if checkpoint is None or not restore_game(game, checkpoint):
+            return False
+        print(f"Resumed session {game.session_id} at tick {game.tick}")
+        return True
+
+    def create_game(
+        self, session_id: str, player1_name: str, player2_name: str
+    ) -> MultiplayerPongGame:
+        """設定された物理エンジンに応じた2プレイヤー用ゲームを生成"""
+        if self.engine is not None:
+            return BatchedPongGame(
+                session_id=session_id,
+                player1_name=player1_name,
+                player2_name=player2_name,
+                engine=self.engine,
+            )
+        return MultiplayerPongGame(
+            session_id=session_id,
+            player1_name=player1_name,
+            player2_name=player2_name,
+        )
+
+    def register(
+        self,
+        session_id: str,
+        game: BaseGameLogic,
+        group_name: str,
+        registry: Dict[str, BaseGameLogic],
+        on_finish: Optional[Callable[[BaseGameLogic], Awaitable[None]]] = None,
+    ) -> ScheduledMatch:
+        """試合を登録する（既に登録済みなら既存の試合を返す）
+
+        既存の試合を返す場合、渡された game は使われないので close() して
+        バッチエンジンの行を解放する。
+        """
+        match = self.matches.get(session_id)
+        if match is not None and match.game is not game:
+            game.close()
+        if match is None:
+            match = ScheduledMatch(
+                session_id=session_id,
+                game=game,
+                group_name=group_name,
+                registry=registry,
+                on_finish=on_finish,
+            )
+            # バッチエンジンの試合はスループットを優先し、履歴を保持しない
+            if self.rewind_ticks and not self._is_batched(game):
+                match.rewind = RewindBuffer(self.rewind_ticks)
+            self.matches[session_id] = match
+            registry[session_id] = game
+            self._registries[id(registry)] = registry
+            self.fanout.expect(group_name, 2)
+        self._ensure_running()
+        return match
+
+    def subscribe(
+        self, session_id: str, channel_name: str, wire_format: Optional[str] = None
+    ) -> None:
+        """コンシューマを試合の購読者として登録"""
+        match = self.matches.get(session_id)
+        if match:
+            match.subscribers[channel_name] = wire_format
+            match.empty_since = None
+
+    def attach_input(
+        self,
+        session_id: str,
+        channel_name: str,
+        username: str,
+        input_buffer: InputBuffer,
+    ) -> None:
+        """プレイヤーの入力バッファを試合に関連付ける"""
+        match = self.matches.get(session_id)
+        if match:
+            match.inputs[channel_name] = (username, input_buffer)
+
+    def unsubscribe(self, session_id: str, channel_name: str) -> None:
+        """コンシューマの購読を解除"""
+        match = self.matches.get(session_id)
+        if match:
+            match.subscribers.pop(channel_name, None)
+            match.inputs.pop(channel_name, None)
+            if not match.subscribers:
+                match.empty_since = time.monotonic()
+
+    def get(self, session_id: str) -> Optional[ScheduledMatch]:
+        return self.matches.get(session_id)
+
+    def unregister(self, session_id: str) -> Optional[ScheduledMatch]:
+        """試合をスケジューラと games 辞書の両方から削除
+
+        終了・切断・取り消しのどれで外れる試合もここを通るので、ティック
+        統計はここで一度だけ出力する。
+        """
+        match = self.matches.pop(session_id, None)
+        if match:
+            stats = match.stats
+            print(
+                f"Removed session {session_id} "
+                f"(ticks {stats.ticks}, late {stats.late_ticks}, "
+                f"dropped {stats.dropped_steps})"
+            )
+            match.registry.pop(session_id, None)
+            self.fanout.forget(match.group_name)
+            match.game.close()
+        if session_id in self.owned_sessions:
+            self.owned_sessions.discard(session_id)
+            self._spawn(self._release(session_id))
+        return match
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        """バックグラウンドタスクを開始し、完了まで参照を保持する"""
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def tick(self, delta_time: float, steps: int = 1, dropped: int = 0) -> None:
+        """全試合を steps ステップ進め、送信間隔ごとに最新の状態をブロードキャスト"""
+        # 前のティック以降に届いた入力は、プレイヤーごとに最新の1件だけ適用
+        applied = {
+            session_id: self._apply_inputs(match)
+            for session_id, match in self.matches.items()
+        }
+        server_time = time.time()
+
+        # バッチエンジン上の試合はまとめて1回のベクトル演算で進める
+        if self.engine is not None:
+            for _ in range(steps):
+                self.engine.step(delta_time)
+
+        for match in list(self.matches.values()):
+            try:
+                await self._step_match(
+                    match, delta_time, steps, dropped, applied, server_time
+                )
+                match.errors = 0
+            except Exception as e:
+                match.errors += 1
+                print(f"Error ticking game {match.session_id}: {e}")
+
+    async def _step_match(
+        self,
+        match: ScheduledMatch,
+        delta_time: float,
+        steps: int,
+        dropped: int,
+        applied: Dict,
+        server_time: float,
+    ) -> None:
+        """1試合分の更新・巻き戻し履歴の記録・送信・終了処理"""
+        tick_start = match.game.tick
+        if not self._is_batched(match.game):
+            for _ in range(steps):
+                match.game.update(delta_time=delta_time)
+                if not match.game.is_active:
+                    break
+        match.game.tick += steps
+        match.stats.record(steps, dropped)
+        if match.rewind is not None and match.session_id in applied:
+            snapshot, inputs = applied[match.session_id]
+            match.rewind.record(tick_start, snapshot, inputs, steps, delta_time)
+
+        if self._should_broadcast(match):
+            match.last_broadcast_tick = match.game.tick
+            await self._broadcast(match, server_time)
+        if not match.game.is_active:
+            await self._finish(match)
+
+    def _should_broadcast(self, match: ScheduledMatch) -> bool:
+        """送信間隔に達したか（終了した試合の状態は必ず送る）"""
+        return (
+            match.last_broadcast_tick is None
+            or match.game.tick - match.last_broadcast_tick >= self.broadcast_interval
+            or not match.game.is_active
+        )
+
+    async def _broadcast(self, match: ScheduledMatch, server_time: float) -> None:
+        # クライアント側予測の照合用にティック番号と適用済み入力を付加
+        game = match.game
+        state = game.get_state()
+        state["server_time"] = server_time
+        state["last_input"] = {
+            username: input_buffer.last_applied_seq
+            for username, input_buffer in match.inputs.values()
+        }
+        # 購読者数に関係なく、送信データは1ティック1回だけエンコード
+        frames = encode_frames(
+            state, (game.player1_name, game.player2_name), match.subscribers.values()
+        )
+        # 接続ごとの送信判定はフレームを解析せずに tick と active で行う
+        await self.fanout.group_send(
+            match.group_name,
+            {
+                "type": "game_state",
+                "tick": game.tick,
+                "active": game.is_active,
+                "frames": frames,
+            },
+        )
+
+    def _apply_inputs(self, match: ScheduledMatch):
+        """入力を適用し、巻き戻し用の（適用前の状態, 適用した入力）を返す"""
+        game = match.game
+        inputs = {}
+        for username, input_buffer in match.inputs.values():
+            pending = input_buffer.drain()
+            if pending is None:
+                continue
+            match.last_input_at = time.monotonic()
+            kind, value, tick = pending
+            # 遅れて届いた方向入力は発行時点のティックまで巻き戻して適用
+            # （パドルを瞬時に動かす位置入力を巻き戻すと、失点を見てから
+            # 過去のティックで防げてしまうため、位置入力は現在のティックで適用）
+            if (
+                match.rewind is not None
+                and kind == DIRECTION
+                and tick is not None
+                and tick < game.tick
+                and match.rewind.rewind(game, username, kind, value, tick)
+            ):
+                continue
+            inputs[username] = (kind, value)
+
+        snapshot = snapshot_game(game) if match.rewind is not None else None
+        for username, (kind, value) in inputs.items():
+            apply_input(game, username, kind, value)
+        return snapshot, inputs
+
+    def _is_batched(self, game: BaseGameLogic) -> bool:
+        return self.engine is not None and getattr(game, "engine", None) is self.engine
+
+    async def _finish(self, match: ScheduledMatch) -> None:
+        """試合終了処理（保存などのコールバックは一度だけ実行）"""
+        print(f"Game ended for session {match.session_id}")
+        self.unregister(match.session_id)
+        if match.on_finish:
+            try:
+                await match.on_finish(match.game)
+            except Exception as e:
+                print(f"Error finishing game {match.session_id}: {e}")
+
+    async def reap(self, now: Optional[float] = None) -> int:
+        """放置・放棄された試合を終了させ、DB に保存してメモリを解放する
+
+        購読者がいない状態が reap_empty_after 秒、入力がない状態が
+        reap_idle_after 秒続いた試合と、reap_max_errors 回続けて更新に
+        失敗した試合が対象。スケジューラにない games 辞書のエントリも削除する。
+        """
+        now = time.monotonic() if now is None else now
+        reaped = 0
+        for match in list(self.matches.values()):
+            reason = self._reap_reason(match, now)
+            if reason is None:
+                continue
+            print(f"Reaping {reason} session {match.session_id}")
+            self.reaped[reason] += 1
+            reaped += 1
+            match.game.is_active = False
+            match.game.abandoned = reason
+            # 残っている購読者には終了した状態を送る
+            if match.subscribers:
+                try:
+                    await self._broadcast(match, time.time())
+                except Exception as e:
+                    print(f"Error broadcasting reaped game {match.session_id}: {e}")
+            await self._finish(match)
+
+        for registry in self._registries.values():
+            for session_id in [s for s in registry if s not in self.matches]:
+                print(f"Removing orphaned game entry {session_id}")
+                registry.pop(session_id, None)
+                self.reaped["orphaned"] += 1
+                reaped += 1
+        if reaped:
+            print(f"Reaper stats: {self.reaped}")
+        return reaped
+
+    def _reap_reason(self, match: ScheduledMatch, now: float) -> Optional[str]:
+        if match.errors >= self.reap_max_errors:
+            return "errors"
+        if (
+            match.empty_since is not None
+            and now - match.empty_since >= self.reap_empty_after
+        ):
+            return "empty"
+        if now - match.last_input_at >= self.reap_idle_after:
+            return "idle"
+        return None
+
+    async def _announce_worker(self) -> None:
+        """生存確認と、他ワーカーからの誘導先となる接続先URLを登録"""
+        url = getattr(settings, "PONG_WORKER_URL", None) or ""
+        await get_placement_registry().register_worker(
+            WORKER_ID, url, self.heartbeat_ttl
+        )
+
+    async def _maintain(self) -> None:
+        """所有セッションのリースとワーカー登録を定期的に延長"""
+        try:
+            registry = get_placement_registry()
+            await self._announce_worker()
+            for session_id in list(self.owned_sessions):
+                renewed = await registry.renew(
+                    session_id, WORKER_ID, self.placement_ttl
+                )
+                if not renewed:
+                    # 他のワーカーに引き継がれたセッションは保存しない
+                    print(f"Lost placement lease for session {session_id}")
+                    self.owned_sessions.discard(session_id)
+        except Exception as e:
+            print(f"Error renewing placement leases: {e}")
+
+    async def _checkpoint(self) -> None:
+        """所有している進行中の試合の状態をまとめて保存"""
+        checkpoints = {
+            session_id: snapshot_game(match.game)
+            for session_id, match in self.matches.items()
+            if session_id in self.owned_sessions and match.game.is_active
+        }
+        if not checkpoints:
+            return
+        try:
+            await get_checkpoint_store().save_many(checkpoints, self.checkpoint_ttl)
+        except Exception as e:
+            print(f"Error saving checkpoints: {e}")
+
+    async def _release(self, session_id: str) -> None:
+        """終了した試合の所有権とチェックポイントを削除"""
+        try:
+            await get_checkpoint_store().delete(session_id)
+            await get_placement_registry().release(session_id, WORKER_ID)
+        except Exception as e:
+            print(f"Error releasing session {session_id}: {e}")
+
+    def _ensure_running(self) -> None:
+        """ループが動いていなければ現在のイベントループ上で開始"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        """スケジューラのメインループ（試合と所有セッションがなくなったら終了）"""
+        self.clock.start()
+        try:
+            while self.matches or self.owned_sessions:
+                await asyncio.sleep(self.clock.time_until_next_step())
+                # 想定外の例外でループが止まり、試合が残り続けないようにする
+                try:
+                    await self._run_once()
+                except Exception as e:
+                    print(f"Error in game scheduler loop: {e}")
+        except asyncio.CancelledError:
+            pass
+
+    async def _run_once(self) -> None:
+        steps = self.clock.advance()
+        if steps:
+            await self.tick(
+                self.clock.step, steps=steps, dropped=self.clock.last_dropped
+            )
+        now = time.monotonic()
+        if now >= self._next_reap:
+            self._next_reap = now + self.reap_interval
+            await self.reap(now)
+        if not self.owned_sessions:
+            return
+        # 生存確認とリースは生存確認の TTL の1/3ごとに延長
+        if now >= self._next_maintenance:
+            self._next_maintenance = now + self.heartbeat_ttl / 3
+            await self._maintain()
+        if now >= self._next_checkpoint:
+            self._next_checkpoint = now + self.checkpoint_interval
+            await self._checkpoint()
+
+
+# プロセス内で共有するスケジューラ
+game_scheduler = GameScheduler()
@@ -0,0 +1,139 @@
+# api/pong/input_buffer.py
+import time
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+
+# 入力の種別（絶対位置、または移動方向）
+POSITION = "position"
+DIRECTION = "direction"
+
+# シーケンス番号は状態フレームに uint32 で載せるため、この範囲外は拒否する
+MAX_SEQ = 2**32
+
+
+def apply_input(game, username: str, kind: str, value) -> None:
+    """入力をゲームに適用"""
+    if kind == DIRECTION:
+        game.set_paddle_direction(username, value)
+    else:
+        game.move_player(username=username, new_x=value)
+
+
+class InputBuffer:
+    """接続ごとの入力バッファ
+
+    クライアントの送信頻度に関係なく、1ティックに適用するのは最新の
+    入力（パドルの目標位置または移動方向）だけにする。受信メッセージはトークンバケットで
+    制限し、超過分は JSON を解析する前に破棄する。
+    """
+
+    def __init__(
+        self,
+        rate: float = 120,
+        burst: int = 30,
+        max_message_bytes: int = 512,
+        time_source: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_message_bytes = max_message_bytes
+        self._now = time_source
+        self.tokens = float(burst)
+        self.last_refill = self._now()
+        # 次のティックで適用する入力（種別, 値, 発行ティック）とシーケンス番号
+        self.pending: Optional[Tuple[str, float, Optional[int]]] = None
+        self.pending_seq: Optional[int] = None
+        self.last_seq: Optional[int] = None  # 受け付けた最大のシーケンス番号
+        self.last_applied_seq: Optional[int] = None
+        self.stats = {
+            "received": 0,
+            "applied": 0,
+            "coalesced": 0,
+            "throttled": 0,
+            "oversized": 0,
+            "stale": 0,
+            "invalid": 0,
+        }
+
+    @classmethod
+    def from_settings(cls) -> "InputBuffer":
+        return cls(
+            rate=getattr(settings, "PONG_INPUT_RATE", 120),
+            burst=getattr(settings, "PONG_INPUT_BURST", 30),
+            max_message_bytes=getattr(settings, "PONG_INPUT_MAX_BYTES", 512),
+        )
+
+    def admit(self, text_data: Optional[str]) -> bool:
+        """メッセージを解析・処理してよいか判定（超過分は破棄）"""
+        self.stats["received"] += 1
+        if text_data is not None and len(text_data) > self.max_message_bytes:
+            self.stats["oversized"] += 1
+            return False
+
+        now = self._now()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.last_refill) * self.rate
+        )
+        self.last_refill = now
+        if self.tokens < 1:
+            self.stats["throttled"] += 1
+            return False
+        self.tokens -= 1
+        return True
+
+    def push(self, position, seq=None, tick=None) -> bool:
+        """パドルの目標位置を記録（同一ティック内では最新の値で上書き）
+
+        tick はクライアントが入力を発行した時点のサーバーティック番号。
+        """
+        try:
+            position = float(position)
+        except (TypeError, ValueError):
+            self.stats["invalid"] += 1
+            return False
+        return self._record(POSITION, position, seq, tick)
+
+    def push_direction(self, direction, seq=None, tick=None) -> bool:
+        """パドルの移動方向（-1, 0, 1）を記録（押下・解放時のみ送られる）"""
+        try:
+            direction = int(direction)
+        except (TypeError, ValueError):
+            self.stats["invalid"] += 1
+            return False
+        return self._record(DIRECTION, direction, seq, tick)
+
+    def drain(self) -> Optional[Tuple[str, float, Optional[int]]]:
+        """ティックの開始時に適用する入力（種別, 値, 発行ティック）を取り出す"""
+        pending = self.pending
+        if pending is None:
+            return None
+        self.pending = None
+        if self.pending_seq is not None:
+            self.last_applied_seq = self.pending_seq
+        self.stats["applied"] += 1
+        return pending
+
+    def _record(self, kind: str, value, seq, tick) -> bool:
+        try:
+            seq = int(seq) if seq is not None else None
+            tick = int(tick) if tick is not None else None
+        except (TypeError, ValueError):
+            self.stats["invalid"] += 1
+            return False
+        if seq is not None and not 0 <= seq < MAX_SEQ:
+            self.stats["invalid"] += 1
+            return False
+
+        # 順序が入れ替わって届いた古い入力は無視
+        if seq is not None and self.last_seq is not None and seq <= self.last_seq:
+            self.stats["stale"] += 1
+            return False
+
+        if self.pending is not None:
+            self.stats["coalesced"] += 1
+        self.pending = (kind, value, tick)
+        self.pending_seq = seq
+        if seq is not None:
+            self.last_seq = seq
+        return True
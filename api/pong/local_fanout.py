@@ -0,0 +1,86 @@
+# api/pong/local_fanout.py
+from typing import Dict
+
+from channels.layers import get_channel_layer
+
+from .worker import WORKER_ID
+
+
+class LocalFanout:
+    """同一プロセス内のコンシューマへゲームのイベントを直接配信するレイヤー
+
+    グループの想定メンバー（試合のプレイヤー）が全員このプロセスに
+    接続していればチャンネルレイヤー（Redis）を経由しない。
+    プロセス外のメンバーがいる場合のみ group_send し、そのイベントには
+    送信元ワーカーIDを付けて、ローカル配信済みのコンシューマが
+    重複して処理しないようにする。
+    """
+
+    def __init__(self):
+        self.groups: Dict[str, Dict[str, object]] = {}
+        self.expected_members: Dict[str, int] = {}
+        self.stats = {
+            "local_deliveries": 0,
+            "remote_sends": 0,
+            "remote_skipped": 0,
+            "echoes_dropped": 0,
+        }
+
+    def join(self, group: str, consumer) -> None:
+        """コンシューマをローカル配信先として登録"""
+        self.groups.setdefault(group, {})[consumer.channel_name] = consumer
+
+    def leave(self, group: str, consumer) -> None:
+        members = self.groups.get(group)
+        if members is None:
+            return
+        members.pop(consumer.channel_name, None)
+        if not members:
+            del self.groups[group]
+
+    def expect(self, group: str, count: int) -> None:
+        """グループの想定メンバー数を設定（試合なら2プレイヤー）"""
+        self.expected_members[group] = count
+
+    def forget(self, group: str) -> None:
+        self.expected_members.pop(group, None)
+
+    def has_remote_members(self, group: str) -> bool:
+        """プロセス外にメンバーがいる可能性があるか"""
+        expected = self.expected_members.get(group)
+        if expected is None:
+            return True
+        return len(self.groups.get(group, {})) < expected
+
+    async def group_send(self, group: str, event: Dict) -> None:
+        """ローカルのメンバーへ直接配信し、必要な場合のみチャンネルレイヤーへ送信"""
+        for consumer in list(self.groups.get(group, {}).values()):
+            handler = getattr(consumer, event["type"], None)
+            if handler is None:
+                continue
+            try:
+                await handler(event)
+                self.stats["local_deliveries"] += 1
+            except Exception as e:
+                print(
+                    f"Error delivering {event['type']} to {consumer.channel_name}: {e}"
+                )
+
+        if self.has_remote_members(group):
+            await get_channel_layer().group_send(group, {**event, "origin": WORKER_ID})
+            self.stats["remote_sends"] += 1
+        else:
+            self.stats["remote_skipped"] += 1
+
+    def is_local_echo(self, group: str, consumer, event: Dict) -> bool:
+        """チャンネルレイヤー経由で届いた、ローカル配信済みのイベントか"""
+        if event.get("origin") != WORKER_ID:
+            return False
+        if consumer.channel_name not in self.groups.get(group, {}):
+            return False
+        self.stats["echoes_dropped"] += 1
+        return True
+
+
+# プロセス内で共有するローカル配信レイヤー
+local_fanout = LocalFanout()
@@ -0,0 +1,222 @@
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import time
+
+import numpy as np
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from pong.consumers import MatchmakingConsumer
+from pong.matchmaking import get_matchmaker, reset_matchmaking
+
+
+class SimulatedMatchmakingConsumer(MatchmakingConsumer):
+    """DB の代わりに合成したレベルを使うコンシューマ"""
+
+    levels = {}
+
+    async def get_level(self, username):
+        return self.levels[username]
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate players arriving at MatchmakingConsumer over the in-memory channel "
+        "layer and report matches/sec, wait-time percentiles and level gaps"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--players", type=int, default=1000)
+        parser.add_argument(
+            "--rate", type=float, default=200, help="Mean arrivals per second (Poisson)"
+        )
+        parser.add_argument(
+            "--burst-every",
+            type=float,
+            default=0,
+            help="Seconds between bursts of simultaneous arrivals (0 disables)",
+        )
+        parser.add_argument("--burst-size", type=int, default=100)
+        parser.add_argument(
+            "--skill",
+            choices=["uniform", "skewed"],
+            default="skewed",
+            help="Level distribution (skewed: most players are low level)",
+        )
+        parser.add_argument("--max-level", type=int, default=40)
+        parser.add_argument(
+            "--disconnect",
+            type=float,
+            default=0.05,
+            help="Fraction of players who leave the queue before being matched",
+        )
+        parser.add_argument(
+            "--patience",
+            type=float,
+            default=2.0,
+            help="Mean seconds a disconnecting player waits before leaving",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=10.0,
+            help="Seconds a player waits for a match before giving up",
+        )
+        parser.add_argument("--interval", type=float, default=None)
+        parser.add_argument("--gap", type=float, default=None)
+        parser.add_argument("--gap-per-second", type=float, default=None)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        matching = {
+            name: options[key]
+            for name, key in (
+                ("PONG_MATCH_INTERVAL", "interval"),
+                ("PONG_MATCH_LEVEL_GAP", "gap"),
+                ("PONG_MATCH_GAP_PER_SECOND", "gap_per_second"),
+            )
+            if options[key] is not None
+        }
+        with override_settings(
+            CHANNEL_LAYERS={
+                "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+            },
+            PONG_MATCHMAKING_BACKEND="local",
+            **matching,
+        ):
+            reset_matchmaking()
+            try:
+                # コンシューマのログは -v 2 以上のときだけ表示
+                log = sys.stdout if options["verbosity"] > 1 else io.StringIO()
+                with contextlib.redirect_stdout(log):
+                    results, elapsed = asyncio.run(self._simulate(options))
+                self._report(results, elapsed)
+            finally:
+                reset_matchmaking()
+
+    def _players(self, options):
+        """到着時刻・レベル・切断までの時間を合成"""
+        rng = np.random.default_rng(options["seed"])
+        count = options["players"]
+        bursts = []
+        if options["burst_every"] > 0:
+            # 到着が続く間、burst_every 秒ごとに burst_size 人が同時に到着
+            span = count / options["rate"]
+            for k in range(1, int(span // options["burst_every"]) + 1):
+                size = min(options["burst_size"], count // 2 - len(bursts))
+                bursts.extend([k * options["burst_every"]] * max(0, size))
+        stream = np.cumsum(rng.exponential(1 / options["rate"], count - len(bursts)))
+        arrivals = np.sort(np.concatenate((stream, bursts)))
+        if options["skill"] == "uniform":
+            levels = rng.integers(1, options["max_level"] + 1, count)
+        else:
+            levels = np.minimum(
+                1 + rng.geometric(4 / options["max_level"], count),
+                options["max_level"],
+            )
+        leaves = rng.random(count) < options["disconnect"]
+        patience = np.where(
+            leaves, rng.exponential(options["patience"], count), options["timeout"]
+        )
+        return [
+            (
+                f"sim{i}",
+                float(arrivals[i]),
+                int(levels[i]),
+                float(patience[i]),
+                leaves[i],
+            )
+            for i in range(count)
+        ]
+
+    async def _simulate(self, options):
+        players = self._players(options)
+        SimulatedMatchmakingConsumer.levels = {
+            username: level for username, _, level, _, _ in players
+        }
+        application = SimulatedMatchmakingConsumer.as_asgi()
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(self._player(application, started, *player) for player in players)
+        )
+        return results, time.perf_counter() - started
+
+    async def _player(
+        self, application, started, username, arrival, level, patience, leaves
+    ):
+        """1人分の接続: 参加して match_found を待つ（patience 秒で諦める）"""
+        await asyncio.sleep(max(0.0, started + arrival - time.perf_counter()))
+        communicator = WebsocketCommunicator(application, "wss/matchmaking/")
+        await communicator.connect()
+        await communicator.send_to(
+            json.dumps({"type": "join_matchmaking", "username": username})
+        )
+        await communicator.receive_from()  # waiting
+        joined = time.perf_counter()
+        result = {"username": username, "level": level, "leaves": leaves}
+        try:
+            # receive_from はタイムアウト時にアプリケーションを止めるため直接待つ
+            message = await asyncio.wait_for(communicator.output_queue.get(), patience)
+            result["wait"] = time.perf_counter() - joined
+            result["matched_at"] = time.perf_counter() - started
+            result["match"] = json.loads(message["text"])
+        except asyncio.TimeoutError:
+            pass
+        await communicator.disconnect()
+        return result
+
+    def _report(self, results, elapsed):
+        levels = {result["username"]: result["level"] for result in results}
+        matched = [result for result in results if "match" in result]
+        sessions = {
+            result["match"]["session_id"]: result["match"] for result in matched
+        }
+        gaps = np.array(
+            [
+                abs(levels[match["player1"]] - levels[match["player2"]])
+                for match in sessions.values()
+            ]
+        )
+        waits = np.array([result["wait"] for result in matched])
+        left = sum(
+            1 for result in results if result["leaves"] and "match" not in result
+        )
+        unmatched = len(results) - len(matched) - left
+
+        self.stdout.write(
+            f"players {len(results)}, matched {len(matched)}, left {left}, "
+            f"unmatched {unmatched}, elapsed {elapsed:.2f}s"
+        )
+        if not len(sessions):
+            return
+        span = max(result["matched_at"] for result in matched)
+        p50, p99 = np.percentile(waits, [50, 99])
+        self.stdout.write(
+            f"matches/s {len(sessions) / span:.1f}, "
+            f"wait p50 {p50 * 1000:.0f}ms p99 {p99 * 1000:.0f}ms"
+        )
+        self.stdout.write(
+            f"level gap mean {gaps.mean():.2f} p99 {np.percentile(gaps, 99):.0f} "
+            f"max {gaps.max()}"
+        )
+        for low, high in ((0, 0), (1, 1), (2, 2), (3, 5), (6, None)):
+            count = np.count_nonzero(
+                (gaps >= low) & (gaps <= (high if high is not None else gaps.max()))
+            )
+            label = (
+                f"{low}"
+                if low == high
+                else f"{low}+"
+                if high is None
+                else f"{low}-{high}"
+            )
+            self.stdout.write(f"  gap {label:>4}: {count:>6} ({count / len(gaps):.1%})")
+        stats = get_matchmaker().stats
+        self.stdout.write(
+            f"matcher passes {stats['passes']}, "
+            f"pass time last {stats['last_pass_ms']:.3f}ms max {stats['max_pass_ms']:.3f}ms"
+        )
@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pong.batched_physics import BatchedPongEngine, BatchedPongGame
+from pong.game_logic import MultiplayerPongGame
+
+
+class EndlessPongGame(MultiplayerPongGame):
+    """ベンチマーク中に試合が終了しないよう勝利スコアを無限大にしたゲーム"""
+
+    WINNING_SCORE = float("inf")
+
+
+class Command(BaseCommand):
+    help = "Benchmark matches-per-core at the tick rate for the python and batched physics engines"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--matches",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000, 5000],
+            help="Numbers of simultaneous matches to simulate",
+        )
+        parser.add_argument(
+            "--seconds",
+            type=float,
+            default=1.0,
+            help="Wall-clock time to spend on each measurement",
+        )
+        parser.add_argument("--tick-rate", type=int, default=60)
+
+    def handle(self, *args, **options):
+        tick_rate = options["tick_rate"]
+        seconds = options["seconds"]
+        delta_time = 1 / tick_rate
+
+        self.stdout.write(
+            f"{'matches':>8} {'engine':>8} {'ticks/s':>10} {'us/match':>10} "
+            f"{'matches/core@' + str(tick_rate) + 'Hz':>22}"
+        )
+        for count in options["matches"]:
+            for name, step in (
+                ("python", self._python_step(count)),
+                ("batched", self._batched_step(count)),
+            ):
+                ticks, elapsed = self._measure(step, delta_time, seconds)
+                ticks_per_second = ticks / elapsed
+                us_per_match = elapsed / (ticks * count) * 1e6
+                # 1コアが1秒間に進められる試合ステップ数 ÷ ティックレート
+                capacity = int(ticks_per_second * count / tick_rate)
+                self.stdout.write(
+                    f"{count:>8} {name:>8} {ticks_per_second:>10.1f} "
+                    f"{us_per_match:>10.3f} {capacity:>22}"
+                )
+
+    def _python_step(self, count):
+        games = [EndlessPongGame(f"bench_{i}", f"a{i}", f"b{i}") for i in range(count)]
+
+        def step(delta_time):
+            for game in games:
+                game.update(delta_time)
+
+        return step
+
+    def _batched_step(self, count):
+        engine = BatchedPongEngine(capacity=count, game_class=EndlessPongGame)
+        for i in range(count):
+            BatchedPongGame(f"bench_{i}", f"a{i}", f"b{i}", engine=engine)
+        return engine.step
+
+    def _measure(self, step, delta_time, seconds):
+        ticks = 0
+        start = time.perf_counter()
+        while True:
+            step(delta_time)
+            ticks += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= seconds:
+                return ticks, elapsed
@@ -0,0 +1,455 @@
+# api/pong/matchmaking.py
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .redis_client import get_redis
+from .reservation import get_reservation_store, reset_reservation_store
+from .worker import WORKER_ID
+
+# 待機中のプレイヤー1人分の情報（username, channel_name, enqueued_at, level など）
+Ticket = Dict
+
+
+class LocalMatchmakingQueue:
+    """プロセス内で完結するマッチメイキング待機列（テスト・単一ワーカー用）"""
+
+    def __init__(self):
+        self._tickets: Dict[str, Ticket] = {}
+
+    async def enqueue(self, ticket: Ticket) -> bool:
+        """待機列に追加（既に待機中なら接続先だけを更新し、待ち時間は維持）"""
+        username = ticket["username"]
+        current = self._tickets.get(username)
+        if current is not None:
+            self._tickets[username] = {**ticket, "enqueued_at": current["enqueued_at"]}
+            return False
+        self._tickets[username] = ticket
+        return True
+
+    async def cancel(self, username: str, channel_name: str) -> bool:
+        """待機を取り消す（別の接続から参加し直した場合は取り消さない）"""
+        ticket = self._tickets.get(username)
+        if ticket is None or ticket["channel_name"] != channel_name:
+            return False
+        del self._tickets[username]
+        return True
+
+    async def snapshot(self) -> List[Ticket]:
+        """待機中の全チケットを取得"""
+        return list(self._tickets.values())
+
+    async def claim_pairs(
+        self, pairs: List[Tuple[str, str]]
+    ) -> List[Tuple[Ticket, Ticket]]:
+        """組み合わせを確定（両者がまだ待機中のペアだけを取り出す）"""
+        claimed = []
+        for first, second in pairs:
+            if first in self._tickets and second in self._tickets:
+                claimed.append((self._tickets.pop(first), self._tickets.pop(second)))
+        return claimed
+
+    async def acquire_pass(self, owner: str, interval: float) -> bool:
+        return True
+
+    async def size(self) -> int:
+        return len(self._tickets)
+
+
+class RedisMatchmakingQueue:
+    """Redis 上で全ワーカーが共有するマッチメイキング待機列
+
+    pong:matchmaking:queue（ZSET: username → 参加時刻）で待機者を、
+    pong:matchmaking:tickets（HASH: username → チケット JSON）で接続先と
+    レベルを保持する。組み合わせの確定と取り消しは Lua スクリプトで
+    原子的に行うため、複数のワーカーが同じプレイヤーを取り合うことはない。
+    """
+
+    QUEUE_KEY = "pong:matchmaking:queue"
+    TICKET_KEY = "pong:matchmaking:tickets"
+    PASS_LOCK_KEY = "pong:matchmaking:pass"
+
+    ENQUEUE_SCRIPT = """
+    local current = redis.call('hget', KEYS[2], ARGV[1])
+    local ticket = ARGV[2]
+    if current then
+        local decoded = cjson.decode(ticket)
+        decoded['enqueued_at'] = cjson.decode(current)['enqueued_at']
+        ticket = cjson.encode(decoded)
+    end
+    redis.call('hset', KEYS[2], ARGV[1], ticket)
+    return redis.call('zadd', KEYS[1], 'NX', ARGV[3], ARGV[1])
+    """
+    CLAIM_PAIRS_SCRIPT = """
+    local claimed = {}
+    for i = 1, #ARGV, 2 do
+        local tickets = redis.call('hmget', KEYS[2], ARGV[i], ARGV[i + 1])
+        if tickets[1] and tickets[2] then
+            redis.call('zrem', KEYS[1], ARGV[i], ARGV[i + 1])
+            redis.call('hdel', KEYS[2], ARGV[i], ARGV[i + 1])
+            table.insert(claimed, tickets[1])
+            table.insert(claimed, tickets[2])
+        end
+    end
+    return claimed
+    """
+    CANCEL_SCRIPT = """
+    local ticket = redis.call('hget', KEYS[2], ARGV[1])
+    if ticket and cjson.decode(ticket)['channel_name'] == ARGV[2] then
+        redis.call('zrem', KEYS[1], ARGV[1])
+        redis.call('hdel', KEYS[2], ARGV[1])
+        return 1
+    end
+    return 0
+    """
+
+    async def enqueue(self, ticket: Ticket) -> bool:
+        added = await get_redis().eval(
+            self.ENQUEUE_SCRIPT,
+            2,
+            self.QUEUE_KEY,
+            self.TICKET_KEY,
+            ticket["username"],
+            json.dumps(ticket),
+            ticket["enqueued_at"],
+        )
+        return bool(added)
+
+    async def cancel(self, username: str, channel_name: str) -> bool:
+        cancelled = await get_redis().eval(
+            self.CANCEL_SCRIPT,
+            2,
+            self.QUEUE_KEY,
+            self.TICKET_KEY,
+            username,
+            channel_name,
+        )
+        return bool(cancelled)
+
+    async def snapshot(self) -> List[Ticket]:
+        tickets = await get_redis().hvals(self.TICKET_KEY)
+        return [json.loads(ticket) for ticket in tickets]
+
+    async def claim_pairs(
+        self, pairs: List[Tuple[str, str]]
+    ) -> List[Tuple[Ticket, Ticket]]:
+        if not pairs:
+            return []
+        args = [username for pair in pairs for username in pair]
+        tickets = await get_redis().eval(
+            self.CLAIM_PAIRS_SCRIPT, 2, self.QUEUE_KEY, self.TICKET_KEY, *args
+        )
+        tickets = [json.loads(ticket) for ticket in tickets]
+        return list(zip(tickets[::2], tickets[1::2]))
+
+    async def acquire_pass(self, owner: str, interval: float) -> bool:
+        """この間隔のマッチング処理を担当する（同時に1ワーカーだけが処理する）"""
+        return bool(
+            await get_redis().set(
+                self.PASS_LOCK_KEY, owner, nx=True, px=max(1, int(interval * 1000))
+            )
+        )
+
+    async def size(self) -> int:
+        return await get_redis().zcard(self.QUEUE_KEY)
+
+
+def find_level_pairs(
+    levels: np.ndarray,
+    waits: np.ndarray,
+    base_gap: float,
+    gap_per_second: float,
+    max_gap: Optional[float] = None,
+) -> List[Tuple[int, int]]:
+    """レベルの近いプレイヤー同士の組み合わせ（インデックスの組）を求める
+
+    レベル順（同じレベルでは待ち時間の長い順）に並べ、隣り合う2人の
+    レベル差がどちらかの許容幅（base_gap + 待ち時間 × gap_per_second、
+    上限 max_gap）に収まれば組み合わせる。許容範囲で連続する区間では
+    先頭から2人ずつ組むため、計算は並べ替えの O(n log n) で済む。
+    """
+    if len(levels) < 2:
+        return []
+    # 待ち時間の長い順に並べてから、レベルで安定ソート（レベルごとのバケット）
+    order = np.argsort(-waits)
+    order = order[np.argsort(levels[order], kind="stable")]
+    sorted_levels = levels[order]
+    windows = base_gap + waits[order] * gap_per_second
+    if max_gap is not None:
+        windows = np.minimum(windows, max_gap)
+
+    gaps = np.diff(sorted_levels)
+    matchable = gaps <= np.maximum(windows[:-1], windows[1:])
+    # 許容範囲の隣接が連続する区間ごとに、区間の先頭から1つおきに組む
+    starts = matchable & ~np.concatenate(([False], matchable[:-1]))
+    run_start = np.maximum.accumulate(np.where(starts, np.arange(len(gaps)), 0))
+    chosen = np.flatnonzero(matchable & ((np.arange(len(gaps)) - run_start) % 2 == 0))
+    return list(zip(order[chosen].tolist(), order[chosen + 1].tolist()))
+
+
+class Matchmaker:
+    """レベルの近いプレイヤー同士を一定間隔の一括処理でマッチさせる
+
+    参加のたびに組み合わせるのではなく、interval 秒ごとに待機列全体から
+    組み合わせを求める。待ち時間が長いほど許容するレベル差を広げるため、
+    近いレベルの相手がいなくてもいずれはマッチする。Redis を使う場合は
+    1回の処理を担当するのは1ワーカーだけで、確定は原子的に行う。
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.5,
+        base_gap: float = 1,
+        gap_per_second: float = 0.5,
+        max_gap: Optional[float] = None,
+        accept_timeout: float = 10,
+        history: int = 1000,
+    ):
+        self.interval = interval
+        self.base_gap = base_gap
+        self.gap_per_second = gap_per_second
+        self.max_gap = max_gap
+        self.accept_timeout = accept_timeout
+        self.wait_times = deque(maxlen=history)
+        self.stats = {
+            "passes": 0,
+            "matched": 0,
+            "last_pass_ms": 0.0,
+            "max_pass_ms": 0.0,
+            "expired": 0,
+            "requeued": 0,
+        }
+        self._task: Optional[asyncio.Task] = None
+        self._joined = False
+
+    @classmethod
+    def from_settings(cls) -> "Matchmaker":
+        return cls(
+            interval=getattr(settings, "PONG_MATCH_INTERVAL", 0.5),
+            base_gap=getattr(settings, "PONG_MATCH_LEVEL_GAP", 1),
+            gap_per_second=getattr(settings, "PONG_MATCH_GAP_PER_SECOND", 0.5),
+            max_gap=getattr(settings, "PONG_MATCH_MAX_GAP", None),
+            accept_timeout=getattr(settings, "PONG_MATCH_ACCEPT_TIMEOUT", 10),
+        )
+
+    async def join(self, ticket: Ticket) -> bool:
+        """待機列に追加し、マッチング処理のループを開始"""
+        added = await get_matchmaking_queue().enqueue(ticket)
+        self._joined = True
+        self._ensure_running()
+        return added
+
+    def watch(self) -> None:
+        """参加待ちの予約の期限を監視するためにループを開始"""
+        self._joined = True
+        self._ensure_running()
+
+    def match_pairs(
+        self, tickets: List[Ticket], now: float
+    ) -> List[Tuple[Ticket, Ticket]]:
+        """チケットの一覧から組み合わせを求める"""
+        count = len(tickets)
+        levels = np.fromiter((t.get("level", 1) for t in tickets), float, count)
+        enqueued = np.fromiter((t["enqueued_at"] for t in tickets), float, count)
+        pairs = find_level_pairs(
+            levels, now - enqueued, self.base_gap, self.gap_per_second, self.max_gap
+        )
+        return [(tickets[i], tickets[j]) for i, j in pairs]
+
+    async def run_pass(
+        self, now: Optional[float] = None
+    ) -> List[Tuple[Ticket, Ticket]]:
+        """1回分のマッチング処理（確定したペアを返す）"""
+        queue = get_matchmaking_queue()
+        now = time.time() if now is None else now
+        tickets = await queue.snapshot()
+
+        started = time.perf_counter()
+        candidates = self.match_pairs(tickets, now)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["passes"] += 1
+        self.stats["last_pass_ms"] = elapsed_ms
+        self.stats["max_pass_ms"] = max(self.stats["max_pass_ms"], elapsed_ms)
+
+        claimed = await queue.claim_pairs(
+            [(first["username"], second["username"]) for first, second in candidates]
+        )
+        for pair in claimed:
+            for ticket in pair:
+                self.wait_times.append(now - ticket["enqueued_at"])
+        self.stats["matched"] += len(claimed)
+        return claimed
+
+    def wait_percentiles(self) -> Dict[str, float]:
+        """マッチしたプレイヤーの待ち時間のパーセンタイル（秒）"""
+        if not self.wait_times:
+            return {}
+        p50, p90, p99 = np.percentile(np.fromiter(self.wait_times, float), [50, 90, 99])
+        return {"p50": float(p50), "p90": float(p90), "p99": float(p99)}
+
+    async def notify(self, pair: Tuple[Ticket, Ticket]) -> None:
+        """マッチした2人の予約を作成し、チャンネルレイヤー経由で match_found を送る
+
+        2人が accept_deadline までにゲームの WebSocket に接続しなければ
+        予約は取り消される（expire_reservations）。
+        """
+        player1, player2 = pair
+        session_id = (
+            f"game_{player1['username']}_{player2['username']}_{int(time.time())}"
+        )
+        deadline = await get_reservation_store().reserve(
+            session_id, pair, self.accept_timeout
+        )
+        match_data = {
+            "type": "match_found",
+            "session_id": session_id,
+            "player1": player1["username"],
+            "player2": player2["username"],
+            "accept_deadline": deadline,
+        }
+        print(f"Match found! Creating game session: {match_data}")
+        channel_layer = get_channel_layer()
+        for ticket in pair:
+            await channel_layer.send(
+                ticket["channel_name"], {"type": "match_found", "match": match_data}
+            )
+
+    async def expire_reservations(self, now: Optional[float] = None) -> int:
+        """期限までにそろわなかった予約を取り消す
+
+        参加済みのプレイヤーは元の待ち時間のまま待機列に戻し、接続中の
+        ゲームの WebSocket から次の match_found を受け取れるようにする。
+        """
+        expired = await get_reservation_store().expire_due(now)
+        for reservation in expired:
+            # 1件の失敗で残りの予約の取り消しが止まらないようにする
+            try:
+                await self._cancel_reservation(reservation)
+            except Exception as e:
+                print(f"Error cancelling reservation {reservation['session_id']}: {e}")
+        self.stats["expired"] += len(expired)
+        return len(expired)
+
+    async def _cancel_reservation(self, reservation: Dict) -> None:
+        """期限切れの予約の参加済みプレイヤーを待機列に戻し、全員に通知する
+
+        マッチメイキングを経ずに作成された予約のチケットには接続先が
+        ないため、参加していないプレイヤーには通知しない。
+        """
+        queue = get_matchmaking_queue()
+        channel_layer = get_channel_layer()
+        session_id = reservation["session_id"]
+        print(f"Match reservation expired: {session_id} {reservation['accepted']}")
+        for username in reservation["players"]:
+            channel_name = reservation["accepted"].get(username)
+            ticket = reservation["tickets"].get(username) or {}
+            if channel_name:
+                if "enqueued_at" not in ticket:
+                    ticket = make_ticket(username, channel_name)
+                await queue.enqueue({**ticket, "channel_name": channel_name})
+                self.stats["requeued"] += 1
+            else:
+                channel_name = ticket.get("channel_name")
+                if not channel_name:
+                    continue
+            message = {
+                "type": "match_cancelled",
+                "session_id": session_id,
+                "reason": "opponent_timeout"
+                if username in reservation["accepted"]
+                else "accept_timeout",
+                "requeued": username in reservation["accepted"],
+            }
+            await channel_layer.send(
+                channel_name, {"type": "match_cancelled", "match": message}
+            )
+
+    def _ensure_running(self) -> None:
+        """ループが動いていなければ現在のイベントループ上で開始"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        """マッチング処理のループ（待機者と参加待ちの予約がなくなったら終了）"""
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                self._joined = False
+                queue = get_matchmaking_queue()
+                try:
+                    if await get_reservation_store().pending_count():
+                        await self.expire_reservations()
+                    elif await queue.size() == 0:
+                        # 確認中に参加したプレイヤーがいれば続ける
+                        if self._joined:
+                            continue
+                        break
+                    if not await queue.acquire_pass(WORKER_ID, self.interval):
+                        continue
+                    pairs = await self.run_pass()
+                    for pair in pairs:
+                        await self.notify(pair)
+                    if pairs:
+                        print(
+                            f"Matchmaking pass: {len(pairs)} pairs, "
+                            f"{await queue.size()} waiting, "
+                            f"{self.stats['last_pass_ms']:.3f}ms, "
+                            f"wait time {self.wait_percentiles()}"
+                        )
+                except Exception as e:
+                    print(f"Error in matchmaking pass: {e}")
+        except asyncio.CancelledError:
+            pass
+
+
+def make_ticket(username: str, channel_name: str, **extra) -> Ticket:
+    """待機列に登録するチケットを作成"""
+    return {
+        "username": username,
+        "channel_name": channel_name,
+        "enqueued_at": time.time(),
+        **extra,
+    }
+
+
+_queue = None
+
+
+def get_matchmaking_queue():
+    """設定（PONG_MATCHMAKING_BACKEND）に応じた待機列を取得"""
+    global _queue
+    if _queue is None:
+        backend = getattr(settings, "PONG_MATCHMAKING_BACKEND", "redis")
+        if backend == "local":
+            _queue = LocalMatchmakingQueue()
+        else:
+            _queue = RedisMatchmakingQueue()
+    return _queue
+
+
+_matchmaker = None
+
+
+def get_matchmaker() -> Matchmaker:
+    """プロセス内で共有する Matchmaker を取得"""
+    global _matchmaker
+    if _matchmaker is None:
+        _matchmaker = Matchmaker.from_settings()
+    return _matchmaker
+
+
+def reset_matchmaking() -> None:
+    """共有の待機列と Matchmaker を破棄（設定を変更した後に作り直すため）"""
+    global _queue, _matchmaker
+    if _matchmaker is not None and _matchmaker._task is not None:
+        _matchmaker._task.cancel()
+    _queue = None
+    _matchmaker = None
+    reset_reservation_store()
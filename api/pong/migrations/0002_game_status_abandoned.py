@@ -0,0 +1,26 @@
+# Generated by Django 5.1.15 on 2026-10-17 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pong", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="game",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("WAITING", "Waiting for Players"),
+                    ("IN_PROGRESS", "In Progress"),
+                    ("COMPLETED", "Completed"),
+                    ("ABANDONED", "Abandoned"),
+                ],
+                default="WAITING",
+                max_length=20,
+            ),
+        ),
+    ]
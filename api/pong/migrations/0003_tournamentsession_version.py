@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-17 20:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pong", "0002_game_status_abandoned"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tournamentsession",
+            name="version",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="ブラケットが進むたびに増える値（キャッシュした状態との競合検出用）",
+            ),
+        ),
+    ]
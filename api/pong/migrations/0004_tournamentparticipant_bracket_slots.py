@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-17 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pong", "0003_tournamentsession_version"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="tournamentparticipant",
+            name="bracket_position",
+            field=models.IntegerField(
+                blank=True,
+                help_text="\n        トーナメントブラケット内の位置を示す値（1始まり、シード順に配置）。\n        1, 2: 1回戦の第1試合の対戦者\n        3, 4: 1回戦の第2試合の対戦者（以降も同様）\n        相手の位置が空いている場合は不戦勝。勝ち上がりは試合結果から求める。\n        ",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+def remove_duplicate_lobbies(apps, schema_editor):
+    """ワーカーごとに作られていた募集中のトーナメントは最新の1つだけ残す"""
+    TournamentSession = apps.get_model("pong", "TournamentSession")
+    waiting = TournamentSession.objects.filter(status="WAITING_PLAYERS").order_by("-id")
+    latest = waiting.first()
+    if latest is not None:
+        waiting.exclude(id=latest.id).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pong", "0004_tournamentparticipant_bracket_slots"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_lobbies, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="tournamentsession",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "WAITING_PLAYERS")),
+                fields=("status",),
+                name="unique_waiting_tournament",
+            ),
+        ),
+    ]
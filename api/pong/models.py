@@ -105,6 +105,7 @@ class Game(models.Model):
         ("WAITING", "Waiting for Players"),
         ("IN_PROGRESS", "In Progress"),
         ("COMPLETED", "Completed"),
+        ("ABANDONED", "Abandoned"),
     ]
 
     # 基本情報
@@ -164,7 +165,8 @@ class Game(models.Model):
         blank=True,
         on_delete=models.SET_NULL,
     )
-    tournament_round = models.IntegerField(null=True, blank=True)  # 0=準決勝、1=決勝
+    # 0 が1回戦、以降 1 ずつ増え、ブラケットの最終ラウンドが決勝（4人なら 0=準決勝、1=決勝）
+    tournament_round = models.IntegerField(null=True, blank=True)
 
     def __str__(self):
         opponent = (
@@ -199,6 +201,20 @@ class TournamentSession(models.Model):
         blank=True,
         on_delete=models.SET_NULL,
     )
+    version = models.PositiveIntegerField(
+        default=0,
+        help_text="ブラケットが進むたびに増える値（キャッシュした状態との競合検出用）",
+    )
+
+    class Meta:
+        constraints = [
+            # 参加者を募集中のトーナメント（ロビー）は常に1つだけ
+            models.UniqueConstraint(
+                fields=["status"],
+                condition=models.Q(status="WAITING_PLAYERS"),
+                name="unique_waiting_tournament",
+            )
+        ]
 
     def __str__(self):
         return f"Tournament {self.id} ({self.status})"
@@ -217,11 +233,10 @@ class TournamentParticipant(models.Model):
         null=True,
         blank=True,
         help_text="""
-        トーナメントブラケット内の位置を示す値。
-        1, 2: 第1準決勝の対戦者
-        3, 4: 第2準決勝の対戦者
-        5: 決勝進出者
-        6: 優勝者
+        トーナメントブラケット内の位置を示す値（1始まり、シード順に配置）。
+        1, 2: 1回戦の第1試合の対戦者
+        3, 4: 1回戦の第2試合の対戦者（以降も同様）
+        相手の位置が空いている場合は不戦勝。勝ち上がりは試合結果から求める。
         """,
     )
 
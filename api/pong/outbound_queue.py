@@ -0,0 +1,165 @@
+# api/pong/outbound_queue.py
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from django.conf import settings
+
+# 送信キューが溢れた接続を切断する際のクローズコード
+OVERFLOW_CLOSE_CODE = 4008
+# 送信タスクが異常終了した接続を切断する際のクローズコード（内部エラー）
+SEND_ERROR_CLOSE_CODE = 1011
+
+
+def websocket_message(text_data=None, bytes_data=None) -> Dict:
+    if text_data is not None:
+        return {"type": "websocket.send", "text": text_data}
+    if bytes_data is not None:
+        return {"type": "websocket.send", "bytes": bytes_data}
+    raise ValueError("You must pass one of bytes_data or text_data")
+
+
+class OutboundQueue:
+    """接続ごとの送信キュー
+
+    送信は専用のタスクが行うため、呼び出し側（スケジューラやグループ配信）は
+    遅いクライアントを待たない。状態フレームは常に最新の1件だけを保持し
+    （古いものは上書き）、制御メッセージ（match_found, final_ready など）は
+    破棄せず順番に送る。制御メッセージが max_control 件を超えて溜まった
+    接続は追い付けないものとして切断する。送信タスクが例外で終了した
+    場合も、以降のメッセージは受け付けずに接続を切断する。
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Dict], Awaitable[None]],
+        max_control: int = 256,
+    ):
+        self._send = send
+        self.max_control = max_control
+        self._control = deque()
+        self._state: Optional[Dict] = None
+        self._ready = asyncio.Event()
+        self.overflowed = False
+        # 送信タスクが終了した（以降は何も送れない）
+        self.closed = False
+        self.stats = {
+            "control_sent": 0,
+            "state_sent": 0,
+            "coalesced": 0,
+            "max_depth": 0,
+        }
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    @property
+    def depth(self) -> int:
+        """送信待ちのメッセージ数"""
+        return len(self._control) + (self._state is not None)
+
+    def put_state(self, message: Dict) -> None:
+        """状態フレームを追加（未送信の古い状態フレームは破棄）"""
+        if self.overflowed or self.closed:
+            return
+        if self._state is not None:
+            self.stats["coalesced"] += 1
+        self._state = message
+        self._wake()
+
+    def put_control(self, message: Dict) -> None:
+        """制御メッセージを追加（破棄しない）"""
+        if self.overflowed or self.closed:
+            return
+        if len(self._control) >= self.max_control:
+            print(f"Outbound queue overflow ({len(self._control)} messages)")
+            self.overflowed = True
+            self._control.clear()
+            self._state = None
+            message = {"type": "websocket.close", "code": OVERFLOW_CLOSE_CODE}
+        self._control.append(message)
+        self._wake()
+
+    def stop(self) -> None:
+        self._task.cancel()
+
+    def _wake(self) -> None:
+        self.stats["max_depth"] = max(self.stats["max_depth"], self.depth)
+        self._ready.set()
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                # 制御メッセージを優先し、状態フレームは最新のものだけを送る
+                while self._control or self._state is not None:
+                    if self._control:
+                        message = self._control.popleft()
+                        self.stats["control_sent"] += 1
+                    else:
+                        message, self._state = self._state, None
+                        self.stats["state_sent"] += 1
+                    await self._send(message)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error sending to websocket: {e}")
+            await self._abort()
+        finally:
+            self.closed = True
+
+    async def _abort(self) -> None:
+        """送信に失敗した接続を切断し、溜まったメッセージを破棄する"""
+        self.closed = True
+        self._control.clear()
+        self._state = None
+        try:
+            await self._send({"type": "websocket.close", "code": SEND_ERROR_CLOSE_CODE})
+        except Exception as e:
+            print(f"Error closing websocket: {e}")
+
+
+class QueuedSendMixin:
+    """AsyncWebsocketConsumer の送信を OutboundQueue 経由にする Mixin
+
+    accept 以降の send / close は制御メッセージとしてキューに積まれ、
+    send_state で送る状態フレームは最新の1件に集約される。
+    """
+
+    outbound: Optional[OutboundQueue] = None
+
+    async def accept(self, subprotocol=None, headers=None):
+        await super().accept(subprotocol=subprotocol, headers=headers)
+        self.outbound = OutboundQueue(
+            self.base_send,
+            max_control=getattr(settings, "PONG_OUTBOUND_MAX_CONTROL", 256),
+        )
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        if self.outbound is None:
+            return await super().send(text_data, bytes_data, close)
+        self.outbound.put_control(websocket_message(text_data, bytes_data))
+        if close:
+            await self.close(close)
+
+    async def send_state(self, text_data=None, bytes_data=None):
+        """状態フレームの送信（送信待ちの古い状態フレームは破棄される）"""
+        if self.outbound is None:
+            return await super().send(text_data, bytes_data)
+        self.outbound.put_state(websocket_message(text_data, bytes_data))
+
+    async def close(self, code=None, reason=None):
+        if self.outbound is None:
+            return await super().close(code, reason)
+        message = {"type": "websocket.close"}
+        if code is not None and code is not True:
+            message["code"] = code
+        if reason:
+            message["reason"] = reason
+        self.outbound.put_control(message)
+
+    async def websocket_disconnect(self, message):
+        if self.outbound is not None:
+            self.outbound.stop()
+            if self.outbound.stats["coalesced"]:
+                print(f"Outbound queue stats: {self.outbound.stats}")
+        await super().websocket_disconnect(message)
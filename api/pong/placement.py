@@ -0,0 +1,167 @@
+# api/pong/placement.py
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .redis_client import get_redis
+
+
+class LocalPlacementRegistry:
+    """プロセス内で完結する試合配置レジストリ（テスト・単一ワーカー用）"""
+
+    def __init__(self):
+        self._owners: Dict[str, Tuple[str, float]] = {}
+        self._workers: Dict[str, Tuple[str, float]] = {}
+
+    async def claim(self, session_id: str, worker_id: str, ttl: float) -> str:
+        """セッションの所有権を取得し、所有ワーカーのIDを返す"""
+        owner = await self.owner(session_id)
+        if owner is None:
+            self._owners[session_id] = (worker_id, time.monotonic() + ttl)
+            return worker_id
+        return owner
+
+    async def owner(self, session_id: str) -> Optional[str]:
+        entry = self._owners.get(session_id)
+        if entry is None or entry[1] <= time.monotonic():
+            self._owners.pop(session_id, None)
+            return None
+        return entry[0]
+
+    async def renew(self, session_id: str, worker_id: str, ttl: float) -> bool:
+        """所有者であればリース期限を延長"""
+        if await self.owner(session_id) != worker_id:
+            return False
+        self._owners[session_id] = (worker_id, time.monotonic() + ttl)
+        return True
+
+    async def release(self, session_id: str, worker_id: str) -> None:
+        """所有者であれば所有権を解放"""
+        if await self.owner(session_id) == worker_id:
+            del self._owners[session_id]
+
+    async def takeover(
+        self, session_id: str, old_owner: str, worker_id: str, ttl: float
+    ) -> bool:
+        """所有者が old_owner のまま（または不在）であれば所有権を引き継ぐ"""
+        if await self.owner(session_id) not in (None, old_owner):
+            return False
+        self._owners[session_id] = (worker_id, time.monotonic() + ttl)
+        return True
+
+    async def register_worker(self, worker_id: str, url: str, ttl: float) -> None:
+        """ワーカーの生存と接続先URLを登録"""
+        self._workers[worker_id] = (url, time.monotonic() + ttl)
+
+    async def worker_url(self, worker_id: str) -> Optional[str]:
+        entry = self._workers.get(worker_id)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    async def worker_alive(self, worker_id: str) -> bool:
+        return await self.worker_url(worker_id) is not None
+
+
+class RedisPlacementRegistry:
+    """Redis 上で全ワーカーが共有する試合配置レジストリ
+
+    pong:placement:{session_id} に所有ワーカーIDを TTL 付きで保存し、
+    SET NX で最初に接続したワーカーを所有者にする。延長・解放・引き継ぎは
+    所有者の一致を Lua スクリプトで確認してから原子的に行う。
+    pong:worker:{worker_id} は短い TTL で更新される生存確認を兼ねる。
+    """
+
+    KEY_PREFIX = "pong:placement:"
+    WORKER_PREFIX = "pong:worker:"
+
+    RENEW_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+    TAKEOVER_SCRIPT = """
+    local owner = redis.call('get', KEYS[1])
+    if owner == false or owner == ARGV[1] then
+        redis.call('set', KEYS[1], ARGV[2], 'PX', ARGV[3])
+        return 1
+    end
+    return 0
+    """
+
+    async def claim(self, session_id: str, worker_id: str, ttl: float) -> str:
+        redis = get_redis()
+        key = self.KEY_PREFIX + session_id
+        for _ in range(3):
+            if await redis.set(key, worker_id, nx=True, px=int(ttl * 1000)):
+                return worker_id
+            owner = await redis.get(key)
+            # 取得と期限切れが競合した場合は再試行
+            if owner is not None:
+                return owner.decode()
+        return worker_id
+
+    async def owner(self, session_id: str) -> Optional[str]:
+        owner = await get_redis().get(self.KEY_PREFIX + session_id)
+        return owner.decode() if owner is not None else None
+
+    async def renew(self, session_id: str, worker_id: str, ttl: float) -> bool:
+        renewed = await get_redis().eval(
+            self.RENEW_SCRIPT,
+            1,
+            self.KEY_PREFIX + session_id,
+            worker_id,
+            int(ttl * 1000),
+        )
+        return bool(renewed)
+
+    async def release(self, session_id: str, worker_id: str) -> None:
+        await get_redis().eval(
+            self.RELEASE_SCRIPT, 1, self.KEY_PREFIX + session_id, worker_id
+        )
+
+    async def takeover(
+        self, session_id: str, old_owner: str, worker_id: str, ttl: float
+    ) -> bool:
+        taken = await get_redis().eval(
+            self.TAKEOVER_SCRIPT,
+            1,
+            self.KEY_PREFIX + session_id,
+            old_owner,
+            worker_id,
+            int(ttl * 1000),
+        )
+        return bool(taken)
+
+    async def register_worker(self, worker_id: str, url: str, ttl: float) -> None:
+        await get_redis().set(self.WORKER_PREFIX + worker_id, url, px=int(ttl * 1000))
+
+    async def worker_url(self, worker_id: str) -> Optional[str]:
+        url = await get_redis().get(self.WORKER_PREFIX + worker_id)
+        return url.decode() if url is not None else None
+
+    async def worker_alive(self, worker_id: str) -> bool:
+        return bool(await get_redis().exists(self.WORKER_PREFIX + worker_id))
+
+
+_registry = None
+
+
+def get_placement_registry():
+    """設定（PONG_PLACEMENT_BACKEND）に応じたレジストリを取得"""
+    global _registry
+    if _registry is None:
+        backend = getattr(settings, "PONG_PLACEMENT_BACKEND", "redis")
+        if backend == "local":
+            _registry = LocalPlacementRegistry()
+        else:
+            _registry = RedisPlacementRegistry()
+    return _registry
@@ -0,0 +1,27 @@
+# api/pong/redis_client.py
+import asyncio
+import weakref
+
+from django.conf import settings
+from redis import asyncio as aioredis
+
+# イベントループ → Redis クライアント（ループが破棄されたら自動で外れる）
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_redis() -> aioredis.Redis:
+    """イベントループごとに共有する Redis クライアントを取得
+
+    クライアントの接続は作成したループでしか使えないため、閉じたループの
+    クライアントはここで破棄する。
+    """
+    loop = asyncio.get_running_loop()
+    for closed in [other for other in _clients if other.is_closed()]:
+        _clients.pop(closed, None)
+    client = _clients.get(loop)
+    if client is None:
+        client = aioredis.Redis.from_url(settings.PONG_REDIS_URL)
+        _clients[loop] = client
+    return client
@@ -0,0 +1,279 @@
+# api/pong/reservation.py
+import json
+import time
+from typing import Dict, List, Optional, Sequence
+
+from django.conf import settings
+
+from .redis_client import get_redis
+
+# 予約の状態
+PENDING = "pending"  # 両プレイヤーの参加待ち
+READY = "ready"  # 全員が期限内に参加した（試合を開始してよい）
+EXPIRED = "expired"  # 期限切れで取り消された
+
+# 1件分の予約（session_id, players, tickets, accepted, deadline, state）
+Reservation = Dict
+
+
+class LocalReservationStore:
+    """プロセス内で完結する試合の予約（テスト・単一ワーカー用）
+
+    マッチした2人がゲームの WebSocket に接続した時点で参加（accept）とみなし、
+    期限までに全員がそろった予約だけを READY にする。READY・EXPIRED の
+    予約は retention 秒だけ残し、再接続や遅れて来た接続の判定に使う。
+    """
+
+    def __init__(self, retention: float = 3600):
+        self.retention = retention
+        self._reservations: Dict[str, Reservation] = {}
+
+    async def reserve(
+        self, session_id: str, tickets: Sequence[Dict], timeout: float
+    ) -> float:
+        """マッチした組の予約を作成し、参加期限（UNIX 時刻）を返す"""
+        deadline = time.time() + timeout
+        self._reservations[session_id] = {
+            "session_id": session_id,
+            "players": [ticket["username"] for ticket in tickets],
+            "tickets": {ticket["username"]: ticket for ticket in tickets},
+            "accepted": {},
+            "deadline": deadline,
+            "state": PENDING,
+            "expires_at": time.time() + self.retention,
+        }
+        return deadline
+
+    async def accept(
+        self,
+        session_id: str,
+        players: Sequence[str],
+        username: str,
+        channel_name: str,
+        timeout: float,
+    ) -> str:
+        """プレイヤーの参加を記録して予約の状態を返す
+
+        予約がなければ（マッチメイキングを経ない接続など）この時点から
+        期限を数える予約を作成する。
+        """
+        reservation = self._reservations.get(session_id)
+        if reservation is None:
+            await self.reserve(
+                session_id, [{"username": player} for player in players], timeout
+            )
+            reservation = self._reservations[session_id]
+        if reservation["state"] != PENDING or username not in reservation["players"]:
+            return reservation["state"]
+        reservation["accepted"][username] = channel_name
+        if len(reservation["accepted"]) == len(reservation["players"]):
+            reservation["state"] = READY
+            reservation["expires_at"] = time.time() + self.retention
+        return reservation["state"]
+
+    async def withdraw(self, session_id: str, username: str, channel_name: str) -> None:
+        """参加待ちの間に切断したプレイヤーの参加を取り消す"""
+        reservation = self._reservations.get(session_id)
+        if (
+            reservation is not None
+            and reservation["state"] == PENDING
+            and reservation["accepted"].get(username) == channel_name
+        ):
+            del reservation["accepted"][username]
+
+    async def expire_due(self, now: Optional[float] = None) -> List[Reservation]:
+        """期限を過ぎた参加待ちの予約を取り消して返す"""
+        now = time.time() if now is None else now
+        expired = []
+        for session_id, reservation in list(self._reservations.items()):
+            if reservation["state"] == PENDING and reservation["deadline"] <= now:
+                reservation["state"] = EXPIRED
+                reservation["expires_at"] = now + self.retention
+                expired.append(reservation)
+            elif reservation["state"] != PENDING and reservation["expires_at"] <= now:
+                del self._reservations[session_id]
+        return expired
+
+    async def pending_count(self) -> int:
+        return sum(
+            1
+            for reservation in self._reservations.values()
+            if reservation["state"] == PENDING
+        )
+
+
+class RedisReservationStore:
+    """Redis 上で全ワーカーが共有する試合の予約
+
+    予約は pong:reservation:<session_id>（HASH）に、参加期限は
+    pong:reservation:deadlines（ZSET）に保持する。参加の記録と期限切れの
+    取り消しは Lua スクリプトで原子的に行うため、期限と同時に参加した
+    場合でも READY と EXPIRED のどちらか一方にしかならない。
+    """
+
+    KEY_PREFIX = "pong:reservation:"
+    DEADLINE_KEY = "pong:reservation:deadlines"
+
+    ACCEPT_SCRIPT = """
+    local state = redis.call('hget', KEYS[1], 'state')
+    if not state then
+        state = 'pending'
+        local deadline = tonumber(ARGV[4]) + tonumber(ARGV[5])
+        redis.call('hset', KEYS[1], 'state', state, 'deadline', deadline,
+            'players', ARGV[6], 'tickets', '{}')
+        redis.call('zadd', KEYS[2], deadline, ARGV[1])
+        redis.call('expire', KEYS[1], ARGV[7])
+    end
+    if state ~= 'pending' then
+        return state
+    end
+    local players = cjson.decode(redis.call('hget', KEYS[1], 'players'))
+    local member = false
+    for _, player in ipairs(players) do
+        if player == ARGV[2] then
+            member = true
+        end
+    end
+    if not member then
+        return state
+    end
+    redis.call('hset', KEYS[1], 'accepted:' .. ARGV[2], ARGV[3])
+    for _, player in ipairs(players) do
+        if redis.call('hexists', KEYS[1], 'accepted:' .. player) == 0 then
+            return state
+        end
+    end
+    redis.call('hset', KEYS[1], 'state', 'ready')
+    redis.call('zrem', KEYS[2], ARGV[1])
+    redis.call('expire', KEYS[1], ARGV[7])
+    return 'ready'
+    """
+    WITHDRAW_SCRIPT = """
+    if redis.call('hget', KEYS[1], 'state') == 'pending'
+        and redis.call('hget', KEYS[1], 'accepted:' .. ARGV[1]) == ARGV[2] then
+        redis.call('hdel', KEYS[1], 'accepted:' .. ARGV[1])
+    end
+    return 0
+    """
+    EXPIRE_SCRIPT = """
+    local sessions = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1],
+        'LIMIT', 0, ARGV[3])
+    local expired = {}
+    for _, session_id in ipairs(sessions) do
+        redis.call('zrem', KEYS[1], session_id)
+        local key = ARGV[2] .. session_id
+        if redis.call('hget', key, 'state') == 'pending' then
+            redis.call('hset', key, 'state', 'expired')
+            redis.call('expire', key, ARGV[4])
+            local players = cjson.decode(redis.call('hget', key, 'players'))
+            local accepted = {}
+            for _, player in ipairs(players) do
+                local channel = redis.call('hget', key, 'accepted:' .. player)
+                if channel then
+                    accepted[player] = channel
+                end
+            end
+            table.insert(expired, cjson.encode({
+                session_id = session_id,
+                players = players,
+                tickets = cjson.decode(redis.call('hget', key, 'tickets')),
+                accepted = accepted,
+                deadline = tonumber(redis.call('hget', key, 'deadline')),
+                state = 'expired',
+            }))
+        end
+    end
+    return expired
+    """
+
+    def __init__(self, retention: float = 3600):
+        self.retention = retention
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.KEY_PREFIX}{session_id}"
+
+    async def reserve(
+        self, session_id: str, tickets: Sequence[Dict], timeout: float
+    ) -> float:
+        deadline = time.time() + timeout
+        key = self._key(session_id)
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.hset(
+                key,
+                mapping={
+                    "state": PENDING,
+                    "deadline": deadline,
+                    "players": json.dumps([ticket["username"] for ticket in tickets]),
+                    "tickets": json.dumps(
+                        {ticket["username"]: ticket for ticket in tickets}
+                    ),
+                },
+            )
+            pipe.zadd(self.DEADLINE_KEY, {session_id: deadline})
+            pipe.expire(key, int(max(self.retention, timeout)))
+            await pipe.execute()
+        return deadline
+
+    async def accept(
+        self,
+        session_id: str,
+        players: Sequence[str],
+        username: str,
+        channel_name: str,
+        timeout: float,
+    ) -> str:
+        state = await get_redis().eval(
+            self.ACCEPT_SCRIPT,
+            2,
+            self._key(session_id),
+            self.DEADLINE_KEY,
+            session_id,
+            username,
+            channel_name,
+            time.time(),
+            timeout,
+            json.dumps(list(players)),
+            int(max(self.retention, timeout)),
+        )
+        return state.decode() if isinstance(state, bytes) else state
+
+    async def withdraw(self, session_id: str, username: str, channel_name: str) -> None:
+        await get_redis().eval(
+            self.WITHDRAW_SCRIPT, 1, self._key(session_id), username, channel_name
+        )
+
+    async def expire_due(self, now: Optional[float] = None) -> List[Reservation]:
+        expired = await get_redis().eval(
+            self.EXPIRE_SCRIPT,
+            1,
+            self.DEADLINE_KEY,
+            time.time() if now is None else now,
+            self.KEY_PREFIX,
+            100,
+            int(self.retention),
+        )
+        return [json.loads(reservation) for reservation in expired]
+
+    async def pending_count(self) -> int:
+        return await get_redis().zcard(self.DEADLINE_KEY)
+
+
+_store = None
+
+
+def get_reservation_store():
+    """設定（PONG_MATCHMAKING_BACKEND）に応じた予約の保存先を取得"""
+    global _store
+    if _store is None:
+        retention = getattr(settings, "PONG_RESERVATION_RETENTION", 3600)
+        if getattr(settings, "PONG_MATCHMAKING_BACKEND", "redis") == "local":
+            _store = LocalReservationStore(retention)
+        else:
+            _store = RedisReservationStore(retention)
+    return _store
+
+
+def reset_reservation_store() -> None:
+    """共有の予約の保存先を破棄（設定を変更した後に作り直すため）"""
+    global _store
+    _store = None
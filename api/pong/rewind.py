@@ -0,0 +1,90 @@
+# api/pong/rewind.py
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Tuple
+
+from .checkpoint import restore_game, snapshot_game
+from .game_logic import MultiplayerPongGame
+from .input_buffer import apply_input
+
+
+@dataclass
+class RewindFrame:
+    """1ティック分の巻き戻し用の記録"""
+
+    tick: int  # ティック開始時のサーバーティック番号
+    snapshot: Dict  # 入力適用前の状態
+    # プレイヤー名 → (種別, 値)。このティックの開始時に適用した入力
+    inputs: Dict[str, Tuple[str, float]] = field(default_factory=dict)
+    steps: int = 1
+    delta_time: float = 0.0
+
+
+class RewindBuffer:
+    """直近の状態と適用済みの入力を保持するリングバッファ（ラグ補償用）
+
+    ネットワーク遅延で遅れて届いた方向入力は、クライアントが発行した時点の
+    ティックまで巻き戻して適用し、現在のティックまで再計算する（位置入力は
+    巻き戻さない。GameScheduler._apply_inputs を参照）。
+    得点後のボールのリセットは乱数を使うため、得点をまたぐ巻き戻しは
+    行わず、入力は現在のティックで適用する。
+    """
+
+    def __init__(self, size: int = 12):
+        self.frames: Deque[RewindFrame] = deque(maxlen=size)
+        self.stats = {"rewound": 0, "resimulated_steps": 0, "too_late": 0}
+
+    def record(
+        self,
+        tick: int,
+        snapshot: Dict,
+        inputs: Dict[str, Tuple[str, float]],
+        steps: int,
+        delta_time: float,
+    ) -> None:
+        self.frames.append(RewindFrame(tick, snapshot, inputs, steps, delta_time))
+
+    def rewind(
+        self,
+        game: MultiplayerPongGame,
+        username: str,
+        kind: str,
+        value,
+        tick: int,
+    ) -> bool:
+        """入力を発行時点のティックに適用して現在まで再計算する
+
+        巻き戻せない場合は False を返し、呼び出し側が現在のティックで適用する。
+        """
+        start = self._find(tick)
+        if start is None:
+            self.stats["too_late"] += 1
+            return False
+        first = self.frames[start]
+        if first.snapshot["score"] != [
+            game.score[name] for name in first.snapshot["players"]
+        ]:
+            return False
+
+        first.inputs[username] = (kind, value)
+        restore_game(game, first.snapshot)
+        for index in range(start, len(self.frames)):
+            frame = self.frames[index]
+            frame.snapshot = snapshot_game(game)
+            for player, (input_kind, input_value) in frame.inputs.items():
+                apply_input(game, player, input_kind, input_value)
+            for _ in range(frame.steps):
+                game.update(delta_time=frame.delta_time)
+            game.tick += frame.steps
+            self.stats["resimulated_steps"] += frame.steps
+        self.stats["rewound"] += 1
+        return True
+
+    def _find(self, tick: int) -> Optional[int]:
+        """tick 以降で最初に記録されたフレームの位置（履歴より古ければ None）"""
+        if not self.frames or self.frames[0].tick > tick:
+            return None
+        for index, frame in enumerate(self.frames):
+            if frame.tick >= tick:
+                return index
+        return None
@@ -0,0 +1,103 @@
+# api/pong/send_rate.py
+from typing import Optional
+
+from django.conf import settings
+
+
+class SendRateController:
+    """接続ごとの状態送信レートを決めるコントローラ
+
+    シミュレーションはティックレートで進め、送信は interval ティックに
+    1回だけ行う。接続の送信キューで未送信の状態フレームが上書きされた
+    （OutboundQueue の coalesced が増えた）場合はクライアントが追い付いて
+    いないとみなし、送信間隔を倍にする（最低 min_send_rate まで、
+    max_lag 秒に1回まで）。上書きが4 * max_lag 秒起きなければ間隔を半分に戻す。
+
+    クライアントが確認応答（state_ack の tick）を送る場合は、その遅れでも
+    同じように調整する。
+    """
+
+    def __init__(
+        self,
+        tick_rate: int = 60,
+        send_rate: Optional[int] = None,
+        min_send_rate: int = 15,
+        max_lag: float = 0.25,
+    ):
+        self.base_interval = max(1, round(tick_rate / (send_rate or tick_rate)))
+        self.max_interval = max(self.base_interval, round(tick_rate / min_send_rate))
+        self.interval = self.base_interval
+        self.max_lag_ticks = max_lag * tick_rate
+        self.last_sent_tick: Optional[int] = None
+        self.last_acked_tick: Optional[int] = None
+        # 送信キューの混雑の判定用
+        self.recover_ticks = 4 * self.max_lag_ticks
+        self.last_coalesced = 0
+        self.last_congested_tick: Optional[int] = None
+        self.last_shift_tick: Optional[int] = None
+        self.stats = {"sent": 0, "skipped": 0, "downshifts": 0, "upshifts": 0}
+
+    @classmethod
+    def from_settings(cls, tick_rate: int) -> "SendRateController":
+        return cls(
+            tick_rate=tick_rate,
+            send_rate=getattr(settings, "PONG_SEND_RATE", tick_rate),
+            min_send_rate=getattr(settings, "PONG_MIN_SEND_RATE", 15),
+            max_lag=getattr(settings, "PONG_SEND_MAX_LAG", 0.25),
+        )
+
+    def should_send(self, tick: int, final: bool = False) -> bool:
+        """このティックの状態を送信するか判定（試合終了時の状態は必ず送る）"""
+        if (
+            final
+            or self.last_sent_tick is None
+            or tick - self.last_sent_tick >= self.interval
+        ):
+            self.last_sent_tick = tick
+            self.stats["sent"] += 1
+            return True
+        self.stats["skipped"] += 1
+        return False
+
+    def observe_backlog(self, tick: int, coalesced: int) -> None:
+        """送信キューで上書きされた状態フレームの累計から送信間隔を調整"""
+        if coalesced > self.last_coalesced:
+            self.last_coalesced = coalesced
+            self.last_congested_tick = tick
+            if self.interval < self.max_interval and (
+                self.last_shift_tick is None
+                or tick - self.last_shift_tick >= self.max_lag_ticks
+            ):
+                self._shift(tick, min(self.interval * 2, self.max_interval))
+                self.stats["downshifts"] += 1
+        elif (
+            self.interval > self.base_interval
+            and tick - max(self.last_congested_tick or 0, self.last_shift_tick or 0)
+            >= self.recover_ticks
+        ):
+            self._shift(tick, max(self.interval // 2, self.base_interval))
+            self.stats["upshifts"] += 1
+
+    def _shift(self, tick: int, interval: int) -> None:
+        self.interval = interval
+        self.last_shift_tick = tick
+
+    def acknowledge(self, tick) -> None:
+        """クライアントが受信済みのティックから遅れを求めて送信間隔を調整"""
+        try:
+            tick = int(tick)
+        except (TypeError, ValueError):
+            return
+        if self.last_sent_tick is None or (
+            self.last_acked_tick is not None and tick <= self.last_acked_tick
+        ):
+            return
+        self.last_acked_tick = tick
+
+        lag = self.last_sent_tick - tick
+        if lag > self.max_lag_ticks and self.interval < self.max_interval:
+            self.interval = min(self.interval * 2, self.max_interval)
+            self.stats["downshifts"] += 1
+        elif lag <= self.max_lag_ticks / 2 and self.interval > self.base_interval:
+            self.interval = max(self.interval // 2, self.base_interval)
+            self.stats["upshifts"] += 1
@@ -2,6 +2,7 @@ import time
 
 from rest_framework import serializers
 
+from .bracket import bracket_size, round_type
 from .models import Game, TournamentParticipant, TournamentSession, User
 
 
@@ -23,6 +24,27 @@ def generate_tournament_session_id(
     return f"tournament_{tournament_id}_{round_type}_{player1_username}_{player2_username}_{timestamp}"
 
 
+def tournament_round_type(tournament, round_number, player):
+    """トーナメントの試合の round_type（final, semi1, quarter3 など）
+
+    ラウンド内の位置はプレイヤーのブラケットの位置から求め、位置が
+    未設定ならそのラウンドで作成済みの試合数を使う。
+    """
+    rounds = bracket_size(tournament.max_players).bit_length() - 1
+    slot = (
+        TournamentParticipant.objects.filter(tournament=tournament, user=player)
+        .values_list("bracket_position", flat=True)
+        .first()
+    )
+    if slot:
+        index = (slot - 1) >> (round_number + 1)
+    else:
+        index = Game.objects.filter(
+            tournament=tournament, tournament_round=round_number
+        ).count()
+    return round_type(round_number, index, rounds)
+
+
 class FriendSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -200,11 +222,13 @@ class GameSerializer(serializers.ModelSerializer):
         # セッションIDの生成
         if game_type == "TOURNAMENT":
             tournament = validated_data.get("tournament")
-            round_type = (
-                "semi1" if validated_data.get("tournament_round") == 0 else "final"
-            )
             validated_data["session_id"] = generate_tournament_session_id(
-                tournament.id, round_type, player1.username, player2_username
+                tournament.id,
+                tournament_round_type(
+                    tournament, validated_data.get("tournament_round") or 0, player1
+                ),
+                player1.username,
+                player2_username,
             )
         else:
             validated_data["session_id"] = generate_session_id(
@@ -0,0 +1,94 @@
+import unittest
+
+from pong.batched_physics import BatchedPongEngine, BatchedPongGame
+from pong.game_logic import MultiplayerPongGame
+from pong.tests import test_game_logic
+
+
+class TestBatchedPongGameCompat(test_game_logic.TestMultiplayerPongGame):
+    """BatchedPongGameがMultiplayerPongGameと同じAPIで動作するかテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        super().setUp()
+        self.engine = BatchedPongEngine(capacity=2)
+        self.game = BatchedPongGame(
+            session_id=self.session_id,
+            player1_name=self.player1,
+            player2_name=self.player2,
+            engine=self.engine,
+        )
+
+
+class TestBatchedPongEngine(unittest.TestCase):
+    """BatchedPongEngineクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.engine = BatchedPongEngine(capacity=1)
+
+    def _pair(self, session_id):
+        """同じ初期状態の通常版とバッチ版のゲームを作成"""
+        reference = MultiplayerPongGame(session_id, "p1", "p2")
+        batched = BatchedPongGame(session_id, "p1", "p2", engine=self.engine)
+        return reference, batched
+
+    def test_step_matches_reference_engine(self):
+        """一括ステップの結果が通常版のupdateと一致するかテスト"""
+        pairs = [self._pair(f"s{i}") for i in range(6)]
+        for i, (reference, batched) in enumerate(pairs):
+            for game in (reference, batched):
+                if i % 2:
+                    # 横方向のみに動いて壁で跳ね返る
+                    game.ball_velocity.x = 500 + i * 100
+                    game.ball_velocity.z = 0
+                else:
+                    # player2 のパドルに当たって跳ね返る
+                    game.ball.x = i * 20 - 40
+                    game.ball.z = -1000
+                    game.ball_velocity.x = 0
+
+        # 壁とパドルに当たるが得点しない範囲で進める
+        for _ in range(300):
+            self.engine.step(0.016)
+            for reference, _batched in pairs:
+                reference.update(0.016)
+
+        for i, (reference, batched) in enumerate(pairs):
+            if not i % 2:
+                self.assertGreater(reference.ball_velocity.z, 0)
+            self.assertAlmostEqual(batched.ball.x, reference.ball.x, places=6)
+            self.assertAlmostEqual(batched.ball.z, reference.ball.z, places=6)
+            self.assertAlmostEqual(
+                batched.ball_velocity.x, reference.ball_velocity.x, places=6
+            )
+            self.assertEqual(batched.get_state(), reference.get_state())
+
+    def test_capacity_grows_and_rows_are_reused(self):
+        """容量が自動で拡張され、解放した行が再利用されるかテスト"""
+        games = [BatchedPongGame(f"s{i}", "a", "b", self.engine) for i in range(3)]
+        self.assertGreaterEqual(self.engine.capacity, 3)
+        self.assertEqual(self.engine.active_count, 3)
+
+        released_row = games[0].row
+        games[0].close()
+        self.assertEqual(self.engine.active_count, 2)
+
+        reused = BatchedPongGame("s3", "a", "b", self.engine)
+        self.assertEqual(reused.row, released_row)
+
+    def test_close_keeps_final_state(self):
+        """close後も保存処理のために最終状態を参照できるかテスト"""
+        game = BatchedPongGame("s1", "p1", "p2", self.engine)
+        game.handle_disconnection("p1")
+        game.close()
+
+        # 解放された行が別の試合に再利用されても影響を受けない
+        BatchedPongGame("s2", "x", "y", self.engine)
+        self.assertFalse(game.is_active)
+        self.assertEqual(game.get_winner(), "p2")
+        self.assertEqual(game.score["p2"], MultiplayerPongGame.WINNING_SCORE)
+
+
+if __name__ == "__main__":
+    unittest.main()
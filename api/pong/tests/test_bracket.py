@@ -0,0 +1,69 @@
+from django.test import SimpleTestCase
+
+from pong.bracket import (
+    Bracket,
+    bracket_size,
+    parse_round_type,
+    round_type,
+    seed_positions,
+    seed_slots,
+)
+
+
+class TestBracket(SimpleTestCase):
+    """シングルエリミネーションのブラケットのテスト"""
+
+    def test_seed_positions(self):
+        """上位シード同士が決勝まで当たらない配置になるかテスト"""
+        self.assertEqual(seed_positions(4), [1, 4, 2, 3])
+        self.assertEqual(seed_positions(8), [1, 8, 4, 5, 2, 7, 3, 6])
+        self.assertEqual(sorted(seed_positions(64)), list(range(1, 65)))
+        self.assertEqual(
+            [bracket_size(n) for n in (2, 3, 4, 5, 33, 64)], [2, 4, 4, 8, 64, 64]
+        )
+
+    def test_round_type_round_trip(self):
+        """セッションIDの round_type から試合の位置を求められるかテスト"""
+        rounds = 6  # 64人
+        for round_number in range(rounds):
+            for index in range(64 >> (round_number + 1)):
+                value = round_type(round_number, index, rounds)
+                self.assertNotIn("_", value)
+                self.assertEqual(parse_round_type(value, rounds), (round_number, index))
+        self.assertEqual(round_type(0, 1, 2), "semi2")
+        self.assertIsNone(parse_round_type("semifinal", 2))
+
+    def test_64_players_play_63_matches(self):
+        """64人のブラケットで63試合を行い、各結果で次の試合だけが決まるかテスト"""
+        players = [f"p{seed}" for seed in range(1, 65)]
+        bracket = Bracket(seed_slots(players))
+        self.assertEqual((bracket.size, bracket.rounds), (64, 6))
+
+        ready = bracket.ready_matches()
+        self.assertEqual(len(ready), 32)
+        self.assertEqual(bracket.players(0, 0), ("p1", "p64"))
+
+        played = 0
+        while ready:
+            round_number, index = ready.pop(0)
+            winner = min(bracket.players(round_number, index), key=players.index)
+            self.assertTrue(bracket.record(round_number, index, winner))
+            self.assertFalse(bracket.record(round_number, index, winner))
+            played += 1
+            following = bracket.next_ready(round_number, index)
+            if following is not None:
+                ready.append(following)
+
+        self.assertEqual(played, 63)
+        self.assertEqual(bracket.champion, "p1")
+
+    def test_byes_for_top_seeds(self):
+        """人数が2の累乗でない場合に上位シードが不戦勝になるかテスト"""
+        bracket = Bracket(seed_slots(["a", "b", "c", "d", "e"]))
+        self.assertEqual(bracket.size, 8)
+        self.assertEqual(
+            sorted(bracket.winners[key] for key in bracket.byes), ["a", "b", "c"]
+        )
+        # b と c は不戦勝同士で2回戦がすぐに始められる
+        self.assertEqual(bracket.ready_matches(), [(0, 1), (1, 1)])
+        self.assertEqual(bracket.players(1, 1), ("b", "c"))
@@ -0,0 +1,108 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from pong.batched_physics import BatchedPongEngine, BatchedPongGame
+from pong.checkpoint import LocalCheckpointStore, restore_game, snapshot_game
+from pong.game_logic import MultiplayerPongGame
+from pong.game_scheduler import GameScheduler
+from pong.placement import LocalPlacementRegistry
+from pong.worker import WORKER_ID
+
+
+class TestCheckpoint(SimpleTestCase):
+    """試合状態のチェックポイントのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.game = MultiplayerPongGame("s1", "player1", "player2")
+        self.game.move_player("player1", 150)
+        self.game.score["player2"] = 2
+        self.game.db_game_id = 42
+        for _ in range(10):
+            self.game.update(0.016)
+        self.game.tick = 10
+
+    def test_restore_round_trip(self):
+        """保存した状態を別のゲームに復元できるかテスト"""
+        restored = MultiplayerPongGame("s1", "player1", "player2")
+        self.assertTrue(restore_game(restored, snapshot_game(self.game)))
+
+        self.assertEqual(restored.get_state(), self.game.get_state())
+        self.assertEqual(restored.tick, 10)
+        self.assertEqual(restored.db_game_id, 42)
+
+    def test_restore_into_batched_game(self):
+        """バッチエンジン上のゲームにも復元できるかテスト"""
+        restored = BatchedPongGame("s1", "player1", "player2", BatchedPongEngine())
+        self.assertTrue(restore_game(restored, snapshot_game(self.game)))
+        self.assertEqual(restored.get_state(), self.game.get_state())
+
+    def test_restore_rejects_other_players(self):
+        """プレイヤーが異なるチェックポイントは復元しないかテスト"""
+        other = MultiplayerPongGame("s1", "player1", "player3")
+        self.assertFalse(restore_game(other, snapshot_game(self.game)))
+        self.assertEqual(other.score["player1"], 0)
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class TestSessionFailover(SimpleTestCase):
+    """停止したワーカーからの試合の引き継ぎのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.registry = LocalPlacementRegistry()
+        self.store = LocalCheckpointStore()
+        self.patches = [
+            patch(
+                "pong.game_scheduler.get_placement_registry",
+                return_value=self.registry,
+            ),
+            patch("pong.game_scheduler.get_checkpoint_store", return_value=self.store),
+        ]
+        for p in self.patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    async def test_session_of_stopped_worker_is_adopted(self):
+        """生存確認が途絶えたワーカーのセッションを引き継ぐかテスト"""
+        await self.registry.claim("s1", "worker-stopped", 30)
+        scheduler = GameScheduler()
+
+        self.assertIsNone(await scheduler.claim("s1"))
+        self.assertEqual(await self.registry.owner("s1"), WORKER_ID)
+
+    async def test_session_of_live_worker_is_not_adopted(self):
+        """生存しているワーカーのセッションは引き継がないかテスト"""
+        await self.registry.register_worker("worker-b", "", 30)
+        await self.registry.claim("s1", "worker-b", 30)
+
+        self.assertEqual(await GameScheduler().claim("s1"), "worker-b")
+
+    async def test_adopted_match_resumes_from_checkpoint(self):
+        """引き継いだ試合がチェックポイントの時点から再開されるかテスト"""
+        old_worker = GameScheduler()
+        self.assertIsNone(await old_worker.claim("s1"))
+        game = MultiplayerPongGame("s1", "player1", "player2")
+        old_worker.register("s1", game, "game_s1", {})
+        old_worker._task.cancel()
+        for _ in range(30):
+            await old_worker.tick(0.016)
+        await old_worker._checkpoint()
+        # ワーカー停止（unregister されないままチェックポイントだけが残る）
+
+        new_worker = GameScheduler()
+        adopted = MultiplayerPongGame("s1", "player1", "player2")
+        self.assertTrue(await new_worker.resume(adopted))
+        self.assertEqual(adopted.tick, 30)
+        self.assertEqual(adopted.get_state(), game.get_state())
+
+        # 試合終了後はチェックポイントが削除される
+        new_worker.owned_sessions.add("s1")
+        new_worker.register("s1", adopted, "game_s1", {})
+        new_worker._task.cancel()
+        new_worker.unregister("s1")
+        await new_worker._release("s1")
+        self.assertIsNone(await self.store.load("s1"))
@@ -98,6 +98,39 @@ class TestMultiplayerPongGame(unittest.TestCase):
             self.game.ball_velocity.z, original_velocity_z, "ボールの速度が変化すべき"
         )
 
+    def test_fast_ball_does_not_tunnel_through_paddle(self):
+        """高速なボールや長いティックでもパドルをすり抜けないかテスト"""
+        self.game.paddles[self.player1] = 0
+        self.game.ball.x = 0
+        self.game.ball.z = self.game.FIELD_LENGTH / 2 - 200
+        self.game.ball_velocity.x = 0
+        self.game.ball_velocity.z = 3000
+
+        # 1ティックでパドルの厚さを大きく超えて移動する
+        self.game.update(0.1)
+
+        # パドル前面で反射し、衝突後の残り時間分だけ戻っている
+        contact_z = (
+            self.game.FIELD_LENGTH / 2
+            - self.game.PADDLE_THICKNESS / 2
+            - self.game.BALL_RADIUS
+        )
+        self.assertLess(self.game.ball_velocity.z, 0)
+        self.assertAlmostEqual(self.game.ball.z, contact_z - (300 - 160))
+        self.assertEqual(self.game.score[self.player2], 0)
+
+    def test_fast_ball_misses_offset_paddle(self):
+        """パドルから外れた位置のボールは衝突せず得点になるかテスト"""
+        self.game.paddles[self.player1] = 400
+        self.game.ball.x = -300
+        self.game.ball.z = self.game.FIELD_LENGTH / 2 - 200
+        self.game.ball_velocity.x = 0
+        self.game.ball_velocity.z = 3000
+
+        self.game.update(0.1)
+
+        self.assertEqual(self.game.score[self.player2], 1)
+
     def test_scoring(self):
         """ボールが端を超えるとスコアが加算されるかテスト"""
         # プレイヤー1がスコアする状況を作る（ボールをプレイヤー2側の端に配置）
@@ -168,6 +201,24 @@ class TestMultiplayerPongGame(unittest.TestCase):
         self.game.move_player("non_existent_player", 50)
         self.assertEqual(self.game.paddles, original_positions)
 
+    def test_paddle_direction(self):
+        """方向入力中はティックごとに PADDLE_SPEED で移動するかテスト"""
+        self.game.set_paddle_direction(self.player1, 1)
+        self.game.set_paddle_direction(self.player2, -5)
+        self.game.update(0.1)
+
+        step = self.game.PADDLE_SPEED * 0.1
+        self.assertAlmostEqual(self.game.paddles[self.player1], step)
+        self.assertAlmostEqual(self.game.paddles[self.player2], -step)
+
+        # 停止後は移動せず、移動範囲の端で止まる
+        self.game.set_paddle_direction(self.player2, 0)
+        for _ in range(20):
+            self.game.update(0.1)
+        max_x = (self.game.FIELD_WIDTH - self.game.PADDLE_WIDTH) / 2
+        self.assertAlmostEqual(self.game.paddles[self.player1], max_x)
+        self.assertAlmostEqual(self.game.paddles[self.player2], -step)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,274 @@
+import contextlib
+import json
+from io import StringIO
+from unittest.mock import patch
+
+from channels.layers import get_channel_layer
+from django.test import SimpleTestCase, override_settings
+
+from pong.batched_physics import BatchedPongEngine
+from pong.checkpoint import LocalCheckpointStore
+from pong.game_clock import FixedTimestepClock
+from pong.game_logic import MultiplayerPongGame
+from pong.game_scheduler import GameScheduler
+from pong.input_buffer import InputBuffer
+from pong.placement import LocalPlacementRegistry
+from pong.wire_format import BINARY_SUBPROTOCOL, DELTA_SUBPROTOCOL, decode_state
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class TestGameScheduler(SimpleTestCase):
+    """GameSchedulerクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.scheduler = GameScheduler()
+        self.games = {}
+        self.finished = []
+        self.game = MultiplayerPongGame(
+            session_id="game_player1_player2_0",
+            player1_name="player1",
+            player2_name="player2",
+        )
+
+    async def on_finish(self, game):
+        self.finished.append(game)
+
+    async def test_register_is_idempotent(self):
+        """同じセッションの登録は既存の試合を返すかテスト"""
+        first = self.scheduler.register("s1", self.game, "game_s1", self.games)
+        other = MultiplayerPongGame("s1", "player1", "player2")
+        second = self.scheduler.register("s1", other, "game_s1", self.games)
+
+        self.assertIs(first, second)
+        self.assertIs(self.games["s1"], self.game)
+        self.scheduler.unregister("s1")
+
+    async def test_losing_game_releases_engine_row(self):
+        """登録済みのセッションに渡されたゲームがバッチエンジンの行を解放するかテスト"""
+        self.scheduler.engine = BatchedPongEngine()
+        first = self.scheduler.create_game("s1", "player1", "player2")
+        second = self.scheduler.create_game("s1", "player1", "player2")
+        self.assertEqual(self.scheduler.engine.active_count, 2)
+
+        self.scheduler.register("s1", first, "game_s1", self.games)
+        match = self.scheduler.register("s1", second, "game_s1", self.games)
+        self.scheduler._task.cancel()
+
+        self.assertIs(match.game, first)
+        self.assertEqual(self.scheduler.engine.active_count, 1)
+        self.scheduler.unregister("s1")
+
+    async def test_tick_updates_each_match_once(self):
+        """購読者が複数いても1ティックで1回だけ更新されるかテスト"""
+        self.scheduler.register("s1", self.game, "game_s1", self.games)
+        self.scheduler._task.cancel()
+        self.scheduler.subscribe("s1", "channel-1")
+        self.scheduler.subscribe("s1", "channel-2")
+
+        initial_z = self.game.ball.z
+        await self.scheduler.tick(0.016)
+
+        self.assertAlmostEqual(
+            self.game.ball.z, initial_z + self.game.ball_velocity.z * 0.016
+        )
+        self.scheduler.unregister("s1")
+
+    async def test_tick_sends_pre_encoded_frames(self):
+        """フレームがティックごとに一度だけ、購読者の形式でエンコードされるかテスト"""
+        channel_layer = get_channel_layer()
+        channel_name = await channel_layer.new_channel()
+        await channel_layer.group_add("game_s1", channel_name)
+
+        self.scheduler.register("s1", self.game, "game_s1", self.games)
+        self.scheduler._task.cancel()
+        self.scheduler.subscribe("s1", channel_name, BINARY_SUBPROTOCOL)
+        self.scheduler.subscribe("s1", "channel-2")
+
+        await self.scheduler.tick(0.016)
+        event = await channel_layer.receive(channel_name)
+
+        self.assertEqual(event["type"], "game_state")
+        self.assertNotIn("state", event)
+        state = json.loads(event["frames"]["json"])["state"]
+        self.assertEqual(state["ball"], self.game.get_state()["ball"])
+        self.assertEqual(state["tick"], 1)
+        self.assertIn("server_time", state)
+        self.assertEqual(decode_state(event["frames"][BINARY_SUBPROTOCOL])["score1"], 0)
+        self.assertNotIn(DELTA_SUBPROTOCOL, event["frames"])
+
+        # JSON の購読者がいなければ JSON はエンコードしない
+        self.scheduler.unsubscribe("s1", "channel-2")
+        await self.scheduler.tick(0.016)
+        event = await channel_layer.receive(channel_name)
+        self.assertEqual(list(event["frames"]), [BINARY_SUBPROTOCOL])
+        self.scheduler.unregister("s1")
+
+    async def test_inputs_are_applied_at_tick_boundary(self):
+        """ティック間に届いた入力は最新の1件だけがティックの開始時に適用されるかテスト"""
+        self.scheduler.register("s1", self.game, "game_s1", self.games)
+        self.scheduler._task.cancel()
+        input_buffer = InputBuffer()
+        self.scheduler.attach_input("s1", "channel-1", "player1", input_buffer)
+
+        for seq, position in enumerate((10, 20, 30), start=1):
+            input_buffer.push(position, seq)
+        self.assertEqual(self.game.paddles["player1"], 0)
+
+        await self.scheduler.tick(0.016)
+        self.assertEqual(self.game.paddles["player1"], 30)
+        self.assertEqual(input_buffer.last_applied_seq, 3)
+        self.assertEqual(input_buffer.stats["coalesced"], 2)
+        self.scheduler.unregister("s1")
+
+    async def test_finish_runs_once_and_removes_match(self):
+        """試合終了時にコールバックが一度だけ呼ばれ、登録が削除されるかテスト"""
+        self.scheduler.register(
+            "s1", self.game, "game_s1", self.games, on_finish=self.on_finish
+        )
+        self.scheduler._task.cancel()
+        self.game.handle_disconnection("player1")
+
+        log = StringIO()
+        with contextlib.redirect_stdout(log):
+            await self.scheduler.tick(0.016)
+            await self.scheduler.tick(0.016)
+
+        self.assertEqual(self.finished, [self.game])
+        # 終了時にティック統計が出力される
+        self.assertIn("Removed session s1 (ticks 1, late 0, dropped 0)", log.getvalue())
+        self.assertNotIn("s1", self.scheduler.matches)
+        self.assertNotIn("s1", self.games)
+
+    async def test_reaps_match_without_subscribers(self):
+        """購読者がいない試合が一定時間後に終了・保存されるかテスト"""
+        match = self.scheduler.register(
+            "s1", self.game, "game_s1", self.games, on_finish=self.on_finish
+        )
+        self.scheduler._task.cancel()
+        self.scheduler.subscribe("s1", "channel-1")
+        self.scheduler.unsubscribe("s1", "channel-1")
+
+        self.assertEqual(await self.scheduler.reap(match.empty_since + 1), 0)
+        reap_at = match.empty_since + self.scheduler.reap_empty_after
+        self.assertEqual(await self.scheduler.reap(reap_at), 1)
+
+        self.assertEqual(self.finished, [self.game])
+        self.assertFalse(self.game.is_active)
+        self.assertEqual(self.game.abandoned, "empty")
+        self.assertNotIn("s1", self.games)
+        self.assertEqual(self.scheduler.reaped["empty"], 1)
+
+    async def test_reaps_idle_and_failing_matches(self):
+        """入力のない試合と更新に失敗し続ける試合が終了されるかテスト"""
+        idle = self.scheduler.register("s1", self.game, "game_s1", self.games)
+        self.scheduler._task.cancel()
+        self.scheduler.subscribe("s1", "channel-1")
+        broken_game = MultiplayerPongGame("s2", "player3", "player4")
+        broken = self.scheduler.register("s2", broken_game, "game_s2", self.games)
+        self.scheduler._task.cancel()
+        self.scheduler.subscribe("s2", "channel-2")
+        broken_game.update = None  # 呼び出すと TypeError になる
+
+        for _ in range(self.scheduler.reap_max_errors):
+            await self.scheduler.tick(0.016)
+        self.assertEqual(broken.errors, self.scheduler.reap_max_errors)
+
+        await self.scheduler.reap(idle.last_input_at + self.scheduler.reap_idle_after)
+        self.assertEqual(self.scheduler.matches, {})
+        self.assertEqual(self.scheduler.reaped["idle"], 1)
+        self.assertEqual(self.scheduler.reaped["errors"], 1)
+
+    async def test_removes_orphaned_game_entries(self):
+        """スケジューラにない games 辞書のエントリが削除されるかテスト"""
+        self.scheduler.register("s1", self.game, "game_s1", self.games)
+        self.scheduler._task.cancel()
+        self.games["stale"] = MultiplayerPongGame("stale", "player1", "player2")
+
+        await self.scheduler.reap()
+        self.assertEqual(list(self.games), ["s1"])
+        self.assertEqual(self.scheduler.reaped["orphaned"], 1)
+        self.scheduler.unregister("s1")
+
+    async def test_unregister_logs_tick_stats(self):
+        """切断などで外した試合でもティック統計が出力されるかテスト"""
+        self.scheduler.register("s1", self.game, "game_s1", self.games)
+        self.scheduler._task.cancel()
+        await self.scheduler.tick(0.016, steps=3, dropped=1)
+
+        log = StringIO()
+        with contextlib.redirect_stdout(log):
+            self.scheduler.unregister("s1")
+            self.scheduler.unregister("s1")
+        self.assertEqual(
+            log.getvalue(), "Removed session s1 (ticks 3, late 2, dropped 1)\n"
+        )
+
+    async def test_release_task_is_kept_until_done(self):
+        """所有権の解放タスクが完了まで保持され、解放されるかテスト"""
+        registry = LocalPlacementRegistry()
+        with (
+            patch("pong.game_scheduler.get_placement_registry", return_value=registry),
+            patch(
+                "pong.game_scheduler.get_checkpoint_store",
+                return_value=LocalCheckpointStore(),
+            ),
+        ):
+            self.assertIsNone(await self.scheduler.claim("s1"))
+            self.scheduler.register("s1", self.game, "game_s1", self.games)
+            self.scheduler._task.cancel()
+            self.scheduler.unregister("s1")
+
+            (task,) = self.scheduler._background
+            await task
+        self.assertEqual(self.scheduler._background, set())
+        self.assertIsNone(await registry.owner("s1"))
+
+
+class FakeTime:
+    """テスト用の手動で進める時計"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestFixedTimestepClock(SimpleTestCase):
+    """FixedTimestepClockクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.time = FakeTime()
+        self.clock = FixedTimestepClock(
+            step=0.1, max_catch_up_steps=3, time_source=self.time
+        )
+        self.clock.start()
+
+    def test_on_time_step(self):
+        """締め切り通りなら1ステップだけ実行されるかテスト"""
+        self.time.now = 0.1
+        self.assertEqual(self.clock.advance(), 1)
+        self.assertEqual(self.clock.late_steps, 0)
+
+    def test_accumulates_partial_steps(self):
+        """ステップ幅未満の経過時間が持ち越されるかテスト"""
+        self.time.now = 0.06
+        self.assertEqual(self.clock.advance(), 0)
+        self.time.now = 0.12
+        self.assertEqual(self.clock.advance(), 1)
+        self.assertAlmostEqual(self.clock.time_until_next_step(), 0.08)
+
+    def test_catch_up_is_capped(self):
+        """遅延時は追い付き上限までステップを実行し、残りを破棄するかテスト"""
+        self.time.now = 0.55
+        self.assertEqual(self.clock.advance(), 3)
+        self.assertEqual(self.clock.late_steps, 2)
+        self.assertEqual(self.clock.dropped_steps, 2)
+        self.assertEqual(self.clock.last_dropped, 2)
+        # 破棄した時間は持ち越さない
+        self.time.now = 0.65
+        self.assertEqual(self.clock.advance(), 1)
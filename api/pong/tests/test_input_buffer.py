@@ -0,0 +1,70 @@
+from django.test import SimpleTestCase
+
+from pong.input_buffer import InputBuffer
+
+from .test_game_scheduler import FakeTime
+
+
+class TestInputBuffer(SimpleTestCase):
+    """InputBufferクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.time = FakeTime()
+        self.input_buffer = InputBuffer(rate=10, burst=3, time_source=self.time)
+
+    def test_only_latest_position_is_applied(self):
+        """1ティック内の入力は最新の位置だけが適用されるかテスト"""
+        self.input_buffer.push(10, 1)
+        self.input_buffer.push(20, 2)
+
+        self.assertEqual(self.input_buffer.drain(), ("position", 20, None))
+        self.assertIsNone(self.input_buffer.drain())
+        self.assertEqual(self.input_buffer.last_applied_seq, 2)
+        self.assertEqual(self.input_buffer.stats["coalesced"], 1)
+
+    def test_out_of_order_input_is_ignored(self):
+        """古いシーケンス番号の入力を無視するかテスト"""
+        self.input_buffer.push(10, 5)
+        self.assertFalse(self.input_buffer.push(20, 4))
+        self.assertEqual(self.input_buffer.drain(), ("position", 10, None))
+        self.assertEqual(self.input_buffer.stats["stale"], 1)
+
+    def test_direction_replaces_pending_position(self):
+        """方向入力も同じティック内の最新の入力として扱われるかテスト"""
+        self.input_buffer.push(10, 1)
+        self.input_buffer.push_direction(-1, 2, tick=40)
+        self.assertEqual(self.input_buffer.drain(), ("direction", -1, 40))
+        self.assertFalse(self.input_buffer.push_direction("left", 3))
+
+    def test_invalid_position_is_rejected(self):
+        """数値でない位置を拒否するかテスト"""
+        self.assertFalse(self.input_buffer.push("left"))
+        self.assertIsNone(self.input_buffer.drain())
+        self.assertEqual(self.input_buffer.stats["invalid"], 1)
+
+    def test_out_of_range_seq_is_rejected(self):
+        """uint32 に収まらないシーケンス番号を拒否するかテスト"""
+        self.assertFalse(self.input_buffer.push(10, -1))
+        self.assertFalse(self.input_buffer.push_direction(1, 2**32))
+        self.assertIsNone(self.input_buffer.drain())
+        self.assertEqual(self.input_buffer.stats["invalid"], 2)
+
+        self.assertTrue(self.input_buffer.push(10, 2**32 - 1))
+        self.input_buffer.drain()
+        self.assertEqual(self.input_buffer.last_applied_seq, 2**32 - 1)
+
+    def test_rate_limit(self):
+        """上限を超えたメッセージを破棄し、時間経過で回復するかテスト"""
+        admitted = [self.input_buffer.admit("{}") for _ in range(5)]
+        self.assertEqual(admitted, [True, True, True, False, False])
+        self.assertEqual(self.input_buffer.stats["throttled"], 2)
+
+        self.time.now += 0.1
+        self.assertTrue(self.input_buffer.admit("{}"))
+        self.assertFalse(self.input_buffer.admit("{}"))
+
+    def test_oversized_message_is_dropped(self):
+        """大きすぎるメッセージを解析前に破棄するかテスト"""
+        self.assertFalse(self.input_buffer.admit("x" * 1000))
+        self.assertEqual(self.input_buffer.stats["oversized"], 1)
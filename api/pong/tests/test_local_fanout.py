@@ -0,0 +1,77 @@
+from channels.layers import get_channel_layer
+from django.test import SimpleTestCase, override_settings
+
+from pong.local_fanout import LocalFanout
+from pong.worker import WORKER_ID
+
+
+class FakeConsumer:
+    """受信したイベントを記録するだけのコンシューマ"""
+
+    def __init__(self, channel_name):
+        self.channel_name = channel_name
+        self.events = []
+
+    async def game_state(self, event):
+        self.events.append(event)
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class TestLocalFanout(SimpleTestCase):
+    """LocalFanoutクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.fanout = LocalFanout()
+        self.player1 = FakeConsumer("channel-1")
+        self.player2 = FakeConsumer("channel-2")
+        self.fanout.expect("game_s1", 2)
+
+    async def test_all_members_local_skips_channel_layer(self):
+        """全員が同一プロセスならチャンネルレイヤーを使わないかテスト"""
+        self.fanout.join("game_s1", self.player1)
+        self.fanout.join("game_s1", self.player2)
+
+        await self.fanout.group_send("game_s1", {"type": "game_state", "n": 1})
+
+        self.assertEqual(len(self.player1.events), 1)
+        self.assertEqual(len(self.player2.events), 1)
+        self.assertEqual(self.fanout.stats["local_deliveries"], 2)
+        self.assertEqual(self.fanout.stats["remote_sends"], 0)
+        self.assertEqual(self.fanout.stats["remote_skipped"], 1)
+
+    async def test_remote_member_falls_back_to_channel_layer(self):
+        """プロセス外のメンバーがいればチャンネルレイヤーにも送信するかテスト"""
+        channel_layer = get_channel_layer()
+        remote_channel = await channel_layer.new_channel()
+        await channel_layer.group_add("game_s1", remote_channel)
+        self.fanout.join("game_s1", self.player1)
+
+        await self.fanout.group_send("game_s1", {"type": "game_state", "n": 1})
+
+        event = await channel_layer.receive(remote_channel)
+        self.assertEqual(event["origin"], WORKER_ID)
+        self.assertEqual(len(self.player1.events), 1)
+        self.assertEqual(self.fanout.stats["remote_sends"], 1)
+
+    def test_local_echo_is_detected(self):
+        """ローカル配信済みのメンバーに届いた自プロセス発のイベントを判定するかテスト"""
+        self.fanout.join("game_s1", self.player1)
+        event = {"type": "game_state", "origin": WORKER_ID}
+
+        self.assertTrue(self.fanout.is_local_echo("game_s1", self.player1, event))
+        self.assertFalse(self.fanout.is_local_echo("game_s1", self.player2, event))
+        self.assertFalse(
+            self.fanout.is_local_echo(
+                "game_s1", self.player1, {"type": "game_state", "origin": "other"}
+            )
+        )
+
+    def test_leave_removes_empty_group(self):
+        """最後のメンバーが離脱するとグループが削除されるかテスト"""
+        self.fanout.join("game_s1", self.player1)
+        self.fanout.leave("game_s1", self.player1)
+        self.assertNotIn("game_s1", self.fanout.groups)
+        self.assertTrue(self.fanout.has_remote_members("game_s1"))
@@ -0,0 +1,194 @@
+import time
+from io import StringIO
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from pong import routing
+from pong.consumers import MatchmakingConsumer
+from pong.matchmaking import (
+    LocalMatchmakingQueue,
+    Matchmaker,
+    find_level_pairs,
+    make_ticket,
+)
+from pong.reservation import LocalReservationStore
+
+
+class TestLocalMatchmakingQueue(SimpleTestCase):
+    """LocalMatchmakingQueueクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.queue = LocalMatchmakingQueue()
+
+    async def test_claim_pairs_only_waiting_players(self):
+        """まだ待機中のプレイヤー同士のペアだけが確定されるかテスト"""
+        for name in ("alice", "bob", "carol"):
+            await self.queue.enqueue(make_ticket(name, f"ch-{name}"))
+        await self.queue.cancel("carol", "ch-carol")
+
+        claimed = await self.queue.claim_pairs([("alice", "bob"), ("carol", "bob")])
+        self.assertEqual(
+            [(first["username"], second["username"]) for first, second in claimed],
+            [("alice", "bob")],
+        )
+        self.assertEqual(await self.queue.size(), 0)
+
+    async def test_rejoin_keeps_wait_time_and_updates_channel(self):
+        """参加し直しても重複せず、古い接続の切断では取り消されないかテスト"""
+        await self.queue.enqueue({**make_ticket("alice", "ch-old"), "enqueued_at": 1.0})
+        self.assertFalse(await self.queue.enqueue(make_ticket("alice", "ch-new")))
+        self.assertFalse(await self.queue.cancel("alice", "ch-old"))
+
+        (ticket,) = await self.queue.snapshot()
+        self.assertEqual(ticket["channel_name"], "ch-new")
+        self.assertEqual(ticket["enqueued_at"], 1.0)
+
+
+class TestFindLevelPairs(SimpleTestCase):
+    """レベルに基づく組み合わせのテスト"""
+
+    def _pairs(self, levels, waits, **kwargs):
+        pairs = find_level_pairs(
+            np.array(levels, dtype=float),
+            np.array(waits, dtype=float),
+            kwargs.pop("base_gap", 1),
+            kwargs.pop("gap_per_second", 0.5),
+            **kwargs,
+        )
+        return sorted(tuple(sorted(pair)) for pair in pairs)
+
+    def test_pairs_closest_levels(self):
+        """レベルの近いプレイヤー同士が組み合わされるかテスト"""
+        pairs = self._pairs([10, 1, 11, 2], [0, 0, 0, 0])
+        self.assertEqual(pairs, [(0, 2), (1, 3)])
+
+    def test_window_widens_with_wait_time(self):
+        """待ち時間に応じて許容するレベル差が広がるかテスト"""
+        self.assertEqual(self._pairs([1, 5], [0, 0]), [])
+        self.assertEqual(self._pairs([1, 5], [6, 0]), [(0, 1)])
+        self.assertEqual(self._pairs([1, 5], [60, 0], max_gap=3), [])
+
+    def test_equal_levels_prefer_longest_waiting(self):
+        """同じレベルでは待ち時間の長いプレイヤーが優先されるかテスト"""
+        self.assertEqual(self._pairs([3, 3, 3], [1, 5, 9]), [(1, 2)])
+
+    def test_large_queue(self):
+        """大量の待機者でも全員が重複なく組み合わされるかテスト"""
+        rng = np.random.default_rng(0)
+        levels = rng.integers(1, 30, 5000).astype(float)
+        pairs = find_level_pairs(levels, np.zeros(5000), 1, 0.5)
+        players = [index for pair in pairs for index in pair]
+        self.assertEqual(len(players), len(set(players)))
+        self.assertGreaterEqual(len(pairs), 2450)
+        self.assertTrue(all(abs(levels[i] - levels[j]) <= 1 for i, j in pairs))
+
+
+class TestMatchmaker(SimpleTestCase):
+    """Matchmakerクラスのテスト"""
+
+    async def test_run_pass_records_wait_times(self):
+        """マッチした組が待機列から外れ、待ち時間が記録されるかテスト"""
+        queue = LocalMatchmakingQueue()
+        now = time.time()
+        for name, level, waited in (("a", 1, 4), ("b", 2, 2), ("c", 20, 0)):
+            ticket = make_ticket(name, f"ch-{name}", level=level)
+            await queue.enqueue({**ticket, "enqueued_at": now - waited})
+
+        matchmaker = Matchmaker()
+        with patch("pong.matchmaking.get_matchmaking_queue", return_value=queue):
+            pairs = await matchmaker.run_pass(now)
+
+        self.assertEqual(
+            [(first["username"], second["username"]) for first, second in pairs],
+            [("a", "b")],
+        )
+        self.assertEqual(await queue.size(), 1)
+        self.assertEqual(matchmaker.stats["matched"], 1)
+        self.assertAlmostEqual(matchmaker.wait_percentiles()["p50"], 3)
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class TestMatchmakingConsumer(SimpleTestCase):
+    """MatchmakingConsumerのテスト"""
+
+    async def _join(self, application, username):
+        communicator = WebsocketCommunicator(application, "wss/matchmaking/")
+        await communicator.connect()
+        await communicator.send_json_to(
+            {"type": "join_matchmaking", "username": username}
+        )
+        self.assertEqual((await communicator.receive_json_from())["type"], "waiting")
+        return communicator
+
+    async def test_players_are_matched_by_level(self):
+        """レベルの近いプレイヤー同士がマッチし、両者に match_found が届くかテスト"""
+        queue = LocalMatchmakingQueue()
+        store = LocalReservationStore()
+        levels = {"alice": 1, "bob": 30, "carol": 2}
+        application = URLRouter(routing.websocket_urlpatterns)
+        with (
+            patch("pong.consumers.get_matchmaking_queue", return_value=queue),
+            patch("pong.matchmaking.get_matchmaking_queue", return_value=queue),
+            patch("pong.consumers.get_reservation_store", return_value=store),
+            patch("pong.matchmaking.get_reservation_store", return_value=store),
+            patch(
+                "pong.consumers.get_matchmaker",
+                return_value=Matchmaker(interval=0.01, gap_per_second=0),
+            ),
+            patch.object(
+                MatchmakingConsumer,
+                "get_level",
+                AsyncMock(side_effect=lambda username: levels[username]),
+            ),
+        ):
+            alice = await self._join(application, "alice")
+            bob = await self._join(application, "bob")
+            carol = await self._join(application, "carol")
+
+            messages = [
+                await alice.receive_json_from(),
+                await carol.receive_json_from(),
+            ]
+            for message in messages:
+                self.assertEqual(message["type"], "match_found")
+                self.assertEqual(
+                    {message["player1"], message["player2"]}, {"alice", "carol"}
+                )
+            self.assertEqual(messages[0]["session_id"], messages[1]["session_id"])
+            self.assertTrue(await bob.receive_nothing(0.05))
+
+            await bob.disconnect()
+            self.assertEqual(await queue.size(), 0)
+
+            await alice.disconnect()
+            await carol.disconnect()
+
+
+class TestBenchMatchmakingCommand(SimpleTestCase):
+    """bench_matchmaking コマンドのテスト"""
+
+    def test_reports_matches(self):
+        """合成したプレイヤーがマッチし、集計が出力されるかテスト"""
+        out = StringIO()
+        call_command(
+            "bench_matchmaking",
+            players=40,
+            rate=2000,
+            disconnect=0,
+            timeout=2,
+            interval=0.01,
+            gap_per_second=10,
+            stdout=out,
+        )
+        output = out.getvalue()
+        self.assertIn("players 40, matched 40", output)
+        self.assertIn("matches/s", output)
+        self.assertIn("level gap", output)
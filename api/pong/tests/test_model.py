@@ -187,8 +187,9 @@ class TournamentModelTests(TestCase):
     def test_tournament_participant_add_remove(self):
         """トーナメント参加者の追加と削除のテスト"""
         # 新しいトーナメントを毎回作成して問題を回避
+        # （募集中のトーナメントは1つだけなので setUp のものとは別の状態にする）
         unique_tournament = TournamentSession.objects.create(
-            status="WAITING_PLAYERS", max_players=4
+            status="IN_PROGRESS", max_players=4
         )
 
         # 参加者を追加
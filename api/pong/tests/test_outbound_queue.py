@@ -0,0 +1,113 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from pong.outbound_queue import (
+    OVERFLOW_CLOSE_CODE,
+    SEND_ERROR_CLOSE_CODE,
+    OutboundQueue,
+    websocket_message,
+)
+
+
+class SlowClient:
+    """release() されるまで送信が完了しないクライアント"""
+
+    def __init__(self):
+        self.sent = []
+        self.released = asyncio.Event()
+
+    async def send(self, message):
+        await self.released.wait()
+        self.sent.append(message)
+
+    def release(self):
+        self.released.set()
+
+
+class TestOutboundQueue(SimpleTestCase):
+    """OutboundQueueクラスのテスト"""
+
+    async def _drain(self, queue):
+        while queue.depth:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+    async def test_put_does_not_wait_for_slow_client(self):
+        """遅いクライアントへの送信を待たずに追加できるかテスト"""
+        client = SlowClient()
+        queue = OutboundQueue(client.send)
+        for n in range(100):
+            queue.put_state(websocket_message(text_data=f"state {n}"))
+        self.assertLessEqual(queue.depth, 1)
+        queue.stop()
+
+    async def test_state_frames_are_coalesced(self):
+        """未送信の状態フレームは最新の1件に集約されるかテスト"""
+        client = SlowClient()
+        queue = OutboundQueue(client.send)
+        queue.put_state(websocket_message(text_data="state 0"))
+        await asyncio.sleep(0)  # state 0 の送信中
+        for n in range(1, 5):
+            queue.put_state(websocket_message(text_data=f"state {n}"))
+        client.release()
+        await self._drain(queue)
+
+        self.assertEqual([m["text"] for m in client.sent], ["state 0", "state 4"])
+        self.assertEqual(queue.stats["coalesced"], 3)
+        queue.stop()
+
+    async def test_control_messages_are_never_dropped(self):
+        """制御メッセージは破棄されず、状態フレームより先に順番通り送られるかテスト"""
+        client = SlowClient()
+        queue = OutboundQueue(client.send)
+        queue.put_state(websocket_message(text_data="state"))
+        queue.put_control(websocket_message(text_data="match_found"))
+        queue.put_control(websocket_message(text_data="final_ready"))
+        queue.put_state(websocket_message(text_data="newer state"))
+        client.release()
+        await self._drain(queue)
+
+        self.assertEqual(
+            [m["text"] for m in client.sent],
+            ["match_found", "final_ready", "newer state"],
+        )
+        self.assertEqual(queue.stats["max_depth"], 3)
+        queue.stop()
+
+    async def test_overflow_closes_connection(self):
+        """制御メッセージが上限を超えた接続は切断されるかテスト"""
+        client = SlowClient()
+        queue = OutboundQueue(client.send, max_control=3)
+        for n in range(5):
+            queue.put_control(websocket_message(text_data=f"control {n}"))
+        client.release()
+        await self._drain(queue)
+
+        self.assertTrue(queue.overflowed)
+        self.assertEqual(
+            client.sent[-1], {"type": "websocket.close", "code": OVERFLOW_CLOSE_CODE}
+        )
+        queue.stop()
+
+    async def test_send_error_closes_connection(self):
+        """送信に失敗した接続は切断され、以降のメッセージを受け付けないかテスト"""
+        sent = []
+
+        async def send(message):
+            if message.get("text") == "broken":
+                raise RuntimeError("send failed")
+            sent.append(message)
+
+        queue = OutboundQueue(send)
+        queue.put_control(websocket_message(text_data="broken"))
+        queue.put_state(websocket_message(text_data="state"))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        self.assertTrue(queue.closed)
+        self.assertEqual(
+            sent, [{"type": "websocket.close", "code": SEND_ERROR_CLOSE_CODE}]
+        )
+        queue.put_state(websocket_message(text_data="state"))
+        self.assertEqual(queue.depth, 0)
@@ -0,0 +1,137 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+
+from pong import routing
+from pong.game_scheduler import GameScheduler
+from pong.placement import LocalPlacementRegistry
+from pong.reservation import LocalReservationStore
+from pong.worker import WORKER_ID
+
+
+class TestLocalPlacementRegistry(SimpleTestCase):
+    """LocalPlacementRegistryクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.registry = LocalPlacementRegistry()
+
+    async def test_first_claim_wins(self):
+        """最初に取得したワーカーが所有者になるかテスト"""
+        self.assertEqual(await self.registry.claim("s1", "worker-a", 30), "worker-a")
+        self.assertEqual(await self.registry.claim("s1", "worker-b", 30), "worker-a")
+        self.assertEqual(await self.registry.owner("s1"), "worker-a")
+
+    async def test_renew_and_release_require_ownership(self):
+        """延長と解放は所有者だけが行えるかテスト"""
+        await self.registry.claim("s1", "worker-a", 30)
+
+        self.assertFalse(await self.registry.renew("s1", "worker-b", 30))
+        await self.registry.release("s1", "worker-b")
+        self.assertEqual(await self.registry.owner("s1"), "worker-a")
+
+        self.assertTrue(await self.registry.renew("s1", "worker-a", 30))
+        await self.registry.release("s1", "worker-a")
+        self.assertIsNone(await self.registry.owner("s1"))
+
+    async def test_expired_lease_can_be_claimed(self):
+        """リースが切れたセッションは別のワーカーが取得できるかテスト"""
+        await self.registry.claim("s1", "worker-a", 0)
+        self.assertEqual(await self.registry.claim("s1", "worker-b", 30), "worker-b")
+
+    async def test_worker_url(self):
+        """ワーカーの接続先URLを登録・取得できるかテスト"""
+        await self.registry.register_worker("worker-a", "wss://api-a:8001", 30)
+        self.assertEqual(await self.registry.worker_url("worker-a"), "wss://api-a:8001")
+        self.assertIsNone(await self.registry.worker_url("worker-b"))
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class TestSessionAffinity(SimpleTestCase):
+    """セッションの所有ワーカーへの誘導のテスト"""
+
+    async def test_connection_to_non_owner_is_redirected(self):
+        """他のワーカーが所有するセッションへの接続は誘導されるかテスト"""
+        registry = LocalPlacementRegistry()
+        await registry.claim("game_alice_bob_1", "worker-b", 30)
+        await registry.register_worker("worker-b", "wss://api-b:8001", 30)
+
+        application = URLRouter(routing.websocket_urlpatterns)
+        communicator = WebsocketCommunicator(
+            application, "wss/game/game_alice_bob_1/alice/"
+        )
+        with (
+            patch("pong.game_scheduler.get_placement_registry", return_value=registry),
+            patch("pong.base_consumers.get_placement_registry", return_value=registry),
+        ):
+            connected, _ = await communicator.connect()
+            message = await communicator.receive_json_from()
+            output = await communicator.receive_output()
+
+        self.assertTrue(connected)
+        self.assertEqual(message["type"], "redirect")
+        self.assertEqual(message["worker"], "worker-b")
+        self.assertEqual(message["url"], "wss://api-b:8001")
+        self.assertEqual(output, {"type": "websocket.close", "code": 4001})
+        self.assertNotEqual(await registry.owner("game_alice_bob_1"), WORKER_ID)
+        await communicator.disconnect()
+
+    async def test_claimed_session_keeps_lease_while_waiting(self):
+        """試合の登録前でも所有したセッションの生存確認とリースが延長されるかテスト"""
+        registry = LocalPlacementRegistry()
+        scheduler = GameScheduler()
+        scheduler.placement_ttl = scheduler.heartbeat_ttl = 0.06
+        with patch("pong.game_scheduler.get_placement_registry", return_value=registry):
+            self.assertIsNone(await scheduler.claim("s1"))
+            await asyncio.sleep(0.2)
+            self.assertTrue(await registry.worker_alive(WORKER_ID))
+            self.assertEqual(await registry.owner("s1"), WORKER_ID)
+
+            scheduler.unregister("s1")
+            await asyncio.sleep(0.05)
+        self.assertTrue(scheduler._task.done())
+        self.assertIsNone(await registry.owner("s1"))
+
+    async def test_match_ready_redirects_after_takeover(self):
+        """参加待ちの間に所有権が移ったら、match_ready で試合を作らず誘導するかテスト"""
+        session_id = "game_alice_bob_2"
+        registry = LocalPlacementRegistry()
+        application = URLRouter(routing.websocket_urlpatterns)
+        communicator = WebsocketCommunicator(
+            application, f"wss/game/{session_id}/alice/"
+        )
+        with (
+            patch("pong.game_scheduler.get_placement_registry", return_value=registry),
+            patch("pong.base_consumers.get_placement_registry", return_value=registry),
+            patch(
+                "pong.consumers.get_reservation_store",
+                return_value=LocalReservationStore(),
+            ),
+            patch("pong.consumers.get_matchmaker", return_value=MagicMock()),
+        ):
+            await communicator.connect()
+            self.assertEqual(
+                (await communicator.receive_json_from())["type"], "waiting"
+            )
+
+            # 他のワーカーがセッションを引き継いで試合を開始した
+            await registry.takeover(session_id, WORKER_ID, "worker-b", 30)
+            await registry.register_worker("worker-b", "wss://api-b:8001", 30)
+            await get_channel_layer().group_send(
+                f"game_{session_id}", {"type": "match_ready", "origin": "worker-b"}
+            )
+
+            message = await communicator.receive_json_from()
+            output = await communicator.receive_output()
+            await communicator.disconnect()
+
+        self.assertEqual((message["type"], message["worker"]), ("redirect", "worker-b"))
+        self.assertEqual(output, {"type": "websocket.close", "code": 4001})
+        self.assertIsNone(routing.consumers.GameConsumer.scheduler.get(session_id))
+        self.assertEqual(await registry.owner(session_id), "worker-b")
@@ -0,0 +1,28 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from pong import redis_client
+from pong.redis_client import get_redis
+
+
+class TestRedisClient(SimpleTestCase):
+    """イベントループごとの Redis クライアントのテスト"""
+
+    def test_client_of_closed_loop_is_evicted(self):
+        """閉じたイベントループのクライアントが破棄されるかテスト"""
+
+        async def client():
+            return get_redis()
+
+        loop = asyncio.new_event_loop()
+        first = loop.run_until_complete(client())
+        self.assertIs(loop.run_until_complete(client()), first)
+        loop.close()
+
+        other = asyncio.new_event_loop()
+        try:
+            self.assertIsNot(other.run_until_complete(client()), first)
+            self.assertNotIn(loop, redis_client._clients)
+        finally:
+            other.close()
@@ -0,0 +1,173 @@
+import time
+from unittest.mock import patch
+
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from pong import routing
+from pong.checkpoint import LocalCheckpointStore
+from pong.matchmaking import LocalMatchmakingQueue, Matchmaker, make_ticket
+from pong.placement import LocalPlacementRegistry
+from pong.reservation import EXPIRED, PENDING, READY, LocalReservationStore
+
+PLAYERS = ("alice", "bob")
+
+
+class TestLocalReservationStore(SimpleTestCase):
+    """LocalReservationStoreクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.store = LocalReservationStore()
+        self.tickets = [make_ticket(name, f"mm-{name}") for name in PLAYERS]
+
+    async def test_ready_when_all_players_accept(self):
+        """両プレイヤーが参加すると READY になり、以降の再接続も READY になるかテスト"""
+        await self.store.reserve("s1", self.tickets, timeout=10)
+        self.assertEqual(
+            await self.store.accept("s1", PLAYERS, "alice", "g-a", 10), PENDING
+        )
+        self.assertEqual(
+            await self.store.accept("s1", PLAYERS, "bob", "g-b", 10), READY
+        )
+        self.assertEqual(
+            await self.store.accept("s1", PLAYERS, "alice", "g-a2", 10), READY
+        )
+        self.assertEqual(await self.store.pending_count(), 0)
+        self.assertEqual(await self.store.expire_due(time.time() + 60), [])
+
+    async def test_expired_reservation_rejects_late_player(self):
+        """期限切れの予約には参加できず、参加済みのプレイヤーが記録されているかテスト"""
+        await self.store.reserve("s1", self.tickets, timeout=10)
+        await self.store.accept("s1", PLAYERS, "alice", "g-a", 10)
+
+        (expired,) = await self.store.expire_due(time.time() + 11)
+        self.assertEqual(expired["accepted"], {"alice": "g-a"})
+        self.assertEqual(
+            await self.store.accept("s1", PLAYERS, "bob", "g-b", 10), EXPIRED
+        )
+
+    async def test_withdraw_and_implicit_reservation(self):
+        """予約のない接続は期限付きの予約になり、切断で参加が取り消されるかテスト"""
+        self.assertEqual(
+            await self.store.accept("s2", PLAYERS, "alice", "g-a", 5), PENDING
+        )
+        await self.store.withdraw("s2", "alice", "g-a")
+
+        (expired,) = await self.store.expire_due(time.time() + 6)
+        self.assertEqual(expired["accepted"], {})
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    PONG_PLACEMENT_BACKEND="local",
+)
+class TestReservationExpiry(TransactionTestCase):
+    """参加期限切れの処理のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.queue = LocalMatchmakingQueue()
+        self.store = LocalReservationStore()
+        # セッションの所有権とチェックポイントもプロセス内で完結させる
+        placement = LocalPlacementRegistry()
+        self.patches = [
+            patch("pong.matchmaking.get_matchmaking_queue", return_value=self.queue),
+            patch("pong.consumers.get_matchmaking_queue", return_value=self.queue),
+            patch("pong.matchmaking.get_reservation_store", return_value=self.store),
+            patch("pong.consumers.get_reservation_store", return_value=self.store),
+            patch("pong.game_scheduler.get_placement_registry", return_value=placement),
+            patch("pong.base_consumers.get_placement_registry", return_value=placement),
+            patch(
+                "pong.game_scheduler.get_checkpoint_store",
+                return_value=LocalCheckpointStore(),
+            ),
+        ]
+        for patcher in self.patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_responsive_player_is_requeued(self):
+        """参加済みのプレイヤーだけが元の待ち時間で待機列に戻るかテスト"""
+        channel_layer = get_channel_layer()
+        channels = {name: await channel_layer.new_channel() for name in ("mm", "game")}
+        tickets = [
+            {**make_ticket("alice", "mm-alice", level=3), "enqueued_at": 100.0},
+            make_ticket("bob", channels["mm"]),
+        ]
+        matchmaker = Matchmaker(accept_timeout=0)
+        await self.store.reserve("s1", tickets, timeout=0)
+        await self.store.accept("s1", PLAYERS, "alice", channels["game"], 0)
+
+        self.assertEqual(await matchmaker.expire_reservations(), 1)
+
+        (ticket,) = await self.queue.snapshot()
+        self.assertEqual(ticket["username"], "alice")
+        self.assertEqual(ticket["channel_name"], channels["game"])
+        self.assertEqual((ticket["level"], ticket["enqueued_at"]), (3, 100.0))
+        alice = (await channel_layer.receive(channels["game"]))["match"]
+        bob = (await channel_layer.receive(channels["mm"]))["match"]
+        self.assertEqual(
+            (alice["reason"], alice["requeued"]), ("opponent_timeout", True)
+        )
+        self.assertEqual((bob["reason"], bob["requeued"]), ("accept_timeout", False))
+
+    async def test_implicit_reservations_expire_in_one_batch(self):
+        """マッチメイキングを経ない予約も含め、期限切れの予約が全て処理されるかテスト"""
+        channel_layer = get_channel_layer()
+        games = {name: await channel_layer.new_channel() for name in ("s1", "s2")}
+        matchmaker = Matchmaker(accept_timeout=0)
+        # 接続先のないチケットだけを持つ予約（ゲームへの直接接続で作成）
+        await self.store.accept("s1", PLAYERS, "alice", games["s1"], 0)
+        await self.store.accept("s2", ("carol", "dave"), "carol", games["s2"], 0)
+
+        self.assertEqual(await matchmaker.expire_reservations(time.time() + 1), 2)
+
+        requeued = {
+            ticket["username"]: ticket for ticket in await self.queue.snapshot()
+        }
+        self.assertEqual(set(requeued), {"alice", "carol"})
+        self.assertEqual(requeued["alice"]["channel_name"], games["s1"])
+        for name in ("s1", "s2"):
+            message = (await channel_layer.receive(games[name]))["match"]
+            self.assertEqual((message["session_id"], message["requeued"]), (name, True))
+
+    async def test_game_waits_for_opponent_until_deadline(self):
+        """相手が来なければ試合は作成されず、期限切れで待機列に戻るかテスト"""
+        channel_layer = get_channel_layer()
+        bob_channel = await channel_layer.new_channel()
+        await self.store.reserve(
+            "game_alice_bob_1",
+            [make_ticket("alice", "mm-alice"), make_ticket("bob", bob_channel)],
+            timeout=0.05,
+        )
+        application = URLRouter(routing.websocket_urlpatterns)
+        communicator = WebsocketCommunicator(
+            application, "wss/game/game_alice_bob_1/alice/"
+        )
+        with patch(
+            "pong.consumers.get_matchmaker",
+            return_value=Matchmaker(interval=0.01, accept_timeout=0.05),
+        ):
+            await communicator.connect()
+            waiting = await communicator.receive_json_from()
+            cancelled = await communicator.receive_json_from(timeout=2)
+
+        self.assertEqual(waiting["type"], "waiting")
+        self.assertEqual(cancelled["type"], "match_cancelled")
+        self.assertEqual(
+            (cancelled["reason"], cancelled["requeued"]), ("opponent_timeout", True)
+        )
+        # 接続しなかった相手にもマッチメイキングの接続に取り消しが届く
+        bob = (await channel_layer.receive(bob_channel))["match"]
+        self.assertEqual((bob["reason"], bob["requeued"]), ("accept_timeout", False))
+        self.assertIsNone(
+            routing.consumers.GameConsumer.scheduler.get("game_alice_bob_1")
+        )
+        (ticket,) = await self.queue.snapshot()
+        self.assertEqual(ticket["username"], "alice")
+
+        await communicator.disconnect()
+        self.assertEqual(await self.queue.size(), 0)
@@ -0,0 +1,86 @@
+from django.test import SimpleTestCase, override_settings
+
+from pong.game_logic import MultiplayerPongGame, Vector3D
+from pong.game_scheduler import GameScheduler
+from pong.input_buffer import InputBuffer
+
+DELTA_TIME = 1 / 60
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class TestRewindBuffer(SimpleTestCase):
+    """遅れて届いた入力の巻き戻し適用のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.scheduler = GameScheduler()
+        self.game = MultiplayerPongGame("s1", "player1", "player2")
+        self.input_buffer = InputBuffer()
+
+    async def _start(self):
+        self.match = self.scheduler.register("s1", self.game, "game_s1", {})
+        self.scheduler._task.cancel()
+        self.scheduler.attach_input("s1", "channel-1", "player1", self.input_buffer)
+
+    async def _run_ticks(self, count):
+        for _ in range(count):
+            await self.scheduler.tick(DELTA_TIME)
+
+    async def test_late_input_is_applied_at_issued_tick(self):
+        """遅れて届いた入力が発行時点のティックから適用されたのと同じ状態になるかテスト"""
+        await self._start()
+        await self._run_ticks(10)
+        self.input_buffer.push_direction(1, seq=1, tick=5)
+        await self._run_ticks(1)
+
+        reference = MultiplayerPongGame("s1", "player1", "player2")
+        for tick in range(11):
+            if tick == 5:
+                reference.set_paddle_direction("player1", 1)
+            reference.update(DELTA_TIME)
+
+        self.assertEqual(self.game.tick, 11)
+        self.assertAlmostEqual(
+            self.game.paddles["player1"], reference.paddles["player1"]
+        )
+        self.assertAlmostEqual(self.game.ball.z, reference.ball.z)
+        self.assertEqual(self.match.rewind.stats["rewound"], 1)
+        self.assertEqual(self.match.rewind.stats["resimulated_steps"], 5)
+        self.scheduler.unregister("s1")
+
+    async def test_input_older_than_history_is_applied_now(self):
+        """履歴より古い入力は現在のティックで適用されるかテスト"""
+        await self._start()
+        await self._run_ticks(20)
+        self.input_buffer.push_direction(1, seq=1, tick=2)
+        await self._run_ticks(1)
+
+        self.assertAlmostEqual(
+            self.game.paddles["player1"], self.game.PADDLE_SPEED * DELTA_TIME
+        )
+        self.assertEqual(self.match.rewind.stats["too_late"], 1)
+        self.assertEqual(self.match.rewind.stats["rewound"], 0)
+        self.scheduler.unregister("s1")
+
+    async def test_late_position_input_cannot_undo_goal(self):
+        """過去のティックを指定した位置入力で、既に決まった失点を防げないかテスト"""
+        await self._start()
+        # player1 のパドルから離れた位置をボールが player1 側のゴールへ向かう
+        self.game.paddles["player1"] = -400
+        self.game.ball = Vector3D(400, 30, 1300)
+        self.game.ball_velocity = Vector3D(0, 0, 3000)
+        # ボールはパドルの面を通過したが、まだ得点になっていない
+        await self._run_ticks(4)
+        self.assertEqual(self.game.ball.z, 1500)
+        self.assertEqual(self.game.score["player2"], 0)
+
+        # ボールがパドルの面に届く前のティックを指定してボールの位置へ動かす
+        self.input_buffer.push(400, seq=1, tick=1)
+        await self._run_ticks(1)
+
+        self.assertEqual(self.game.score["player2"], 1)
+        self.assertEqual(self.game.paddles["player1"], 400)
+        self.assertEqual(self.match.rewind.stats["rewound"], 0)
+        self.scheduler.unregister("s1")
@@ -0,0 +1,97 @@
+from channels.layers import get_channel_layer
+from django.test import SimpleTestCase, override_settings
+
+from pong.game_logic import MultiplayerPongGame
+from pong.game_scheduler import GameScheduler
+from pong.send_rate import SendRateController
+
+
+class TestSendRateController(SimpleTestCase):
+    """SendRateControllerクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.controller = SendRateController(
+            tick_rate=60, send_rate=30, min_send_rate=15, max_lag=0.25
+        )
+
+    def test_sends_every_interval(self):
+        """送信レートに応じてティックを間引くかテスト"""
+        sent = [tick for tick in range(1, 9) if self.controller.should_send(tick)]
+        self.assertEqual(sent, [1, 3, 5, 7])
+        self.assertEqual(self.controller.stats["skipped"], 4)
+
+    def test_final_state_is_always_sent(self):
+        """試合終了時の状態は間引かれないかテスト"""
+        self.controller.should_send(1)
+        self.assertTrue(self.controller.should_send(2, final=True))
+
+    def test_downshift_and_recover(self):
+        """確認応答の遅れで送信間隔を広げ、解消したら戻すかテスト"""
+        for tick in range(1, 60):
+            self.controller.should_send(tick)
+        # 送信済みのティック59に対して確認応答が30ティック遅れている
+        self.controller.acknowledge(29)
+        self.assertEqual(self.controller.interval, 4)
+        self.controller.acknowledge(30)
+        self.assertEqual(self.controller.interval, 4)  # 下限（15Hz）
+
+        self.controller.acknowledge(59)
+        self.assertEqual(self.controller.interval, 2)
+        self.assertEqual(self.controller.stats["downshifts"], 1)
+        self.assertEqual(self.controller.stats["upshifts"], 1)
+
+    def test_backlog_downshifts_and_recovers(self):
+        """送信キューで状態フレームが上書きされると間隔を広げ、解消したら戻すかテスト"""
+        self.controller.observe_backlog(10, 0)
+        self.assertEqual(self.controller.interval, 2)
+
+        self.controller.observe_backlog(11, 1)
+        self.assertEqual(self.controller.interval, 4)
+        # max_lag（15ティック）以内の上書きでは続けて広げない
+        self.controller.observe_backlog(12, 2)
+        self.assertEqual(self.controller.interval, 4)
+
+        # 最後の上書きから60ティック経つまでは戻さない
+        self.controller.observe_backlog(71, 2)
+        self.assertEqual(self.controller.interval, 4)
+        self.controller.observe_backlog(72, 2)
+        self.assertEqual(self.controller.interval, 2)
+        self.assertEqual(self.controller.stats["downshifts"], 1)
+        self.assertEqual(self.controller.stats["upshifts"], 1)
+
+    def test_stale_or_invalid_ack_is_ignored(self):
+        """古い・不正な確認応答を無視するかテスト"""
+        self.controller.should_send(10)
+        self.controller.acknowledge(10)
+        self.controller.acknowledge(5)
+        self.controller.acknowledge("x")
+        self.assertEqual(self.controller.last_acked_tick, 10)
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    PONG_SEND_RATE=20,
+)
+class TestBroadcastRate(SimpleTestCase):
+    """シミュレーションと送信レートの分離のテスト"""
+
+    async def test_scheduler_broadcasts_at_send_rate(self):
+        """シミュレーションは毎ティック、送信は送信レートで行うかテスト"""
+        channel_layer = get_channel_layer()
+        channel_name = await channel_layer.new_channel()
+        await channel_layer.group_add("game_s1", channel_name)
+
+        scheduler = GameScheduler(tick_rate=60)
+        game = MultiplayerPongGame("s1", "player1", "player2")
+        scheduler.register("s1", game, "game_s1", {})
+        scheduler._task.cancel()
+        for _ in range(6):
+            await scheduler.tick(1 / 60)
+
+        ticks = []
+        for _ in range(2):
+            ticks.append((await channel_layer.receive(channel_name))["tick"])
+        self.assertEqual(game.tick, 6)
+        self.assertEqual(ticks, [1, 4])
+        scheduler.unregister("s1")
@@ -8,6 +8,7 @@ from pong.serializers import (
     UserSerializer,
     TournamentSessionSerializer,
     TournamentParticipantSerializer,
+    tournament_round_type,
 )
 
 
@@ -207,6 +208,19 @@ class GameSerializerTests(TestCase):
         self.assertEqual(game.tournament.id, tournament.id)
         self.assertEqual(game.tournament_round, 0)
         self.assertEqual(game.game_type, "TOURNAMENT")
+        self.assertTrue(
+            game.session_id.startswith(f"tournament_{tournament.id}_semi1_player1_")
+        )
+
+    def test_tournament_round_type_follows_bracket(self):
+        """8人のブラケットでプレイヤーの位置から round_type が決まるかテスト"""
+        tournament = TournamentSession.objects.create(max_players=8)
+        TournamentParticipant.objects.create(
+            tournament=tournament, user=self.user1, bracket_position=7
+        )
+        self.assertEqual(tournament_round_type(tournament, 0, self.user1), "quarter4")
+        self.assertEqual(tournament_round_type(tournament, 1, self.user1), "semi2")
+        self.assertEqual(tournament_round_type(tournament, 2, self.user1), "final")
 
     def test_game_serializer_ai_game(self):
         """AIゲームのシリアライズが正しく機能するかテスト"""
@@ -0,0 +1,142 @@
+import json
+from unittest.mock import AsyncMock, patch
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+
+from pong.tournament_consumers import TournamentWaitingFinalConsumer
+
+
+def make_snapshot(version, final=False):
+    """4人のトーナメントで alice が（version 2 以降は bob も）勝ち上がった状態"""
+    matches = [
+        {
+            "session_id": "tournament_7_semi1_alice_dave_1",
+            "round": 0,
+            "index": 0,
+            "players": ["alice", "dave"],
+            "status": "COMPLETED",
+            "winner": "alice",
+        },
+        {
+            "session_id": "tournament_7_semi2_bob_carol_1",
+            "round": 0,
+            "index": 1,
+            "players": ["bob", "carol"],
+            "status": "COMPLETED" if version >= 2 else "IN_PROGRESS",
+            "winner": "bob" if version >= 2 else None,
+        },
+    ]
+    if final:
+        matches.append(
+            {
+                "session_id": "tournament_7_final_alice_bob_2",
+                "round": 1,
+                "index": 0,
+                "players": ["alice", "bob"],
+                "status": "WAITING",
+                "winner": None,
+            }
+        )
+    return {
+        "tournament_id": "7",
+        "version": version,
+        "status": "FINAL_READY" if final else "IN_PROGRESS",
+        "rounds": 2,
+        "matches": matches,
+        "names": {name: name.title() for name in ("alice", "bob", "carol", "dave")},
+        "timestamp": 0.0,
+    }
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class TestTournamentWaitingFinalConsumer(SimpleTestCase):
+    """決勝待機の状態配信のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        TournamentWaitingFinalConsumer.snapshots.clear()
+        TournamentWaitingFinalConsumer.connections.clear()
+        patcher = patch.object(
+            TournamentWaitingFinalConsumer,
+            "verify_eligibility",
+            AsyncMock(return_value=True),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _communicator(self, username):
+        communicator = WebsocketCommunicator(
+            TournamentWaitingFinalConsumer.as_asgi(),
+            f"/wss/tournament/waiting_final/7/{username}/",
+        )
+        communicator.scope["url_route"] = {
+            "kwargs": {"tournament_id": "7", "username": username}
+        }
+        return communicator
+
+    async def test_status_requests_served_from_cache(self):
+        """ステータス要求が DB に問い合わせずキャッシュから返されるかテスト"""
+        load = AsyncMock(return_value=make_snapshot(1))
+        with patch.object(TournamentWaitingFinalConsumer, "load_snapshot", load):
+            communicator = self._communicator("alice")
+            await communicator.connect()
+            first = await communicator.receive_json_from()
+            # 自分に関係のない通知（同じ状況）は送られない
+            await get_channel_layer().group_send(
+                "tournament_final_waiting_7",
+                {"type": "tournament_status", "snapshot": make_snapshot(1)},
+            )
+            self.assertTrue(await communicator.receive_nothing())
+            for _ in range(3):
+                await communicator.send_to(json.dumps({"type": "request_status"}))
+                self.assertEqual(await communicator.receive_json_from(), first)
+            await communicator.disconnect()
+
+        self.assertEqual(first["type"], "waiting_status")
+        self.assertEqual(first["completed_semifinals"], 1)
+        self.assertEqual(
+            first["finalists"], [{"username": "alice", "display_name": "Alice"}]
+        )
+        load.assert_awaited_once()
+        self.assertEqual(TournamentWaitingFinalConsumer.snapshots, {})
+
+    async def test_pushed_final_ready(self):
+        """ブラケットの進行通知で決勝戦の準備完了が届き、古い通知は無視されるかテスト"""
+        load = AsyncMock(return_value=make_snapshot(1))
+        with patch.object(TournamentWaitingFinalConsumer, "load_snapshot", load):
+            communicator = self._communicator("alice")
+            await communicator.connect()
+            await communicator.receive_json_from()
+
+            layer = get_channel_layer()
+            await layer.group_send(
+                "tournament_final_waiting_7",
+                {"type": "tournament_status", "snapshot": make_snapshot(2, final=True)},
+            )
+            status = await communicator.receive_json_from()
+            ready = await communicator.receive_json_from()
+
+            await layer.group_send(
+                "tournament_final_waiting_7",
+                {"type": "tournament_status", "snapshot": make_snapshot(1)},
+            )
+            self.assertTrue(await communicator.receive_nothing())
+            self.assertEqual(
+                TournamentWaitingFinalConsumer.snapshots["7"]["version"], 2
+            )
+            await communicator.disconnect()
+
+        self.assertTrue(status["all_semifinals_completed"])
+        self.assertEqual(
+            ready,
+            {
+                "type": "final_ready",
+                "session_id": "tournament_7_final_alice_bob_2",
+                "is_player1": True,
+                "match_type": "final",
+            },
+        )
@@ -0,0 +1,126 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.test import TransactionTestCase, override_settings
+
+from pong.models import Game, TournamentSession, User
+from pong.tournament_consumers import TournamentMatchmakingConsumer
+from pong.tournament_state import get_tournament_states, reset_tournament_states
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    PONG_TOURNAMENT_SIZE=4,
+)
+class TestTournamentAdmission(TransactionTestCase):
+    """トーナメントのロビーへの参加受付のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        reset_tournament_states()
+        for name in ("alice", "bob", "carol", "dave", "erin"):
+            User.objects.create_user(
+                username=name, password="testpass123", display_name=name.title()
+            )
+
+    async def _join(self, username):
+        communicator = WebsocketCommunicator(
+            TournamentMatchmakingConsumer.as_asgi(), "/wss/tournament/"
+        )
+        await communicator.connect()
+        await communicator.send_to(
+            json.dumps({"type": "join_tournament", "username": username})
+        )
+        return communicator
+
+    async def _messages(self, communicator):
+        messages = []
+        while not await communicator.receive_nothing(0.05):
+            messages.append(json.loads(await communicator.receive_from()))
+        return messages
+
+    async def test_full_lobby_starts_once_and_next_joiner_rolls_over(self):
+        """定員に達したロビーが一度だけ開始され、次の参加者は新しいロビーに入るかテスト"""
+        # 参加していない接続には何も届かない
+        observer = WebsocketCommunicator(
+            TournamentMatchmakingConsumer.as_asgi(), "/wss/tournament/"
+        )
+        await observer.connect()
+
+        names = ("alice", "bob", "carol", "dave", "erin")
+        communicators = await asyncio.gather(*(self._join(name) for name in names))
+        await asyncio.sleep(0.2)
+        self.assertTrue(await observer.receive_nothing())
+        await observer.disconnect()
+
+        matches = {}
+        for name, communicator in zip(names, communicators):
+            messages = await self._messages(communicator)
+            matches[name] = [
+                message for message in messages if message["type"] == "tournament_match"
+            ]
+            # 対戦カードは本人にだけ届く
+            for message in matches[name]:
+                self.assertIn(name, message["session_id"])
+            # 次のロビーの参加者には開始したロビーの待機状況は届かない
+            if name == "erin":
+                self.assertEqual(
+                    {message["total_players"] for message in messages}, {1}
+                )
+
+        tournaments = await sync_to_async(list)(
+            TournamentSession.objects.order_by("id").values_list("status", flat=True)
+        )
+        self.assertEqual(tournaments, ["IN_PROGRESS", "WAITING_PLAYERS"])
+        # 開始したトーナメントの4人だけに準決勝が1回ずつ通知される
+        self.assertEqual(
+            sorted(len(received) for received in matches.values()), [0, 1, 1, 1, 1]
+        )
+        self.assertEqual(await sync_to_async(Game.objects.count)(), 2)
+
+        # 開始後に切断しても参加者は残り、ロビーの参加者だけが離脱する
+        for communicator in communicators:
+            await communicator.disconnect()
+        started, lobby = await sync_to_async(list)(
+            TournamentSession.objects.order_by("id")
+        )
+        self.assertEqual(await sync_to_async(started.participants.count)(), 4)
+        self.assertEqual(await sync_to_async(lobby.participants.count)(), 0)
+
+    async def test_duplicate_join_rejected(self):
+        """同じユーザーが二重に参加できないかテスト"""
+        first = await self._join("alice")
+        await self._messages(first)
+        second = await self._join("alice")
+        messages = await self._messages(second)
+        self.assertIn(
+            {"type": "error", "message": "Already joined tournament"}, messages
+        )
+        await second.disconnect()
+        await first.disconnect()
+
+    async def test_rolled_back_start_is_not_cached(self):
+        """開始の書き込みがロールバックされたら、キャッシュにも残らないかテスト"""
+        consumer = TournamentMatchmakingConsumer()
+        users = await sync_to_async(list)(User.objects.order_by("id")[:4])
+        for user in users[:3]:
+            await consumer.admit_participant(user.id)
+
+        seed_tournament = TournamentMatchmakingConsumer.seed_tournament
+
+        def seed_and_fail(self, tournament_id):
+            seed_tournament(self, tournament_id)
+            raise RuntimeError("lock lost")
+
+        with patch.object(
+            TournamentMatchmakingConsumer, "seed_tournament", seed_and_fail
+        ):
+            self.assertIsNone(await consumer.admit_participant(users[3].id))
+
+        lobby = await sync_to_async(TournamentSession.objects.get)()
+        self.assertEqual(lobby.status, "WAITING_PLAYERS")
+        self.assertEqual(await sync_to_async(lobby.participants.count)(), 3)
+        self.assertNotIn(str(lobby.id), get_tournament_states()._states)
@@ -0,0 +1,211 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from pong.models import Game, TournamentParticipant, TournamentSession, User
+from pong.tournament_state import TournamentStateCache, waiting_view
+
+
+class TestTournamentState(TestCase):
+    """メモリ上で進めるトーナメント状態のテスト"""
+
+    def setUp(self):
+        """テスト前の準備（参加者4人のトーナメント）"""
+        self.tournament = TournamentSession.objects.create()
+        self.users = {}
+        for level, name in enumerate(("alice", "bob", "carol", "dave")):
+            user = User.objects.create_user(
+                username=name,
+                password="testpass123",
+                display_name=name.title(),
+                level=10 - level,
+            )
+            self.users[name] = user
+            TournamentParticipant.objects.create(tournament=self.tournament, user=user)
+        self.cache = TournamentStateCache()
+
+    def _start(self, seeds=("alice", "bob", "carol", "dave")):
+        return self.cache.apply(
+            self.tournament.id, lambda state: state.start(list(seeds))
+        )
+
+    def _record(self, session_id, winner):
+        return self.cache.apply(
+            self.tournament.id, lambda state: state.record_result(session_id, winner)
+        )
+
+    def _semis(self, state):
+        return {
+            match["index"]: match["session_id"]
+            for match in state.pending_matches()
+            if match["round"] == 0
+        }
+
+    def test_start_seeds_and_creates_semifinals(self):
+        """シード順に準決勝2試合が作成されるかテスト"""
+        state = self._start()
+        semis = self._semis(state)
+        self.assertEqual(
+            [state.matches[semis[index]]["players"] for index in (0, 1)],
+            [["alice", "dave"], ["bob", "carol"]],
+        )
+        self.assertEqual(
+            Game.objects.filter(tournament=self.tournament, status="WAITING").count(),
+            2,
+        )
+        self.tournament.refresh_from_db()
+        self.assertEqual(
+            (self.tournament.status, self.tournament.version), ("IN_PROGRESS", 1)
+        )
+        self.assertIsNotNone(self.tournament.started_at)
+
+    def test_semifinals_prepare_final_in_one_transaction_each(self):
+        """準決勝の結果ごとに1回の書き込みで決勝戦まで準備されるかテスト"""
+        semis = self._semis(self._start())
+
+        with CaptureQueriesContext(connection) as queries:
+            state = self._record(semis[0], "alice")
+        self.assertFalse(any(q["sql"].startswith("SELECT") for q in queries))
+        self.assertEqual([match["round"] for match in state.pending_matches()], [0])
+
+        state = self._record(semis[1], "carol")
+        (final,) = state.pending_matches()
+        self.assertEqual(final["players"], ["alice", "carol"])
+        self.assertTrue(
+            final["session_id"].startswith(f"tournament_{self.tournament.id}_final_")
+        )
+        self.assertEqual(state.version, 3)
+
+        self.tournament.refresh_from_db()
+        self.assertEqual(self.tournament.status, "FINAL_READY")
+        game = Game.objects.get(session_id=final["session_id"])
+        self.assertEqual((game.status, game.tournament_round), ("WAITING", 1))
+
+        # 同じ結果をもう一度反映してもバージョンは進まない
+        self.assertEqual(self._record(semis[1], "carol").version, 3)
+
+    def test_stale_cache_reloads_and_retries(self):
+        """他のワーカーが先に進めていた場合に読み直してやり直すかテスト"""
+        semis = self._semis(self._start())
+
+        other = TournamentStateCache()
+        other.apply(
+            self.tournament.id, lambda state: state.record_result(semis[0], "alice")
+        )
+        Game.objects.filter(session_id=semis[0]).update(
+            status="COMPLETED", winner=self.users["alice"]
+        )
+
+        state = self._record(semis[1], "bob")
+        self.assertEqual(state.version, 3)
+        (final,) = state.pending_matches()
+        self.assertEqual(final["players"], ["alice", "bob"])
+
+    def test_abandoned_match_advances_higher_seed(self):
+        """勝者なしで終了した試合が ABANDONED で保存され、シード上位が勝ち上がるかテスト"""
+        semis = self._semis(self._start())
+
+        state = self._record(semis[0], None)
+        self.assertEqual(state.version, 2)
+        self.assertEqual(state.matches[semis[0]]["winner"], "alice")
+        self.assertEqual(Game.objects.get(session_id=semis[0]).status, "ABANDONED")
+        self.assertFalse(state.is_contender("dave"))
+
+        # DB から読み込んだ状態でも同じ規則で勝ち上がる
+        reloaded = TournamentStateCache().get(self.tournament.id)
+        self.assertEqual(reloaded.bracket.winners, state.bracket.winners)
+
+        (final,) = self._record(semis[1], "carol").pending_matches()
+        self.assertEqual(final["players"], ["alice", "carol"])
+
+    def test_result_saved_before_reload_still_advances(self):
+        """結果が先に DB に保存されていても、読み込み直した状態で次の試合を作るかテスト"""
+        semis = self._semis(self._start())
+        self._record(semis[0], "alice")
+        # save_game_state が結果を書き込んだ後に、別のワーカーが反映する
+        Game.objects.filter(session_id=semis[0]).update(
+            status="COMPLETED", winner=self.users["alice"]
+        )
+        Game.objects.filter(session_id=semis[1]).update(
+            status="COMPLETED", winner=self.users["bob"]
+        )
+
+        state = TournamentStateCache().apply(
+            self.tournament.id, lambda state: state.record_result(semis[1], "bob")
+        )
+        (final,) = state.pending_matches()
+        self.assertEqual(final["players"], ["alice", "bob"])
+        self.assertEqual(state.status, "FINAL_READY")
+
+    def test_final_completes_and_evicts(self):
+        """決勝の結果でトーナメントが終了し、キャッシュから破棄されるかテスト"""
+        semis = self._semis(self._start())
+        self._record(semis[0], "dave")
+        (final,) = self._record(semis[1], "carol").pending_matches()
+
+        state = self._record(final["session_id"], "carol")
+        self.assertEqual((state.status, state.winner), ("COMPLETED", "carol"))
+        self.assertIsNot(self.cache.get(self.tournament.id), state)
+
+        self.tournament.refresh_from_db()
+        self.assertEqual(self.tournament.winner, self.users["carol"])
+        self.assertIsNotNone(self.tournament.completed_at)
+
+    def test_waiting_view_and_contenders(self):
+        """勝ち上がったプレイヤーの待機状況と敗退の判定をテスト"""
+        semis = self._semis(self._start())
+        state = self._record(semis[0], "alice")
+
+        view = waiting_view(state.waiting_snapshot(), "alice")
+        self.assertEqual(view, {"ready": None, "completed": 1, "advanced": ["alice"]})
+        self.assertTrue(state.is_contender("alice"))
+        self.assertFalse(state.is_contender("dave"))
+
+        state = self._record(semis[1], "bob")
+        ready = waiting_view(state.waiting_snapshot(), "bob")["ready"]
+        self.assertEqual(
+            (ready["player1"], ready["player2"], ready["match_type"]),
+            ("alice", "bob", "final"),
+        )
+
+
+class TestLargeTournament(TestCase):
+    """不戦勝を含む大きなブラケットのテスト"""
+
+    def test_byes_and_constant_work_per_result(self):
+        """不戦勝の上位シードが2回戦から始まり、結果1件ごとの書き込みが一定かテスト"""
+        tournament = TournamentSession.objects.create(max_players=6)
+        names = [f"player{number}" for number in range(6)]
+        for name in names:
+            user = User.objects.create_user(
+                username=name, password="testpass123", display_name=name
+            )
+            TournamentParticipant.objects.create(tournament=tournament, user=user)
+        cache = TournamentStateCache()
+
+        state = cache.apply(tournament.id, lambda state: state.start(names))
+        self.assertEqual(state.bracket.rounds, 3)
+        # 8人枠に6人なので上位2シードは不戦勝
+        self.assertEqual(
+            sorted(state.bracket.winners[key] for key in state.bracket.byes),
+            ["player0", "player1"],
+        )
+        self.assertEqual(len(state.pending_matches()), 2)
+
+        # 上位シードが勝ち続ける（各結果は SELECT なし・書き込みは一定回数）
+        writes = []
+        while state.status != "COMPLETED":
+            match = min(state.pending_matches(), key=lambda match: match["round"])
+            winner = min(match["players"], key=names.index)
+            with CaptureQueriesContext(connection) as queries:
+                state = cache.apply(
+                    tournament.id,
+                    lambda state: state.record_result(match["session_id"], winner),
+                )
+            self.assertFalse(any(q["sql"].startswith("SELECT") for q in queries))
+            writes.append(len(queries))
+
+        self.assertEqual(state.winner, "player0")
+        self.assertEqual(len(writes), 5)
+        self.assertLessEqual(max(writes), 4)
+        self.assertEqual(Game.objects.filter(tournament=tournament).count(), 5)
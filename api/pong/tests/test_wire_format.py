@@ -0,0 +1,149 @@
+import json
+import unittest
+
+from pong.game_logic import MultiplayerPongGame
+from pong.wire_format import (
+    BINARY_SUBPROTOCOL,
+    DELTA_SUBPROTOCOL,
+    STATE_FRAME,
+    DeltaEncoder,
+    decode_state,
+    encode_state,
+    flatten_state,
+    negotiate_subprotocol,
+    session_info_message,
+)
+
+
+class TestWireFormat(unittest.TestCase):
+    """バイナリ状態フレームのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.players = ("player1", "player2")
+        self.game = MultiplayerPongGame("test_session", *self.players)
+        self.game.move_player("player1", 120)
+        self.game.move_player("player2", -80)
+        self.game.score["player2"] = 2
+        self.game.update(0.016)
+        self.game.tick = 1234
+
+    def test_round_trip(self):
+        """エンコードしたフレームを元の値に復元できるかテスト"""
+        state = self.game.get_state()
+        state["last_input"] = {"player1": 17}
+        fields = decode_state(encode_state(state, self.players))
+
+        self.assertEqual(fields["tick"], 1234)
+        self.assertEqual(fields["input_seq1"], 17)
+        self.assertEqual(fields["input_seq2"], 0)
+
+        self.assertAlmostEqual(fields["ball_x"], self.game.ball.x, places=3)
+        self.assertAlmostEqual(fields["ball_z"], self.game.ball.z, places=3)
+        self.assertAlmostEqual(
+            fields["velocity_z"], self.game.ball_velocity.z, places=3
+        )
+        self.assertEqual(fields["paddle1_x"], 120)
+        self.assertEqual(fields["paddle2_x"], -80)
+        self.assertEqual(fields["score1"], 0)
+        self.assertEqual(fields["score2"], 2)
+        self.assertTrue(fields["is_active"])
+
+        # 範囲外のシーケンス番号があってもエンコードは失敗しない
+        state["last_input"] = {"player1": 2**32 + 5, "player2": -1}
+        fields = decode_state(encode_state(state, self.players))
+        self.assertEqual((fields["input_seq1"], fields["input_seq2"]), (5, 2**32 - 1))
+
+    def test_frame_is_smaller_than_json(self):
+        """バイナリフレームがJSON形式より十分小さいかテスト"""
+        state = self.game.get_state()
+        frame = encode_state(state, self.players)
+        json_frame = json.dumps({"type": "state_update", "state": state})
+
+        self.assertEqual(len(frame), STATE_FRAME.size)
+        self.assertLessEqual(len(frame), 64)
+        self.assertLess(len(frame) * 4, len(json_frame))
+
+    def test_negotiate_subprotocol(self):
+        """バイナリ形式を要求した場合のみサブプロトコルが選択されるかテスト"""
+        self.assertEqual(
+            negotiate_subprotocol(["foo", BINARY_SUBPROTOCOL]), BINARY_SUBPROTOCOL
+        )
+        self.assertEqual(negotiate_subprotocol([DELTA_SUBPROTOCOL]), DELTA_SUBPROTOCOL)
+        self.assertIsNone(negotiate_subprotocol([]))
+        self.assertIsNone(negotiate_subprotocol(["foo"]))
+
+    def test_session_info_lists_players_in_frame_order(self):
+        """プレイヤー番号表がフレーム内の順序で送られるかテスト"""
+        message = session_info_message(self.players)
+        self.assertEqual(message["players"], ["player1", "player2"])
+        self.assertIn("paddle1_x", message["fields"])
+
+    def test_decode_rejects_unknown_version(self):
+        """未知のバージョンのフレームを拒否するかテスト"""
+        frame = bytearray(encode_state(self.game.get_state(), self.players))
+        frame[1] = 99
+        with self.assertRaises(ValueError):
+            decode_state(bytes(frame))
+
+
+class TestDeltaEncoder(unittest.TestCase):
+    """DeltaEncoderクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.players = ("player1", "player2")
+        self.game = MultiplayerPongGame("test_session", *self.players)
+        self.encoder = DeltaEncoder(keyframe_interval=10)
+
+    def _next(self):
+        self.game.update(0.016)
+        return self.encoder.encode(flatten_state(self.game.get_state(), self.players))
+
+    def test_first_frame_is_keyframe(self):
+        """接続直後は全フィールドを含むキーフレームを送るかテスト"""
+        message = self._next()
+        self.assertEqual(message["type"], "state_keyframe")
+        self.assertEqual(
+            set(message["fields"]),
+            set(flatten_state(self.game.get_state(), self.players)),
+        )
+
+    def test_delta_contains_only_changed_fields(self):
+        """確認応答後は変化したフィールドだけを送るかテスト"""
+        keyframe = self._next()
+        self.encoder.acknowledge(keyframe["frame"])
+
+        message = self._next()
+        self.assertEqual(message["type"], "state_delta")
+        self.assertEqual(message["base"], keyframe["frame"])
+        # ボールだけが動き、スコアやパドルは送られない
+        self.assertEqual(set(message["changes"]), {"ball_x", "ball_z"})
+
+        self.game.move_player("player1", 50)
+        message = self._next()
+        self.assertIn("paddle1_x", message["changes"])
+        self.assertNotIn("score1", message["changes"])
+
+    def test_periodic_keyframe(self):
+        """一定フレームごとにキーフレームを送るかテスト"""
+        keyframe = self._next()
+        self.encoder.acknowledge(keyframe["frame"])
+        types = [self._next()["type"] for _ in range(10)]
+        self.assertEqual(types[:-1], ["state_delta"] * 9)
+        self.assertEqual(types[-1], "state_keyframe")
+
+    def test_keyframe_request_and_unknown_ack(self):
+        """再同期要求と履歴外の確認応答でキーフレームに戻るかテスト"""
+        keyframe = self._next()
+        self.encoder.acknowledge(keyframe["frame"])
+        self.encoder.request_keyframe()
+        self.assertEqual(self._next()["type"], "state_keyframe")
+
+        # 存在しないフレームへの確認応答は無視される
+        self.encoder.acknowledge(999)
+        self.assertEqual(self._next()["type"], "state_keyframe")
+
+
+if __name__ == "__main__":
+    unittest.main()
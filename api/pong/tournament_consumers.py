@@ -1,19 +1,39 @@
 # api/pong/tournament_consumers.py
-import asyncio
 import json
 import random
 import time
-from django.utils import timezone
+from django.conf import settings
+from django.db import IntegrityError, transaction
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
 from .base_consumers import BaseGameConsumer
-from .game_logic import MultiplayerPongGame
+from .input_buffer import InputBuffer
+from .outbound_queue import QueuedSendMixin
 from .models import Game, User, TournamentSession, TournamentParticipant
+from .tournament_state import get_tournament_states, match_type, waiting_view
 
 
 # NOTE: セッションID：tournament_{tournament_id}_{round_type}_{player1}_{player2}_{timestamp}
+# round_type は final, semi1, quarter3, r1-5 など（bracket.round_type）
+
+
+def tournament_size():
+    """トーナメントの定員（2の累乗でなければ上位シードが不戦勝）"""
+    return getattr(settings, "PONG_TOURNAMENT_SIZE", 4)
+
+
+def lobby_group(tournament_id):
+    """同じトーナメント（ロビー）の参加者全員のグループ"""
+    return f"tournament_lobby_{tournament_id}"
+
+
+def user_group(user_id):
+    """1人のユーザー向けのグループ（ユーザー名はグループ名に使えない文字を含み得る）"""
+    return f"tournament_user_{user_id}"
+
+
 class TournamentGameConsumer(BaseGameConsumer):
     """トーナメントゲーム向けWebSocketコンシューマ"""
 
@@ -29,14 +49,18 @@ class TournamentGameConsumer(BaseGameConsumer):
         # 初期状態
         self.session_id = None
         self.game_group_name = None  # 初期化時にはまだグループに入らない
+        self.input_buffer = InputBuffer.from_settings()
 
-        await self.accept()
+        await self.accept(subprotocol=self.negotiate_wire_format())
         print(
             f"Player {self.username} connected to tournament game {self.tournament_id}, round {self.round_type}"
         )
 
     async def receive(self, text_data):
         """クライアントからのメッセージ受信処理"""
+        # 送信頻度・サイズの上限を超えたメッセージは解析せずに破棄
+        if not self.input_buffer.admit(text_data):
+            return
         try:
             data = json.loads(text_data)
             message_type = data.get("type")
@@ -53,6 +77,11 @@ class TournamentGameConsumer(BaseGameConsumer):
                 await self.channel_layer.group_add(
                     self.game_group_name, self.channel_name
                 )
+                self.fanout.join(self.game_group_name, self)
+
+                # セッションを所有するワーカーでのみ試合を作成
+                if not await self.ensure_session_owner():
+                    return
 
                 # ゲームの初期化
                 await self.initialize_game()
@@ -73,6 +102,8 @@ class TournamentGameConsumer(BaseGameConsumer):
             # その他のメッセージをBaseGameConsumerで処理
             if message_type == "move":
                 await self.handle_move(data)
+            elif message_type in ("state_ack", "keyframe_request"):
+                self.handle_state_ack(data)
 
         except json.JSONDecodeError:
             await self.send(
@@ -92,21 +123,22 @@ class TournamentGameConsumer(BaseGameConsumer):
         player1_name = parts[3]
         player2_name = parts[4]
 
-        # ゲームインスタンスの作成
+        # ゲームインスタンスの作成（スケジューラに登録して購読）
         if self.session_id not in self.games:
-            self.games[self.session_id] = MultiplayerPongGame(
-                session_id=self.session_id,
-                player1_name=player1_name,
-                player2_name=player2_name,
+            game = await self.join_match(
+                self.scheduler.create_game(
+                    session_id=self.session_id,
+                    player1_name=player1_name,
+                    player2_name=player2_name,
+                )
             )
 
             # DBゲーム情報を設定
             game_instance = await self.get_or_create_tournament_game()
             if game_instance:
-                self.games[self.session_id].db_game_id = game_instance.id
-
-        # ゲーム更新ループの開始
-        self.game_task = asyncio.create_task(self.game_loop())
+                game.db_game_id = game_instance.id
+        else:
+            await self.join_match(self.games[self.session_id])
 
         # 初期化完了を通知
         await self.send(
@@ -115,36 +147,16 @@ class TournamentGameConsumer(BaseGameConsumer):
             )
         )
 
-    @database_sync_to_async
-    def get_or_fetch_session_id(self):
-        """セッションIDの取得またはセッション情報から生成"""
-        try:
-            # 既存のゲームからセッションIDを取得
-            game = Game.objects.filter(
-                tournament_id=self.tournament_id,
-                tournament_round=0 if self.round_type.startswith("semi") else 1,
-                status__in=["WAITING", "IN_PROGRESS"],
-            ).first()
-
-            if game and game.session_id:
-                return game.session_id
-
-            # フロントエンドからの初期メッセージを待つか、適切なエラー処理
-            return None
-
-        except Exception as e:
-            print(f"Error getting tournament session ID: {e}")
-            return None
-
     async def disconnect(self, close_code):
         """トーナメント特有の切断処理"""
         # ゲームが存在する場合、切断処理を実行
         if self.session_id in self.games:
             game = self.games[self.session_id]
+            self.scheduler.unregister(self.session_id)
             game.handle_disconnection(self.username)
 
             # 残ったプレイヤーに切断を通知
-            await self.channel_layer.group_send(
+            await self.fanout.group_send(
                 self.game_group_name,
                 {
                     "type": "player_disconnected",
@@ -157,48 +169,16 @@ class TournamentGameConsumer(BaseGameConsumer):
             await self.save_game_state(game)
 
             # トーナメント進行状況を更新
-            await self.update_tournament_progress(is_disconnection=True)
-
-            # ゲームインスタンスを削除
-            del self.games[self.session_id]
+            await self.update_tournament_progress(game)
 
         await super().disconnect(close_code)
 
-    async def game_loop(self):
-        """トーナメント特有のゲームループ処理"""
-        try:
-            # 親クラスのゲームループ実行
-            while True:
-                if self.session_id in self.games:
-                    game = self.games[self.session_id]
-                    state = game.update(delta_time=0.016)  # 約60FPS
-
-                    # グループにブロードキャスト
-                    await self.channel_layer.group_send(
-                        self.game_group_name, {"type": "game_state", "state": state}
-                    )
-
-                    # ゲーム終了判定
-                    if not game.is_active:
-                        print(f"Game ended for session {self.session_id}")
-                        # ゲーム状態を保存
-                        await self.save_game_state(game)
-                        # トーナメント進行状況を更新
-                        await self.update_tournament_progress()
-                        break
-
-                await asyncio.sleep(0.016)
-
-        except asyncio.CancelledError:
-            # ループのキャンセル（クリーンアップ）
-            pass
-        except Exception as e:
-            print(f"Error in tournament game loop: {e}")
-
-        # ゲーム終了後のクリーンアップ
-        if self.session_id in self.games:
-            del self.games[self.session_id]
-            print(f"Game instance removed for session {self.session_id}")
+    async def on_game_finished(self, game):
+        """トーナメント特有の試合終了処理"""
+        # ゲーム状態を保存
+        await self.save_game_state(game)
+        # トーナメント進行状況を更新
+        await self.update_tournament_progress(game)
 
     @database_sync_to_async
     def get_or_create_tournament_game(self):
@@ -209,15 +189,13 @@ class TournamentGameConsumer(BaseGameConsumer):
             return None
 
         try:
-            # トーナメント情報の取得
-            tournament = TournamentSession.objects.get(id=session_info["tournament_id"])
+            # トーナメント情報（参加者のユーザーID）はキャッシュした状態から取得
+            state = get_tournament_states().get(session_info["tournament_id"])
+            players = [session_info["player1"], session_info["player2"]]
+            player1, player2 = (state.participants[name]["user_id"] for name in players)
 
-            # プレイヤー情報の取得
-            player1 = User.objects.get(username=session_info["player1"])
-            player2 = User.objects.get(username=session_info["player2"])
-
-            # ラウンド番号の決定
-            tournament_round = 0 if session_info["round_type"].startswith("semi") else 1
+            # ラウンド番号の決定（0 が1回戦）
+            tournament_round = state.round_of(self.session_id)
 
             # ゲーム取得または作成
             game, created = Game.objects.get_or_create(
@@ -225,12 +203,18 @@ class TournamentGameConsumer(BaseGameConsumer):
                 defaults={
                     "game_type": "TOURNAMENT",
                     "status": "IN_PROGRESS",
-                    "player1": player1,
-                    "player2": player2,
-                    "tournament": tournament,
+                    "player1_id": player1,
+                    "player2_id": player2,
+                    "tournament_id": state.tournament_id,
                     "tournament_round": tournament_round,
                 },
             )
+            state.add_match(self.session_id, game, players)
+            if game.status == "WAITING":
+                # ブラケットが作成した試合はプレイヤーの接続で開始
+                Game.objects.filter(id=game.id, status="WAITING").update(
+                    status="IN_PROGRESS"
+                )
 
             if created:
                 print(
@@ -246,96 +230,46 @@ class TournamentGameConsumer(BaseGameConsumer):
             print(f"Error creating tournament game: {e}")
         return None
 
-    @database_sync_to_async
-    def update_tournament_progress(self, is_disconnection=False):
-        """トーナメント進行状況を更新する入口メソッド"""
-        if not hasattr(self, "session_id"):
+    async def update_tournament_progress(self, game):
+        """トーナメント進行状況を更新する入口メソッド
+
+        ブラケットが進んだら、次の試合を待つプレイヤーへ最新の
+        ブラケットの状態（次の試合が作成されていればその情報も）を送る。
+        """
+        # save_game_state と同じく、終了した試合の勝者だけを結果とする
+        winner = None if game.is_active else game.get_winner()
+        snapshot = await self.advance_tournament(winner)
+        if snapshot is None:
             return
+        await self.channel_layer.group_send(
+            f"tournament_final_waiting_{snapshot['tournament_id']}",
+            {"type": "tournament_status", "snapshot": snapshot},
+        )
+
+    @database_sync_to_async
+    def advance_tournament(self, winner):
+        """試合結果をブラケットに反映し、トーナメントが続くなら最新の状態を返す
+
+        ブラケットの判定はキャッシュしたトーナメント状態の上で行い、
+        変更は1回のトランザクションで書き込む。
+        """
+        if not getattr(self, "session_id", None):
+            return None
 
         session_info = self._parse_session_id()
         if not session_info:
-            return
+            return None
 
         try:
-            # トーナメント情報の取得
-            tournament = TournamentSession.objects.get(id=session_info["tournament_id"])
-
-            # ゲーム情報の取得
-            game_instance = Game.objects.get(session_id=self.session_id)
-
-            if session_info["round_type"].startswith("semi"):
-                self._update_semifinal_progress(tournament, game_instance)
-            elif session_info["round_type"] == "final":
-                self._update_final_progress(tournament, game_instance)
+            state = get_tournament_states().apply(
+                session_info["tournament_id"],
+                lambda state: state.record_result(self.session_id, winner),
+            )
+            if state.status != "COMPLETED":
+                return state.waiting_snapshot()
         except Exception as e:
             print(f"Error updating tournament progress: {e}")
-
-    def _update_semifinal_progress(self, tournament, game_instance):
-        """準決勝の進行状況を更新"""
-        # 勝者が決まっている場合
-        if game_instance.winner:
-            # 勝者のブラケット位置を更新（決勝進出者は5）
-            participant = TournamentParticipant.objects.get(
-                tournament=tournament, user=game_instance.winner
-            )
-            participant.bracket_position = 5
-            participant.save()
-
-            # 他の準決勝が完了しているか確認
-            semifinals_completed = (
-                Game.objects.filter(
-                    tournament=tournament, tournament_round=0, status="COMPLETED"
-                ).count()
-                == 2
-            )
-
-            # 両方の準決勝が完了していれば、決勝の準備
-            if semifinals_completed:
-                self._prepare_final_match(tournament)
-
-    def _prepare_final_match(self, tournament):
-        """決勝戦の準備"""
-        # トーナメント状態を更新
-        tournament.status = "FINAL_READY"
-        tournament.save()
-
-        # 決勝進出者を取得
-        finalists = TournamentParticipant.objects.filter(
-            tournament=tournament, bracket_position=5
-        ).select_related("user")
-
-        if finalists.count() == 2:
-            # 決勝戦のセッションIDを生成
-            timestamp = int(timezone.now().timestamp())
-            final_session_id = f"tournament_{tournament.id}_final_{finalists[0].user.username}_{finalists[1].user.username}_{timestamp}"
-
-            # 決勝戦を作成
-            Game.objects.create(
-                session_id=final_session_id,
-                game_type="TOURNAMENT",
-                status="WAITING",
-                player1=finalists[0].user,
-                player2=finalists[1].user,
-                tournament=tournament,
-                tournament_round=1,
-            )
-
-    def _update_final_progress(self, tournament, game_instance):
-        """決勝の進行状況を更新"""
-        # 勝者が決まっている場合
-        if game_instance.winner:
-            # 勝者のブラケット位置を更新（優勝者は6）
-            participant = TournamentParticipant.objects.get(
-                tournament=tournament, user=game_instance.winner
-            )
-            participant.bracket_position = 6
-            participant.save()
-
-            # トーナメント優勝者を設定
-            tournament.winner = game_instance.winner
-            tournament.status = "COMPLETED"
-            tournament.completed_at = timezone.now()
-            tournament.save()
+        return None
 
     def _parse_session_id(self, session_id=None):
         """セッションIDからトーナメント情報を抽出"""
@@ -353,15 +287,23 @@ class TournamentGameConsumer(BaseGameConsumer):
         }
 
 
-class TournamentMatchmakingConsumer(AsyncWebsocketConsumer):
-    """トーナメント参加者のマッチメイキングを担当するコンシューマ"""
+class TournamentMatchmakingConsumer(QueuedSendMixin, AsyncWebsocketConsumer):
+    """トーナメント参加者のマッチメイキングを担当するコンシューマ
+
+    参加者の受付は、参加者を募集中のトーナメント（ロビー）の行をロック
+    したトランザクションで行う。ロビーは DB 上に常に1つだけ
+    （unique_waiting_tournament 制約）なので、どのワーカーに接続しても
+    同じロビーに入り、定員に達したロビーはそのトランザクションで一度だけ
+    開始される。以降の参加者は次のロビーに入る。
 
-    # 現在アクティブなトーナメントのID（WAITING_PLAYERS状態のもの）
-    active_tournament_id = None
+    通知は参加したロビーのグループ（待機状況）と自分のユーザーの
+    グループ（対戦カード）にだけ届くため、1件の通知の配信先は受信者だけになる。
+    """
 
     async def connect(self):
         """WebSocket接続時の処理"""
-        await self.channel_layer.group_add("tournament_group", self.channel_name)
+        # 参加中のグループ（ロビー・ユーザー）
+        self.subscriptions = set()
         await self.accept()
         print(f"Tournament matchmaking connected: {self.channel_name}")
 
@@ -372,7 +314,9 @@ class TournamentMatchmakingConsumer(AsyncWebsocketConsumer):
             await self.handle_leave_tournament(self.username)
 
         # グループから削除
-        await self.channel_layer.group_discard("tournament_group", self.channel_name)
+        for group in self.subscriptions:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.subscriptions.clear()
         print(
             f"Tournament matchmaking disconnected: {self.channel_name}, code: {close_code}"
         )
@@ -410,136 +354,117 @@ class TournamentMatchmakingConsumer(AsyncWebsocketConsumer):
             await self.send(json.dumps({"type": "error", "message": "User not found"}))
             return
 
-        # アクティブなトーナメントを取得または作成
-        tournament_id, is_new = await self.get_or_create_active_tournament()
-
-        # 既に参加しているかチェック
-        if not is_new:
-            already_joined = await self.check_already_joined(tournament_id, username)
-            if already_joined:
-                await self.send(
-                    json.dumps(
-                        {"type": "error", "message": "Already joined tournament"}
-                    )
-                )
-                return
-
-        # 参加者をデータベースに登録
-        participant_added = await self.add_tournament_participant(
-            tournament_id, username
-        )
-        if not participant_added:
+        # ロビーに参加（定員に達したらこの参加でトーナメントを開始）
+        admission = await self.admit_participant(user_data["id"])
+        if admission is None:
             await self.send(
                 json.dumps({"type": "error", "message": "Failed to join tournament"})
             )
             return
+        if admission["already_joined"]:
+            await self.send(
+                json.dumps({"type": "error", "message": "Already joined tournament"})
+            )
+            return
+        self.tournament_id = admission["tournament_id"]
 
-        # 参加者数を取得
-        player_count = await self.get_participant_count(tournament_id)
+        # 自分宛ての通知とロビーの通知を受け取る
+        await self.subscribe(user_group(user_data["id"]))
+        await self.subscribe(lobby_group(self.tournament_id))
 
         # 全参加者に現在の状況を通知
-        await self.broadcast_waiting_status(tournament_id)
+        await self.broadcast_waiting_status(self.tournament_id)
 
-        # 参加者が4人に達したらトーナメントを開始
-        if player_count >= 4:
-            await self.start_tournament(tournament_id)
+        if admission["bracket"]:
+            await self.start_tournament(self.tournament_id, admission["bracket"])
 
     async def handle_leave_tournament(self, username):
         """トーナメント離脱処理"""
-        # 現在アクティブなトーナメントから参加者を削除
-        if TournamentMatchmakingConsumer.active_tournament_id:
-            await self.remove_tournament_participant(
-                TournamentMatchmakingConsumer.active_tournament_id, username
-            )
+        # 開始前のロビーからだけ離脱できる
+        tournament_id = await self.withdraw_participant(username)
 
-        # 全参加者に現在の状況を通知
-        if TournamentMatchmakingConsumer.active_tournament_id:
-            await self.broadcast_waiting_status(
-                TournamentMatchmakingConsumer.active_tournament_id
-            )
+        # 残った参加者に現在の状況を通知
+        if tournament_id:
+            await self.unsubscribe(lobby_group(tournament_id))
+            await self.broadcast_waiting_status(tournament_id)
 
-    @database_sync_to_async
-    def get_or_create_active_tournament(self):
-        """アクティブなトーナメントを取得または作成"""
-        # 既存のWAITING_PLAYERS状態のトーナメントを検索
-        if TournamentMatchmakingConsumer.active_tournament_id:
-            try:
-                tournament = TournamentSession.objects.get(
-                    id=TournamentMatchmakingConsumer.active_tournament_id,
-                    status="WAITING_PLAYERS",
-                )
-                return tournament.id, False
-            except TournamentSession.DoesNotExist:
-                # 存在しない場合は新規作成
-                pass
-
-        # 新しいトーナメントを作成
-        tournament = TournamentSession.objects.create(
-            status="WAITING_PLAYERS", max_players=4
-        )
-        TournamentMatchmakingConsumer.active_tournament_id = tournament.id
-        print(f"Created new tournament: {tournament.id}")
-        return tournament.id, True
+    async def subscribe(self, group):
+        if group not in self.subscriptions:
+            self.subscriptions.add(group)
+            await self.channel_layer.group_add(group, self.channel_name)
 
-    @database_sync_to_async
-    def check_already_joined(self, tournament_id, username):
-        """ユーザーが既にトーナメントに参加しているかチェック"""
-        try:
-            user = User.objects.get(username=username)
-            return TournamentParticipant.objects.filter(
-                tournament_id=tournament_id, user=user
-            ).exists()
-        except User.DoesNotExist:
-            return False
+    async def unsubscribe(self, group):
+        if group in self.subscriptions:
+            self.subscriptions.discard(group)
+            await self.channel_layer.group_discard(group, self.channel_name)
 
     @database_sync_to_async
-    def add_tournament_participant(self, tournament_id, username):
-        """トーナメントに参加者を追加"""
-        try:
-            tournament = TournamentSession.objects.get(id=tournament_id)
-            user = User.objects.get(username=username)
-
-            # 既に参加している場合は何もしない
-            if TournamentParticipant.objects.filter(
-                tournament=tournament, user=user
-            ).exists():
-                return True
-
-            # 参加者を追加
-            TournamentParticipant.objects.create(
-                tournament=tournament, user=user, is_ready=True
-            )
-            return True
-        except Exception as e:
-            print(f"Error adding tournament participant: {e}")
-            return False
+    def admit_participant(self, user_id):
+        """参加者を募集中のロビーに追加し、定員に達したらトーナメントを開始
+
+        ロビーの行をロックしてから人数を数えるため、同時に参加しても
+        定員を超えることはなく、開始するのは定員に達した参加者だけになる。
+        開始の書き込みがロールバックされた場合は、キャッシュに載せた
+        ブラケットも破棄する。
+        """
+        for attempt in range(3):
+            seeded = None
+            try:
+                with transaction.atomic():
+                    lobby = (
+                        TournamentSession.objects.select_for_update()
+                        .filter(status="WAITING_PLAYERS")
+                        .first()
+                    )
+                    if lobby is None:
+                        # 他のワーカーが同時に作成した場合は制約違反になり、やり直す
+                        lobby = TournamentSession.objects.create(
+                            status="WAITING_PLAYERS", max_players=tournament_size()
+                        )
+                        print(f"Created new tournament: {lobby.id}")
+
+                    _, created = TournamentParticipant.objects.get_or_create(
+                        tournament=lobby, user_id=user_id, defaults={"is_ready": True}
+                    )
+                    admission = {
+                        "tournament_id": lobby.id,
+                        "already_joined": not created,
+                        "bracket": None,
+                    }
+                    if created and lobby.participants.count() >= lobby.max_players:
+                        seeded = lobby.id
+                        admission["bracket"] = self.seed_tournament(lobby.id)
+                    return admission
+            except Exception as e:
+                error = e
+                if seeded is not None:
+                    get_tournament_states().evict(seeded)
+                if not isinstance(e, IntegrityError):
+                    break
+        print(f"Error adding tournament participant: {error}")
+        return None
 
     @database_sync_to_async
-    def remove_tournament_participant(self, tournament_id, username):
-        """トーナメントから参加者を削除"""
+    def withdraw_participant(self, username):
+        """開始前のロビーから参加者を削除し、そのトーナメントのIDを返す"""
         try:
-            tournament = TournamentSession.objects.get(id=tournament_id)
-            user = User.objects.get(username=username)
-
-            # 参加者を削除
-            TournamentParticipant.objects.filter(
-                tournament=tournament, user=user
-            ).delete()
-
-            return True
+            with transaction.atomic():
+                lobby = (
+                    TournamentSession.objects.select_for_update()
+                    .filter(
+                        status="WAITING_PLAYERS", participants__user__username=username
+                    )
+                    .first()
+                )
+                if lobby is None:
+                    return None
+                TournamentParticipant.objects.filter(
+                    tournament=lobby, user__username=username
+                ).delete()
+                return lobby.id
         except Exception as e:
             print(f"Error removing tournament participant: {e}")
-            return False
-
-    @database_sync_to_async
-    def get_participant_count(self, tournament_id):
-        """トーナメントの参加者数を取得"""
-        try:
-            tournament = TournamentSession.objects.get(id=tournament_id)
-            return tournament.participants.count()
-        except Exception as e:
-            print(f"Error getting participant count: {e}")
-            return 0
+            return None
 
     @database_sync_to_async
     def get_tournament_participants(self, tournament_id):
@@ -578,140 +503,101 @@ class TournamentMatchmakingConsumer(AsyncWebsocketConsumer):
             "tournament_id": tournament_id,
             "players": participants,
             "total_players": player_count,
-            "required_players": 4,
+            "required_players": tournament_size(),
             "timestamp": int(time.time()),
         }
 
-        # チャンネルグループにブロードキャスト
+        # ロビーの参加者にだけ送信
         await self.channel_layer.group_send(
-            "tournament_group", {"type": "tournament_update", "message": status_message}
+            lobby_group(tournament_id),
+            {"type": "tournament_update", "message": status_message},
         )
 
-    async def start_tournament(self, tournament_id):
-        """トーナメントを開始"""
-        # 参加者を取得
-        participants = await self.get_tournament_participants(tournament_id)
-
-        if len(participants) < 4:
-            print(f"Not enough participants to start tournament: {len(participants)}/4")
-            return
-
-        # トーナメントの状態を「IN_PROGRESS」に更新
-        tournament_started = await self.update_tournament_status(
-            tournament_id, "IN_PROGRESS"
-        )
-        if not tournament_started:
-            print("Failed to update tournament status")
-            return
-
-        # アクティブなトーナメントをリセット
-        TournamentMatchmakingConsumer.active_tournament_id = None
+    async def start_tournament(self, tournament_id, bracket):
+        """開始したトーナメントの最初の試合をプレイヤーに通知"""
+        # 各試合のプレイヤーに通知（試合はプレイヤーの接続先のワーカーで並行して進む）
+        for match in bracket["matches"]:
+            await self.notify_match_players(match, tournament_id, bracket)
 
-        # 準決勝の組み合わせ生成
-        semifinal_matches = self.generate_semifinal_matchups(
-            participants, tournament_id
-        )
+        # 不戦勝のプレイヤーは次の試合の待機画面へ
+        for username in bracket["byes"]:
+            await self.channel_layer.group_send(
+                user_group(bracket["user_ids"][username]),
+                {
+                    "type": "tournament_update",
+                    "message": {
+                        "type": "tournament_bye",
+                        "tournament_id": tournament_id,
+                        "bracket_position": bracket["positions"][username],
+                    },
+                },
+            )
 
-        # 準決勝の対戦カードに基づいてブラケット位置を更新
-        bracket_positions = {}
+    def seed_tournament(self, tournament_id):
+        """参加者をレベル順にシードしてブラケットを作成し、最初の試合を返す
 
-        # 準決勝1の通知
-        await self.notify_semifinal_players(
-            semifinal_matches["semi1"]["players"],
-            semifinal_matches["semi1"]["session_id"],
-            tournament_id,
-            1,
-            bracket_positions,
+        対戦者がそろった試合は全て同時に作成する（admit_participant の
+        トランザクション内で呼ぶ）。
+        """
+        states = get_tournament_states()
+        participants = list(
+            states.get(tournament_id, refresh=True).participants.items()
         )
 
-        # 準決勝2の通知
-        await self.notify_semifinal_players(
-            semifinal_matches["semi2"]["players"],
-            semifinal_matches["semi2"]["session_id"],
-            tournament_id,
-            2,
-            bracket_positions,
-        )
-
-        # ブラケット位置の更新
-        await self.update_bracket_positions(tournament_id, bracket_positions)
-
-    @database_sync_to_async
-    def update_tournament_status(self, tournament_id, status):
-        """トーナメントの状態を更新"""
-        try:
-            tournament = TournamentSession.objects.get(id=tournament_id)
-            tournament.status = status
-
-            if status == "IN_PROGRESS":
-                tournament.started_at = timezone.now()
-            elif status == "COMPLETED":
-                tournament.completed_at = timezone.now()
-
-            tournament.save()
-            return True
-        except Exception as e:
-            print(f"Error updating tournament status: {e}")
-            return False
-
-    def generate_semifinal_matchups(self, participants, tournament_id):
-        """準決勝の組み合わせを生成"""
-        # 参加者をランダムに並び替え
+        # 同じレベルのプレイヤーの順番はランダム
         random.shuffle(participants)
+        participants.sort(key=lambda item: item[1]["level"], reverse=True)
+        seeds = [username for username, _ in participants]
 
-        # 準決勝の組み合わせ
-        semifinal1_players = participants[0:2]
-        semifinal2_players = participants[2:4]
-
-        # タイムスタンプ生成（両方のマッチで共通）
-        timestamp = int(time.time())
-
-        # 準決勝1のセッションID
-        semi1_id = f"tournament_{tournament_id}_semi1_{semifinal1_players[0]['username']}_{semifinal1_players[1]['username']}_{timestamp}"
-
-        # 準決勝2のセッションID
-        semi2_id = f"tournament_{tournament_id}_semi2_{semifinal2_players[0]['username']}_{semifinal2_players[1]['username']}_{timestamp}"
-
+        state = states.apply(tournament_id, lambda state: state.start(seeds))
+        matches = state.pending_matches()
+        playing = {username for match in matches for username in match["players"]}
         return {
-            "semi1": {"players": semifinal1_players, "session_id": semi1_id},
-            "semi2": {"players": semifinal2_players, "session_id": semi2_id},
+            "rounds": state.bracket.rounds,
+            "matches": matches,
+            "byes": [
+                state.bracket.winners[key]
+                for key in sorted(state.bracket.byes)
+                if state.bracket.winners[key] not in playing
+            ],
+            "positions": {
+                username: participant["bracket_position"]
+                for username, participant in state.participants.items()
+            },
+            "user_ids": {
+                username: participant["user_id"]
+                for username, participant in state.participants.items()
+            },
         }
 
-    async def notify_semifinal_players(
-        self, players, session_id, tournament_id, match_number, bracket_positions
-    ):
-        """準決勝プレイヤーに通知"""
-        base_position = (match_number - 1) * 2 + 1  # 1または3
-
-        for i, player in enumerate(players):
-            # ブラケット位置計算（1,2または3,4）
-            position = base_position + i
-            bracket_positions[player["username"]] = position
-
-            # 対戦相手の情報
-            opponent = players[1 - i]["username"]
+    async def notify_match_players(self, match, tournament_id, bracket):
+        """試合のプレイヤーに通知"""
+        rounds = bracket["rounds"]
+        kind = match_type(match["round"], rounds)
+        following = (
+            match_type(match["round"] + 1, rounds)
+            if match["round"] + 1 < rounds
+            else None
+        )
 
+        for i, username in enumerate(match["players"]):
             # 通知データ作成
             match_data = {
                 "type": "tournament_match",
                 "tournament_id": tournament_id,
-                "match_type": "semifinal",
-                "match_number": match_number,
-                "session_id": session_id,
-                "opponent": opponent,
+                "match_type": kind,
+                "match_number": match["index"] + 1,
+                "session_id": match["session_id"],
+                "opponent": match["players"][1 - i],
                 "is_player1": i == 0,
-                "next_match": "final",
-                "bracket_position": position,
+                "next_match": following,
+                "bracket_position": bracket["positions"][username],
             }
 
-            # チャンネルグループに特定ユーザー向けメッセージを送信
+            # そのユーザーのグループにだけ送信
             await self.channel_layer.group_send(
-                "tournament_group",
-                {
-                    "type": "tournament_update",
-                    "username": player["username"],
-                    "message": match_data,
-                },
+                user_group(bracket["user_ids"][username]),
+                {"type": "tournament_update", "message": match_data},
             )
 
     @database_sync_to_async
@@ -727,52 +613,49 @@ class TournamentMatchmakingConsumer(AsyncWebsocketConsumer):
         except User.DoesNotExist:
             return None
 
-    @database_sync_to_async
-    def update_bracket_positions(self, tournament_id, positions_dict):
-        """トーナメント参加者のブラケット位置を更新"""
-        try:
-            tournament = TournamentSession.objects.get(id=tournament_id)
-
-            for username, position in positions_dict.items():
-                user = User.objects.get(username=username)
-                participant = TournamentParticipant.objects.get(
-                    tournament=tournament, user=user
-                )
-                participant.bracket_position = position
-                participant.save()
-
-            return True
-        except Exception as e:
-            print(f"Error updating bracket positions: {e}")
-            return False
-
     # グループメッセージ受信ハンドラ（他のコンシューマからの通知を受け取る）
     async def tournament_update(self, event):
-        """トーナメント更新通知をクライアントに転送"""
-        # 特定ユーザー向けのメッセージなら、そのユーザーにだけ送信
-        if "username" in event and hasattr(self, "username"):
-            if event["username"] != self.username:
-                return
-
+        """トーナメント更新通知をクライアントに転送（宛先のグループにだけ届く）"""
         # メッセージを転送
         if "message" in event:
             await self.send(text_data=json.dumps(event["message"]))
 
 
-class TournamentWaitingFinalConsumer(AsyncWebsocketConsumer):
-    """決勝戦開始を待機するプレイヤー向けのWebSocketコンシューマ
+def build_waiting_snapshot(tournament_id):
+    """次の試合の待機画面に送るブラケットの状態を作成"""
+    return get_tournament_states().get(tournament_id).waiting_snapshot()
+
+
+class TournamentWaitingFinalConsumer(QueuedSendMixin, AsyncWebsocketConsumer):
+    """勝ち上がって次の試合（4人なら決勝戦）を待つプレイヤー向けのWebSocketコンシューマ
     URL: /wss/tournament/waiting_final/{tournament_id}/{username}/
+
+    ブラケットが進むと TournamentGameConsumer から tournament_status が
+    届くため、クライアントのステータス要求にはキャッシュした状態で答え、
+    DB への問い合わせは行わない。各プレイヤーには waiting_view で求めた
+    自分の次の試合の状況だけを送る。
     """
 
+    # tournament_id → 最新の待機状態（build_waiting_snapshot の結果）
+    snapshots = {}
+    # tournament_id → このプロセスで待機中の接続数（0 になったらキャッシュを破棄）
+    connections = {}
+
     async def connect(self):
         """WebSocket接続時の処理"""
         # URLパラメータの取得
         self.tournament_id = self.scope["url_route"]["kwargs"].get("tournament_id", "")
         self.username = self.scope["url_route"]["kwargs"].get("username", "")
 
+        # 最後に送った次の試合の状況（waiting_view）
+        self.last_view = None
+
         # トーナメント待機グループに参加
         self.group_name = f"tournament_final_waiting_{self.tournament_id}"
         await self.channel_layer.group_add(self.group_name, self.channel_name)
+        self.connections[self.tournament_id] = (
+            self.connections.get(self.tournament_id, 0) + 1
+        )
 
         # 接続を受け入れる
         await self.accept()
@@ -780,7 +663,7 @@ class TournamentWaitingFinalConsumer(AsyncWebsocketConsumer):
             f"Player {self.username} connected to tournament final waiting for tournament {self.tournament_id}"
         )
 
-        # 参加資格検証（準決勝勝者かどうか）
+        # 参加資格検証（敗退していないかどうか）
         is_eligible = await self.verify_eligibility()
         if not is_eligible:
             await self.send(
@@ -795,10 +678,20 @@ class TournamentWaitingFinalConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
+        # 現在の状態を送る（既に次の試合の準備ができていれば final_ready も送る）
+        await self.send_snapshot(await self.get_snapshot())
+
     async def disconnect(self, close_code):
         """WebSocket切断時の処理"""
         # グループから離脱
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        remaining = self.connections.get(self.tournament_id, 1) - 1
+        if remaining > 0:
+            self.connections[self.tournament_id] = remaining
+        else:
+            # 通知を受け取る接続がなくなると古くなり得るため破棄
+            self.connections.pop(self.tournament_id, None)
+            self.snapshots.pop(self.tournament_id, None)
         print(f"Player {self.username} disconnected from tournament final waiting")
 
     async def receive(self, text_data):
@@ -807,14 +700,10 @@ class TournamentWaitingFinalConsumer(AsyncWebsocketConsumer):
             data = json.loads(text_data)
             message_type = data.get("type")
 
-            # ステータス要求メッセージの処理
+            # ステータス要求にはキャッシュした状態で答える
             if message_type == "request_status":
-                status_data = await self.get_waiting_status()
-                await self.send(text_data=json.dumps(status_data))
-
-                # 両方の準決勝が完了していれば決勝戦の準備
-                if status_data.get("all_semifinals_completed", False):
-                    await self.check_and_prepare_final()
+                self.last_view = None
+                await self.send_snapshot(await self.get_snapshot())
 
         except json.JSONDecodeError:
             await self.send(
@@ -827,118 +716,100 @@ class TournamentWaitingFinalConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def verify_eligibility(self):
-        """ユーザーが決勝戦に参加する資格があるか検証"""
+        """ユーザーが次の試合に進む資格（まだ敗退していない）があるか検証"""
         try:
-            # トーナメント情報の取得
-            tournament = TournamentSession.objects.get(id=self.tournament_id)
-            user = User.objects.get(username=self.username)
-
-            # ブラケット位置が5（決勝進出者）のプレイヤーであるか確認
-            participant = TournamentParticipant.objects.filter(
-                tournament=tournament,
-                user=user,
-                bracket_position=5,  # 決勝進出者の位置
-            ).exists()
-
-            return participant
-        except (TournamentSession.DoesNotExist, User.DoesNotExist):
+            states = get_tournament_states()
+            if states.get(self.tournament_id).is_contender(self.username):
+                return True
+            # 他のワーカーで勝ち上がった直後はキャッシュが古いことがあるため読み直す
+            return states.get(self.tournament_id, refresh=True).is_contender(
+                self.username
+            )
+        except TournamentSession.DoesNotExist:
             return False
         except Exception as e:
             print(f"Error verifying eligibility: {e}")
             return False
 
+    async def get_snapshot(self):
+        """キャッシュした待機状態を取得（なければ DB から一度だけ作成）"""
+        snapshot = self.snapshots.get(self.tournament_id)
+        if snapshot is None:
+            snapshot = await self.load_snapshot()
+            if snapshot is not None:
+                self.store_snapshot(snapshot)
+        return snapshot
+
     @database_sync_to_async
-    def get_waiting_status(self):
-        """決勝待機ステータスの取得"""
+    def load_snapshot(self):
         try:
-            tournament = TournamentSession.objects.get(id=self.tournament_id)
-
-            # 準決勝の完了数をカウント
-            completed_semifinals = Game.objects.filter(
-                tournament=tournament,
-                tournament_round=0,  # 準決勝
-                status="COMPLETED",
-            ).count()
-
-            # 決勝進出者リスト
-            finalists = []
-            for participant in TournamentParticipant.objects.filter(
-                tournament=tournament,
-                bracket_position=5,  # 決勝進出者
-            ).select_related("user"):
-                finalists.append(
-                    {
-                        "username": participant.user.username,
-                        "display_name": participant.user.display_name,
-                    }
-                )
-
-            # 全準決勝完了フラグ
-            all_semifinals_completed = completed_semifinals == 2
-
-            return {
-                "type": "waiting_status",
-                "tournament_id": self.tournament_id,
-                "completed_semifinals": completed_semifinals,
-                "all_semifinals_completed": all_semifinals_completed,
-                "finalists": finalists,
-                "timestamp": timezone.now().timestamp(),
-            }
+            return build_waiting_snapshot(self.tournament_id)
         except Exception as e:
             print(f"Error getting waiting status: {e}")
-            return {"type": "error", "message": f"Error getting status: {str(e)}"}
-
-    async def check_and_prepare_final(self):
-        """決勝戦の準備が整っているか確認し、準備"""
-        try:
-            # 決勝戦情報の取得
-            final_match = await self.get_final_match()
-
-            if not final_match:
-                print("Final match not found or not ready")
-                return
+            return None
 
-            # 決勝戦の準備が整っている場合、参加プレイヤーに通知
-            await self.channel_layer.group_send(
-                self.group_name,
-                {
-                    "type": "final_ready",
-                    "session_id": final_match["session_id"],
-                    "player1": final_match["player1"],
-                    "player2": final_match["player2"],
-                },
-            )
-        except Exception as e:
-            print(f"Error checking and preparing final: {e}")
+    def store_snapshot(self, snapshot):
+        """より進んだ状態だけでキャッシュを更新"""
+        current = self.snapshots.get(self.tournament_id)
+        if current is not None and snapshot["version"] < current["version"]:
+            return False
+        self.snapshots[self.tournament_id] = snapshot
+        return True
 
     @database_sync_to_async
-    def get_final_match(self):
-        """決勝戦情報の取得"""
-        try:
-            tournament = TournamentSession.objects.get(id=self.tournament_id)
+    def observe_version(self, version):
+        get_tournament_states().observe(self.tournament_id, version)
 
-            # 決勝戦の取得
-            final_match = Game.objects.filter(
-                tournament=tournament,
-                tournament_round=1,  # 決勝
-                status__in=["WAITING", "IN_PROGRESS"],
-            ).first()
+    async def send_snapshot(self, snapshot):
+        """自分の次の試合の状況を送信（準備ができていれば final_ready も）
 
-            if not final_match:
-                return None
+        completed_semifinals・finalists は、次の試合へ勝者を送る2試合
+        （4人なら準決勝）の完了数と勝ち上がったプレイヤー。自分に関係の
+        ない試合が進んだだけで状況が変わらなければ送らない。
+        """
+        if snapshot is None:
+            await self.send(
+                text_data=json.dumps(
+                    {"type": "error", "message": "Error getting status"}
+                )
+            )
+            return
+        view = waiting_view(snapshot, self.username)
+        if view == self.last_view:
+            return
+        self.last_view = view
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "waiting_status",
+                    "tournament_id": self.tournament_id,
+                    "version": snapshot["version"],
+                    "completed_semifinals": view["completed"],
+                    "all_semifinals_completed": view["completed"] == 2,
+                    "finalists": [
+                        {
+                            "username": username,
+                            "display_name": snapshot["names"][username],
+                        }
+                        for username in view["advanced"]
+                    ],
+                    "timestamp": snapshot["timestamp"],
+                }
+            )
+        )
+        if view["ready"]:
+            await self.final_ready({"type": "final_ready", **view["ready"]})
 
-            return {
-                "session_id": final_match.session_id,
-                "player1": final_match.player1.username,
-                "player2": final_match.player2.username,
-                "status": final_match.status,
-            }
-        except Exception as e:
-            print(f"Error getting final match: {e}")
-            return None
+    async def tournament_status(self, event):
+        """ブラケットが進んだ通知（試合の終了・次の試合の準備完了）"""
+        # 他のワーカーで進んだ場合はこのプロセスのトーナメント状態を破棄
+        await self.observe_version(event["snapshot"]["version"])
+        # 順序が入れ替わって届いた古い通知は送らない
+        if self.store_snapshot(event["snapshot"]):
+            await self.send_snapshot(event["snapshot"])
 
     async def final_ready(self, event):
-        """決勝戦準備完了通知のハンドラー"""
+        """次の試合（決勝戦など）の準備完了通知のハンドラー"""
         # プレイヤー1か2かを判定
         is_player1 = self.username == event["player1"]
 
@@ -949,6 +820,7 @@ class TournamentWaitingFinalConsumer(AsyncWebsocketConsumer):
                     "type": "final_ready",
                     "session_id": event["session_id"],
                     "is_player1": is_player1,
+                    "match_type": event.get("match_type", "final"),
                 }
             )
         )
@@ -0,0 +1,485 @@
+# api/pong/tournament_state.py
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .bracket import Bracket, parse_round_type, round_name, round_type, seed_slots
+from .models import Game, TournamentParticipant, TournamentSession
+
+# クライアントに通知する試合の種類（round_name → match_type）
+MATCH_TYPES = {"final": "final", "semi": "semifinal", "quarter": "quarterfinal"}
+
+
+def match_type(round_number: int, rounds: int) -> str:
+    return MATCH_TYPES.get(round_name(round_number, rounds), "round")
+
+
+class StaleTournamentState(Exception):
+    """キャッシュした状態が DB（他のワーカーの更新）より古い"""
+
+
+class TournamentState:
+    """1トーナメント分の状態（ブラケット・参加者・試合）
+
+    DB から一度だけ読み込み、以降の進行（勝ち上がり・次の試合の作成・
+    優勝）はメモリ上のブラケットで判定する。変更は flush で1回の
+    トランザクションにまとめて書き込み、TournamentSession.version で
+    他のワーカーの更新との競合を検出する。
+    """
+
+    def __init__(
+        self,
+        tournament_id: int,
+        status: str,
+        version: int,
+        participants: Dict[str, Dict],
+        matches: Dict[str, Dict],
+        winner: Optional[str] = None,
+    ):
+        self.tournament_id = tournament_id
+        self.status = status
+        self.version = version
+        self.participants = participants  # username → 参加者
+        self.matches = matches  # session_id → 試合
+        self.winner = winner
+        self.bracket: Optional[Bracket] = None
+        self._dirty_participants = set()
+        self._dirty_abandoned = set()  # ABANDONED を書き込む試合の session_id
+        self._dirty_tournament = False
+        self._started = False
+
+        slots = {
+            participant["bracket_position"]: username
+            for username, participant in participants.items()
+            if participant["bracket_position"]
+        }
+        if len(slots) >= 2:
+            self._build_bracket(slots)
+
+    @classmethod
+    def load(cls, tournament_id) -> "TournamentState":
+        """トーナメント・参加者・試合を DB から読み込む（3クエリ）"""
+        tournament = TournamentSession.objects.select_related("winner").get(
+            id=tournament_id
+        )
+        participants = {
+            participant.user.username: {
+                "id": participant.id,
+                "user_id": participant.user_id,
+                "display_name": participant.user.display_name,
+                "level": participant.user.level,
+                "bracket_position": participant.bracket_position,
+            }
+            for participant in TournamentParticipant.objects.filter(
+                tournament=tournament
+            )
+            .select_related("user")
+            .order_by("id")
+        }
+        matches = {
+            game.session_id: {
+                "id": game.id,
+                "round": game.tournament_round,
+                "players": [game.player1.username, game.player2.username],
+                "status": game.status,
+                "winner": game.winner.username if game.winner else None,
+            }
+            for game in Game.objects.filter(tournament=tournament)
+            .select_related("player1", "player2", "winner")
+            .order_by("id")
+        }
+        return cls(
+            tournament.id,
+            tournament.status,
+            tournament.version,
+            participants,
+            matches,
+            winner=tournament.winner.username if tournament.winner else None,
+        )
+
+    def _build_bracket(self, slots: Dict[int, str]) -> None:
+        """ブラケットの位置と試合結果からブラケットを組み立てる"""
+        self.bracket = Bracket(slots)
+        for session_id, match in self.matches.items():
+            parts = session_id.split("_")
+            key = (
+                parse_round_type(parts[2], self.bracket.rounds)
+                if len(parts) > 2
+                else None
+            )
+            if key is None:
+                continue
+            match["round"], match["index"] = key
+            if match["status"] == "ABANDONED" and not match["winner"]:
+                match["winner"] = self.bracket.walkover_winner(*key)
+            if match["winner"]:
+                self.bracket.record(*key, match["winner"])
+
+    @property
+    def dirty(self) -> bool:
+        return (
+            self._dirty_tournament
+            or bool(self._dirty_participants)
+            or bool(self._dirty_abandoned)
+        )
+
+    def is_contender(self, username: str) -> bool:
+        """まだ敗退していない（次の試合を待つ）プレイヤーか"""
+        if self.bracket is None or self.status == "COMPLETED":
+            return False
+        if username not in self.bracket.slots.values():
+            return False
+        return not any(
+            match.get("index") is not None
+            and match["winner"]
+            and match["winner"] != username
+            and username in match["players"]
+            for match in self.matches.values()
+        )
+
+    def round_of(self, session_id: str) -> int:
+        """試合のラウンド番号（0 が1回戦）"""
+        if session_id in self.matches:
+            return self.matches[session_id]["round"]
+        if self.bracket is not None:
+            key = parse_round_type(session_id.split("_")[2], self.bracket.rounds)
+            if key is not None:
+                return key[0]
+        return 0
+
+    def add_match(self, session_id: str, game: Game, players: List[str]) -> None:
+        """作成済みの試合を登録（バージョンは進めない）"""
+        if session_id in self.matches:
+            return
+        self.matches[session_id] = {
+            "id": game.id,
+            "round": game.tournament_round,
+            "players": list(players),
+            "status": game.status,
+            "winner": None,
+        }
+        if self.bracket is not None:
+            key = parse_round_type(session_id.split("_")[2], self.bracket.rounds)
+            if key is not None:
+                self.matches[session_id]["round"], self.matches[session_id]["index"] = (
+                    key
+                )
+
+    def start(self, players: List[str]) -> bool:
+        """シード順に並べたプレイヤーでブラケットを組み、対戦可能な試合を作成"""
+        if self.status != "WAITING_PLAYERS" or len(players) < 2:
+            return False
+        slots = seed_slots(players)
+        for slot, username in slots.items():
+            self._set_position(username, slot)
+        self._build_bracket(slots)
+        self.status = "IN_PROGRESS"
+        self._started = True
+        self._dirty_tournament = True
+        # 1回戦（と不戦勝同士の2回戦）は全て同時に始める
+        for key in self.bracket.ready_matches():
+            self._schedule(*key)
+        return True
+
+    def record_result(self, session_id: str, winner: Optional[str]) -> bool:
+        """試合結果を反映し、ブラケットが進んだかを返す
+
+        同じ結果を二度反映しても状態は変わらない。勝者が進む次の試合の
+        対戦者がそろえば、その試合を作成する。
+
+        勝者のないまま終了した試合（放置・放棄で reap された試合）は
+        ABANDONED として書き込み、シード上位のプレイヤーを勝ち上がらせる。
+        DB から読み込む際も同じ規則で勝ち上がりを求める。
+        """
+        match = self.matches.get(session_id)
+        if match is None or self.bracket is None or "index" not in match:
+            raise StaleTournamentState(f"Unknown tournament match: {session_id}")
+        key = (match["round"], match["index"])
+        if winner:
+            match["status"] = "COMPLETED"
+        else:
+            winner = self.bracket.walkover_winner(*key)
+            if match["status"] != "ABANDONED":
+                match["status"] = "ABANDONED"
+                self._dirty_abandoned.add(session_id)
+        match["winner"] = winner
+        if winner is None:
+            return self.dirty
+
+        recorded = self.bracket.record(*key, winner)
+        following = self.bracket.next_ready(*key)
+        if not recorded:
+            # DB から読み込んだ時点で結果が反映済み（save_game_state が先に
+            # 書き込んだ）なら、次の試合の作成・優勝がまだの場合だけ進める
+            if following is not None and self._has_match(following):
+                following = None
+            finishing = self.bracket.champion and self.status != "COMPLETED"
+            if following is None and not finishing:
+                return self.dirty
+
+        self._dirty_tournament = True
+        if self.bracket.champion:
+            self.status = "COMPLETED"
+            self.winner = self.bracket.champion
+            return True
+        if following is not None:
+            self._schedule(*following)
+        return True
+
+    def _has_match(self, key) -> bool:
+        return any(
+            (match.get("round"), match.get("index")) == key
+            for match in self.matches.values()
+        )
+
+    def _set_position(self, username: str, position: int) -> None:
+        self.participants[username]["bracket_position"] = position
+        self._dirty_participants.add(username)
+
+    def _schedule(self, round_number: int, index: int) -> None:
+        """対戦者がそろった試合を作成（id は flush で Game を作成した時に設定）"""
+        players = list(self.bracket.players(round_number, index))
+        kind = round_type(round_number, index, self.bracket.rounds)
+        session_id = f"tournament_{self.tournament_id}_{kind}_{players[0]}_{players[1]}_{int(time.time())}"
+        if round_number == self.bracket.rounds - 1:
+            self.status = "FINAL_READY"
+        self.matches[session_id] = {
+            "id": None,
+            "round": round_number,
+            "index": index,
+            "players": players,
+            "status": "WAITING",
+            "winner": None,
+        }
+
+    def pending_matches(self) -> List[Dict]:
+        """作成済みで開始を待つ試合"""
+        return [
+            {"session_id": session_id, **match}
+            for session_id, match in self.matches.items()
+            if match["status"] == "WAITING"
+        ]
+
+    def flush(self) -> None:
+        """変更を1回のトランザクションで書き込み、バージョンを進める
+
+        DB のバージョンが読み込み時と異なる（他のワーカーが先に進めた）場合は
+        何も書き込まずに StaleTournamentState を送出する。
+        """
+        if not self.dirty:
+            return
+        fields = {"version": F("version") + 1}
+        if self._dirty_tournament:
+            fields["status"] = self.status
+            if self._started:
+                fields["started_at"] = timezone.now()
+            if self.status == "COMPLETED":
+                fields["winner_id"] = self.participants[self.winner]["user_id"]
+                fields["completed_at"] = timezone.now()
+
+        with transaction.atomic():
+            updated = TournamentSession.objects.filter(
+                id=self.tournament_id, version=self.version
+            ).update(**fields)
+            if not updated:
+                raise StaleTournamentState(
+                    f"Tournament {self.tournament_id} changed since version {self.version}"
+                )
+
+            for username in self._dirty_participants:
+                participant = self.participants[username]
+                TournamentParticipant.objects.filter(id=participant["id"]).update(
+                    bracket_position=participant["bracket_position"]
+                )
+
+            created = [
+                (session_id, match)
+                for session_id, match in self.matches.items()
+                if match["id"] is None
+            ]
+            games = Game.objects.bulk_create(
+                Game(
+                    session_id=session_id,
+                    game_type="TOURNAMENT",
+                    status=match["status"],
+                    player1_id=self.participants[match["players"][0]]["user_id"],
+                    player2_id=self.participants[match["players"][1]]["user_id"],
+                    tournament_id=self.tournament_id,
+                    tournament_round=match["round"],
+                )
+                for session_id, match in created
+            )
+            for (session_id, match), game in zip(created, games):
+                match["id"] = game.id
+
+            if self._dirty_abandoned:
+                Game.objects.filter(
+                    id__in=[
+                        self.matches[session_id]["id"]
+                        for session_id in self._dirty_abandoned
+                    ]
+                ).update(status="ABANDONED")
+
+        self.version += 1
+        self._dirty_participants.clear()
+        self._dirty_abandoned.clear()
+        self._dirty_tournament = False
+        self._started = False
+
+    def waiting_snapshot(self) -> Dict:
+        """次の試合を待つプレイヤーに送るブラケットの状態
+
+        各プレイヤー向けの表示は waiting_view で求める。
+        """
+        matches = [
+            {
+                "session_id": session_id,
+                "round": match["round"],
+                "index": match["index"],
+                "players": match["players"],
+                "status": match["status"],
+                "winner": match["winner"],
+            }
+            for session_id, match in self.matches.items()
+            if "index" in match
+        ]
+        if self.bracket is not None:
+            matches.extend(
+                {
+                    "session_id": None,
+                    "round": round_number,
+                    "index": index,
+                    "players": [self.bracket.winners[(round_number, index)], None],
+                    "status": "BYE",
+                    "winner": self.bracket.winners[(round_number, index)],
+                }
+                for round_number, index in sorted(self.bracket.byes)
+            )
+        return {
+            "tournament_id": str(self.tournament_id),
+            "version": self.version,
+            "status": self.status,
+            "rounds": self.bracket.rounds if self.bracket else 0,
+            "matches": matches,
+            "names": {
+                username: participant["display_name"]
+                for username, participant in self.participants.items()
+            },
+            "timestamp": timezone.now().timestamp(),
+        }
+
+
+def waiting_view(snapshot: Dict, username: str) -> Dict:
+    """ブラケットの状態から、1人のプレイヤーが待つ次の試合の状況を求める
+
+    ready は次の試合が作成済みならその試合（session_id, player1, player2,
+    match_type）。completed・advanced は次の試合へ勝者を送る2試合
+    （4人なら準決勝2試合）の完了数と勝ち上がったプレイヤー。
+    """
+    own = [match for match in snapshot["matches"] if username in match["players"]]
+    if not own:
+        return {"ready": None, "completed": 0, "advanced": []}
+    latest = max(own, key=lambda match: match["round"])
+
+    ready = None
+    if latest["winner"] is None and latest["status"] in ("WAITING", "IN_PROGRESS"):
+        ready = {
+            "session_id": latest["session_id"],
+            "player1": latest["players"][0],
+            "player2": latest["players"][1],
+            "match_type": match_type(latest["round"], snapshot["rounds"]),
+        }
+        target = (latest["round"], latest["index"])
+    else:
+        target = (latest["round"] + 1, latest["index"] // 2)
+
+    feeders = [
+        match
+        for match in snapshot["matches"]
+        if match["round"] == target[0] - 1 and match["index"] // 2 == target[1]
+    ]
+    advanced = [match["winner"] for match in feeders if match["winner"]]
+    return {"ready": ready, "completed": len(advanced), "advanced": advanced}
+
+
+class TournamentStateCache:
+    """プロセス内で共有するトーナメント状態のキャッシュ
+
+    DB アクセスと同じく database_sync_to_async のスレッドからだけ使う。
+    終了したトーナメントと、max_size を超えた古いものから破棄する。
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._states: "OrderedDict[str, TournamentState]" = OrderedDict()
+
+    def get(self, tournament_id, refresh: bool = False) -> TournamentState:
+        """キャッシュした状態を取得（なければ・refresh なら DB から読み込む）"""
+        key = str(tournament_id)
+        state = None if refresh else self._states.get(key)
+        if state is None:
+            state = TournamentState.load(tournament_id)
+            self._states[key] = state
+            while len(self._states) > self.max_size:
+                self._states.popitem(last=False)
+        self._states.move_to_end(key)
+        return state
+
+    def apply(
+        self, tournament_id, transition: Callable[[TournamentState], bool]
+    ) -> TournamentState:
+        """状態遷移をメモリ上で適用し、変更があれば書き込む
+
+        キャッシュが古く書き込めなかった場合は DB から読み直して一度だけ
+        やり直す。
+        """
+        for attempt in range(2):
+            state = self.get(tournament_id, refresh=attempt > 0)
+            try:
+                if transition(state):
+                    state.flush()
+                break
+            except StaleTournamentState:
+                self.evict(tournament_id)
+                if attempt:
+                    raise
+            except Exception:
+                # 書き込めなかった変更をキャッシュに残さない
+                self.evict(tournament_id)
+                raise
+        if state.status == "COMPLETED":
+            self.evict(tournament_id)
+        return state
+
+    def observe(self, tournament_id, version: int) -> None:
+        """他のワーカーがより新しいバージョンに進めたら古い状態を破棄"""
+        state = self._states.get(str(tournament_id))
+        if state is not None and state.version < version:
+            self.evict(tournament_id)
+
+    def evict(self, tournament_id) -> None:
+        self._states.pop(str(tournament_id), None)
+
+
+_cache = None
+
+
+def get_tournament_states() -> TournamentStateCache:
+    """プロセス内で共有するトーナメント状態のキャッシュを取得"""
+    global _cache
+    if _cache is None:
+        _cache = TournamentStateCache(
+            getattr(settings, "PONG_TOURNAMENT_CACHE_SIZE", 256)
+        )
+    return _cache
+
+
+def reset_tournament_states() -> None:
+    """キャッシュを破棄（テスト用）"""
+    global _cache
+    _cache = None
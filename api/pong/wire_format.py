@@ -0,0 +1,214 @@
+# api/pong/wire_format.py
+import json
+import struct
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Sequence
+
+# バイナリ形式を要求するクライアントが指定する WebSocket サブプロトコル
+BINARY_SUBPROTOCOL = "pong.binary.v2"
+# 差分形式（キーフレーム + 変更フィールドのみ）を要求するサブプロトコル
+DELTA_SUBPROTOCOL = "pong.delta.v1"
+
+# フレーム種別とレイアウトのバージョン
+STATE_FRAME_TYPE = 1
+STATE_FRAME_VERSION = 2
+
+# 状態フレームの固定レイアウト（リトルエンディアン、51バイト）
+#   frame_type, version: uint8
+#   tick: uint32（サーバーティック番号）
+#   ball x/y/z, velocity x/y/z, paddle1 x, paddle2 x: float32
+#   score1, score2: uint16
+#   input_seq1, input_seq2: uint32（各プレイヤーの適用済み入力シーケンス番号）
+#   flags: uint8（bit0: is_active）
+STATE_FRAME = struct.Struct("<BBI8f2H2IB")
+STATE_FIELDS = (
+    "tick",
+    "ball_x",
+    "ball_y",
+    "ball_z",
+    "velocity_x",
+    "velocity_y",
+    "velocity_z",
+    "paddle1_x",
+    "paddle2_x",
+    "score1",
+    "score2",
+    "input_seq1",
+    "input_seq2",
+    "is_active",
+)
+
+FLAG_ACTIVE = 0x01
+
+
+def negotiate_subprotocol(requested: Iterable[str]) -> Optional[str]:
+    """クライアントが要求したサブプロトコルから使用するものを選択"""
+    for subprotocol in (BINARY_SUBPROTOCOL, DELTA_SUBPROTOCOL):
+        if subprotocol in requested:
+            return subprotocol
+    return None
+
+
+def session_info_message(
+    players: Sequence[str],
+    wire_format: str = BINARY_SUBPROTOCOL,
+    tick_rate: Optional[int] = None,
+) -> Dict:
+    """接続時に一度だけ送るプレイヤー番号表（フレームはこの順序で並ぶ）
+
+    tick_rate があれば、クライアントはティック番号から経過時間を求められる。
+    """
+    return {
+        "type": "session_info",
+        "format": wire_format,
+        "players": list(players),
+        "fields": list(STATE_FIELDS),
+        "tick_rate": tick_rate,
+    }
+
+
+def _input_seqs(state: Dict, players: Sequence[str]):
+    """各プレイヤーの適用済み入力シーケンス番号（未送信は 0、uint32 に収める）"""
+    last_input = state.get("last_input") or {}
+    return tuple((last_input.get(player) or 0) & 0xFFFFFFFF for player in players)
+
+
+def flatten_state(state: Dict, players: Sequence[str]) -> Dict:
+    """get_state() の辞書をフレームと同じフィールド名の平坦な辞書に変換"""
+    ball = state["ball"]
+    player1, player2 = players
+    input_seq1, input_seq2 = _input_seqs(state, players)
+    return {
+        "tick": state.get("tick", 0),
+        "ball_x": ball["position"]["x"],
+        "ball_y": ball["position"]["y"],
+        "ball_z": ball["position"]["z"],
+        "velocity_x": ball["velocity"]["x"],
+        "velocity_y": ball["velocity"]["y"],
+        "velocity_z": ball["velocity"]["z"],
+        "paddle1_x": state["players"][player1]["x"],
+        "paddle2_x": state["players"][player2]["x"],
+        "score1": state["score"][player1],
+        "score2": state["score"][player2],
+        "input_seq1": input_seq1,
+        "input_seq2": input_seq2,
+        "is_active": state["is_active"],
+    }
+
+
+def encode_state(state: Dict, players: Sequence[str]) -> bytes:
+    """get_state() の辞書を固定長バイナリフレームに変換"""
+    ball = state["ball"]
+    position = ball["position"]
+    velocity = ball["velocity"]
+    player1, player2 = players
+    return STATE_FRAME.pack(
+        STATE_FRAME_TYPE,
+        STATE_FRAME_VERSION,
+        state.get("tick", 0),
+        position["x"],
+        position["y"],
+        position["z"],
+        velocity["x"],
+        velocity["y"],
+        velocity["z"],
+        state["players"][player1]["x"],
+        state["players"][player2]["x"],
+        state["score"][player1],
+        state["score"][player2],
+        *_input_seqs(state, players),
+        FLAG_ACTIVE if state["is_active"] else 0,
+    )
+
+
+def encode_frames(
+    state: Dict, players: Sequence[str], formats: Iterable[Optional[str]] = ()
+) -> Dict:
+    """1ティック分の送信データを形式ごとに一度だけエンコード
+
+    各形式（JSON は None）は購読者が要求した場合のみ追加する。
+    コンシューマはこの中から自分の形式のデータをそのまま送信する。
+    """
+    frames = {}
+    formats = set(formats)
+    if None in formats:
+        frames["json"] = json.dumps({"type": "state_update", "state": state})
+    if BINARY_SUBPROTOCOL in formats:
+        frames[BINARY_SUBPROTOCOL] = encode_state(state, players)
+    if DELTA_SUBPROTOCOL in formats:
+        frames[DELTA_SUBPROTOCOL] = flatten_state(state, players)
+    return frames
+
+
+def decode_state(frame: bytes) -> Dict:
+    """バイナリフレームをフィールド名付きの辞書に戻す"""
+    frame_type, version, *values = STATE_FRAME.unpack(frame)
+    if frame_type != STATE_FRAME_TYPE or version != STATE_FRAME_VERSION:
+        raise ValueError(f"Unsupported frame: type={frame_type}, version={version}")
+    fields = dict(zip(STATE_FIELDS, values))
+    fields["is_active"] = bool(fields["is_active"] & FLAG_ACTIVE)
+    return fields
+
+
+class DeltaEncoder:
+    """接続ごとに差分形式の状態メッセージを生成するエンコーダ
+
+    クライアントが確認応答（state_ack）したスナップショットを基準に、
+    変化したフィールドだけを送る。基準がない場合（接続直後・再接続時・
+    確認応答が履歴から外れた場合）と、keyframe_interval フレームごとには
+    全フィールドを含むキーフレームを送る。
+    """
+
+    def __init__(self, keyframe_interval: int = 60, history_size: int = 64):
+        self.keyframe_interval = keyframe_interval
+        self.history_size = history_size
+        self.frame = 0
+        self.acked_frame = None
+        self.last_keyframe = None
+        self._history: "OrderedDict[int, Dict]" = OrderedDict()
+        # 統計
+        self.keyframes_sent = 0
+        self.deltas_sent = 0
+
+    def encode(self, fields: Dict) -> Dict:
+        """平坦化した状態からキーフレームまたは差分メッセージを生成"""
+        self.frame += 1
+        baseline = self._history.get(self.acked_frame)
+
+        if (
+            baseline is None
+            or self.last_keyframe is None
+            or self.frame - self.last_keyframe >= self.keyframe_interval
+        ):
+            message = {"type": "state_keyframe", "frame": self.frame, "fields": fields}
+            self.last_keyframe = self.frame
+            self.keyframes_sent += 1
+        else:
+            changes = {
+                name: value
+                for name, value in fields.items()
+                if baseline.get(name) != value
+            }
+            message = {
+                "type": "state_delta",
+                "frame": self.frame,
+                "base": self.acked_frame,
+                "changes": changes,
+            }
+            self.deltas_sent += 1
+
+        self._history[self.frame] = fields
+        while len(self._history) > self.history_size:
+            self._history.popitem(last=False)
+        return message
+
+    def acknowledge(self, frame: int) -> None:
+        """クライアントが適用済みのフレーム番号を記録"""
+        if frame in self._history and (
+            self.acked_frame is None or frame > self.acked_frame
+        ):
+            self.acked_frame = frame
+
+    def request_keyframe(self) -> None:
+        """次のフレームをキーフレームにする（クライアントの再同期要求など）"""
+        self.acked_frame = None
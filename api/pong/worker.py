@@ -0,0 +1,6 @@
+# api/pong/worker.py
+import os
+import socket
+
+# このプロセス（daphne ワーカー）を識別するID
+WORKER_ID = os.getenv("PONG_WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
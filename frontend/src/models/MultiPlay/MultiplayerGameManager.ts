@@ -18,10 +18,27 @@ export class MultiplayerGameManager extends BaseGameManager {
       sessionId: this.config.sessionId,
       username: this.config.username,
     });
-    // 初期化時の追加処理があればここに実装
+    // 相手が参加期限内に接続しなかった場合は待機列に戻り、次のマッチへ移動する
+    this.wsService.addMessageHandler('match_found', this.handleMatchFound.bind(this));
+    this.wsService.addMessageHandler('match_cancelled', this.handleMatchCancelled.bind(this));
     return Promise.resolve();
   }
 
+  private handleMatchFound(data: { session_id: string; player1: string }): void {
+    logger.log('Next match found:', data);
+    window.location.href = `/multiplay/game?session=${data.session_id}&isPlayer1=${
+      this.config.username === data.player1
+    }`;
+  }
+
+  private handleMatchCancelled(data: { requeued: boolean }): void {
+    logger.log('Match cancelled:', data);
+    // 待機列に戻っていなければマッチメイキングからやり直す
+    if (!data.requeued) {
+      window.location.href = '/multiplay/waiting';
+    }
+  }
+
   protected onStateUpdate(state: IGameState): void {
     // レンダラーにゲーム状態を更新
     this.renderer.updateState(state);
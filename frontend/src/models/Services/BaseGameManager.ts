@@ -4,12 +4,16 @@ import { IGameConfig, IGameState, IMoveConfig } from '../Game/type';
 import { InputHandlerService } from './InputHandlerService';
 import { WebSocketService } from './WebSocketService';
 
+// 別ワーカーへの誘導（redirect）に従う回数の上限
+const MAX_REDIRECTS = 3;
+
 export abstract class BaseGameManager {
   protected wsService: WebSocketService;
   protected inputHandler: InputHandlerService;
   protected config: IGameConfig;
   protected currentPosition: number = 0;
   protected isActive: boolean = true;
+  private redirectCount: number = 0;
 
   constructor(config: IGameConfig) {
     this.config = {
@@ -31,15 +35,7 @@ export abstract class BaseGameManager {
   async init(): Promise<void> {
     // WebSocket接続
     try {
-      await this.wsService.connect(this.config.wsEndpoint);
-
-      // メッセージハンドラの登録
-      this.wsService.addMessageHandler('state_update', this.handleStateUpdate.bind(this));
-      this.wsService.addMessageHandler(
-        'player_disconnected',
-        this.handlePlayerDisconnected.bind(this)
-      );
-      this.wsService.addMessageHandler('error', this.handleError.bind(this));
+      await this.connect();
 
       // 入力ハンドラの初期化
       this.inputHandler.init(this.handleMovement.bind(this));
@@ -56,6 +52,50 @@ export abstract class BaseGameManager {
     }
   }
 
+  private async connect(): Promise<void> {
+    await this.wsService.connect(this.config.wsEndpoint);
+
+    // メッセージハンドラの登録
+    this.wsService.addMessageHandler('state_update', this.handleStateUpdate.bind(this));
+    this.wsService.addMessageHandler(
+      'player_disconnected',
+      this.handlePlayerDisconnected.bind(this)
+    );
+    this.wsService.addMessageHandler('error', this.handleError.bind(this));
+    this.wsService.addMessageHandler('redirect', this.handleRedirect.bind(this));
+  }
+
+  /**
+   * セッションを所有する別ワーカーへ接続し直す
+   * （サーバーは redirect を送った後にコード 4001 で切断する）
+   */
+  protected async handleRedirect(data: { url: string | null; worker: string }): Promise<void> {
+    if (this.redirectCount >= MAX_REDIRECTS) {
+      logger.error('Too many redirects:', { sessionId: this.config.sessionId });
+      this.handleConnectionError();
+      return;
+    }
+    this.redirectCount++;
+
+    // URL 未設定のワーカーならロードバランサ経由で同じエンドポイントに接続し直す
+    if (data.url) {
+      const path = new URL(this.config.wsEndpoint).pathname;
+      this.config.wsEndpoint = new URL(path, data.url).toString();
+    }
+    logger.log('Redirecting to session owner:', {
+      worker: data.worker,
+      wsEndpoint: this.config.wsEndpoint,
+    });
+
+    this.wsService.disconnect();
+    try {
+      await this.connect();
+    } catch (error) {
+      logger.error('Failed to reconnect to session owner:', error);
+      this.handleConnectionError();
+    }
+  }
+
   protected handleMovement(newPosition: number): void {
     if (this.wsService.isConnected() && this.isActive) {
       this.wsService.send({
@@ -13,7 +13,8 @@ export class WebSocketService {
     this.url = url;
     return new Promise((resolve, reject) => {
       try {
-        this.socket = new WebSocket(url);
+        const socket = new WebSocket(url);
+        this.socket = socket;
 
         this.socket.onopen = () => {
           logger.log('WebSocket connected:', { url, timestamp: new Date().toISOString() });
@@ -32,12 +33,16 @@ export class WebSocketService {
           reject(error);
         };
 
-        this.socket.onclose = () => {
+        this.socket.onclose = (event) => {
           logger.log('WebSocket connection closed:', {
-            url: this.url,
+            url,
+            code: event.code,
             timestamp: new Date().toISOString(),
           });
-          this.socket = null;
+          // 再接続済みなら新しい接続は残す
+          if (this.socket === socket) {
+            this.socket = null;
+          }
         };
       } catch (error) {
         logger.error('Error establishing WebSocket connection:', error);
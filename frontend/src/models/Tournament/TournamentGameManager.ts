@@ -4,6 +4,14 @@ import { IGameConfig, IGameState, ITournamentInfo } from '@/models/Game/type';
 import { BaseGameManager } from '@/models/Services/BaseGameManager';
 import { GameRenderer } from '@/models/Services/game_renderer';
 
+// ラウンドの表示名（match_type: final, semifinal, quarterfinal, round）
+export const roundDisplayName = (roundType: string): string => {
+  if (roundType === 'final') return 'Final Match';
+  if (roundType.startsWith('semi')) return 'Semi-Final';
+  if (roundType.startsWith('quarter')) return 'Quarter-Final';
+  return 'Round';
+};
+
 export class TournamentGameManager extends BaseGameManager {
   private renderer: GameRenderer;
   private scoreBoard: HTMLElement | null;
@@ -108,8 +116,8 @@ export class TournamentGameManager extends BaseGameManager {
 
     // 結果画面に遷移
     setTimeout(() => {
-      // 準決勝の場合は決勝待機画面へ
-      if (this.tournamentInfo.roundType.startsWith('semi')) {
+      // 決勝以外は次の試合の待機画面へ
+      if (this.tournamentInfo.roundType !== 'final') {
         window.location.href = `/tournament/waiting-next-match?tournamentId=${this.tournamentInfo.tournamentId}`;
       } else {
         // 決勝の場合は結果画面へ
@@ -171,10 +179,10 @@ export class TournamentGameManager extends BaseGameManager {
     const isWinner = finalScore.player1 > finalScore.player2;
 
     setTimeout(() => {
-      // 準決勝の場合
-      if (this.tournamentInfo.roundType.startsWith('semi')) {
+      // 決勝以外の場合
+      if (this.tournamentInfo.roundType !== 'final') {
         if (isWinner) {
-          // 勝者は決勝待機画面に遷移
+          // 勝者は次の試合の待機画面に遷移
           window.location.href = `/tournament/waiting-next-match?tournamentId=${this.tournamentInfo.tournamentId}`;
         } else {
           // 敗者は結果画面に遷移
@@ -209,9 +217,7 @@ export class TournamentGameManager extends BaseGameManager {
     // ラウンド情報をUIに表示する（例: ヘッダーテキストを更新）
     const roundElement = document.querySelector('.card-header h2');
     if (roundElement) {
-      const roundName = this.tournamentInfo.roundType.startsWith('semi')
-        ? 'Semi-Final'
-        : 'Final Match';
+      const roundName = roundDisplayName(this.tournamentInfo.roundType);
 
       roundElement.textContent = `Tournament ${roundName}`;
     }
@@ -4,7 +4,7 @@ import i18next from '@/config/i18n';
 import { Page } from '@/core/Page';
 import AuthLayout from '@/layouts/AuthLayout';
 import { IGameConfig } from '@/models/Game/type';
-import { TournamentGameManager } from '@/models/Tournament/TournamentGameManager';
+import { roundDisplayName, TournamentGameManager } from '@/models/Tournament/TournamentGameManager';
 import { setUserLanguage } from '@/utils/language';
 import { updateText } from '@/utils/updateElements';
 
@@ -89,7 +89,7 @@ const GamePage = new Page({
       pg.logger.info('Tournament game initialized successfully');
 
       // タイトル更新
-      document.title = `Tournament ${roundType.startsWith('semi') ? 'Semi-Final' : 'Final'}`;
+      document.title = `Tournament ${roundDisplayName(roundType)}`;
 
       // クリーンアップ関数を返す
       return () => {
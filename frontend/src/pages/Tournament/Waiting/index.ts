@@ -10,6 +10,7 @@ import { updateText } from '@/utils/updateElements';
 // NOTE: lint用の型定義
 interface WaitingStatusData {
   total_players: number;
+  required_players: number;
   players: Array<{
     username: string;
     display_name?: string;
@@ -24,6 +25,10 @@ interface MatchFoundData {
   is_player1: boolean;
 }
 
+interface ByeData {
+  tournament_id: string;
+}
+
 interface WebSocketErrorData {
   type: string;
   message: string;
@@ -79,6 +84,10 @@ const WaitingPage = new Page({
           case 'tournament_match':
             handleMatchFound(data as MatchFoundData);
             break;
+
+          case 'tournament_bye':
+            handleBye(data as ByeData);
+            break;
         }
       } catch (e) {
         logger.info('Error parsing message:', e);
@@ -95,7 +104,7 @@ const WaitingPage = new Page({
       // 接続ステータスの更新（例: "Waiting for X more players..."）
       if (connectionStatus) {
         connectionStatus.textContent = i18next.t('tournament.waiting.waitingPlayers', {
-          count: Math.max(0, 4 - data.total_players),
+          count: Math.max(0, data.required_players - data.total_players),
         });
       }
 
@@ -132,6 +141,15 @@ const WaitingPage = new Page({
       }, 1500);
     };
 
+    // 不戦勝の場合は次の試合の待機画面へ
+    const handleBye = (data: ByeData) => {
+      logger.info('Advanced by bye', data);
+
+      setTimeout(() => {
+        window.location.href = `/tournament/waiting-next-match?tournamentId=${data.tournament_id}`;
+      }, 1500);
+    };
+
     // WebSocketの初期化
     const initWebSocket = () => {
       // 既存の接続を閉じる
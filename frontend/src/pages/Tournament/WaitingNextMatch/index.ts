@@ -22,6 +22,7 @@ interface FinalReady {
   type: 'final_ready';
   session_id: string;
   is_player1: boolean;
+  match_type?: string;
 }
 
 interface ErrorMessage {
@@ -223,9 +224,9 @@ const WaitingNextMatchPage = new Page({
         statusMessage.textContent = i18next.t('tournament.waitingNextMatch.socket.finalMatchReady');
       }
 
-      // 決勝戦ページへリダイレクト
+      // 次の試合（決勝戦など）のページへリダイレクト
       setTimeout(() => {
-        window.location.href = `/tournament/game?tournamentId=${tournamentId}&round=final&session=${data.session_id}&isPlayer1=${data.is_player1}`;
+        window.location.href = `/tournament/game?tournamentId=${tournamentId}&round=${data.match_type ?? 'final'}&session=${data.session_id}&isPlayer1=${data.is_player1}`;
       }, 2000);
     };
 